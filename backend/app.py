@@ -1,9 +1,17 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
-from dfa_logic import DFA as LocalDFA
+from dfa_logic import DFA as LocalDFA, MultiDFA
 from cfg_logic import CFG
 from pda_logic import PDA
+from trace_logic import parse_trace
+from cache_logic import ResultCache
+from registry_logic import LazyMachine, MachineRegistry
+from metrics_logic import MetricsRegistry, SearchStats
+from pool_logic import SearchPool, SearchTimeout, client_disconnected
+from checkpoint_logic import CheckpointStore
 import pathlib
+import os
+import time
 import logging.config
 import json
 
@@ -12,6 +20,31 @@ import json
 logger = logging.getLogger('app')
 app = Flask(__name__, static_folder='static', static_url_path='')
 
+# Bytes read from the request body per step by /simulate-dfa/stream.
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Bump when a built-in machine definition changes, so cached results of the old one are never served.
+MACHINE_VERSION = 1
+# Serialized responses of /simulate-dfa, /simulate-cfg and /simulate-pda, shared by all request threads.
+result_cache = ResultCache(max_entries=4096, max_bytes=64 * 1024 * 1024, ttl=None)
+# Machines uploaded through /machines, by content hash. Kept in this process only (see `register_machine`).
+registry = MachineRegistry(max_machines=256, max_bytes=256 * 1024 * 1024, early_exit=True)
+# Request counts, latencies and search-effort counters, served by /metrics.
+metrics = MetricsRegistry()
+# Worker processes for the CFG and PDA searches. Off by default (SEARCH_WORKERS=0): searches run on the request
+# thread, without deadlines, and no cold start pays for spawning a worker. gunicorn.conf.py turns it on for
+# long-running servers; set SEARCH_WORKERS to the number of workers to enable it elsewhere.
+SEARCH_WORKERS = int(os.environ.get('SEARCH_WORKERS', 0))
+search_pool = SearchPool(workers=SEARCH_WORKERS) if SEARCH_WORKERS > 0 else None
+# Deadline in seconds of a CFG or PDA search; a request may ask for a shorter one with 'timeout'.
+MAX_SEARCH_TIMEOUT = float(os.environ.get('SEARCH_TIMEOUT', 10))
+# Incremental runs of the edit sessions simulated in this process (DFAs, and every machine without the pool).
+checkpoints = CheckpointStore(max_entries=4096, max_bytes=64 * 1024 * 1024, ttl=600)
+MAX_SESSION_LENGTH = 128
+# Single-pass runners of the machine sets of /simulate-dfa/multi, by their machine keys, with their product tables.
+multi_dfas = ResultCache(max_entries=64, max_bytes=64 * 1024 * 1024, sizeof=lambda multi: multi.footprint())
+MAX_MULTI_MACHINES = 256
+
 def logger_setup():
     """Sets up the logger configuration for LOCAL testing.
 
@@ -48,43 +81,6 @@ bets_start = 0
 bets_final = {12}
 bets_trap = {7, 8}
 
-try:
-    bets_dfa = LocalDFA(
-        states=bets_states,
-        alphabet=bets_alphabet,
-        transitions=bets_transitions,
-        start_state=bets_start,
-        final_states=bets_final,
-        trap_states=bets_trap
-        )
-
-    logger.info(f'Bets DFA Compiled Successfully.')
-except Exception as e:
-    logger.error(f'Error Compiling Bets DFA. Please adhere to the formatting specified by the docstrings: {e}')
-
-bets_cfg = CFG(
-    variables={f"Q{s}" for s in bets_states},
-    terminals=bets_alphabet,
-    rules=[{'from': f'Q{s}', 'to': [char, f'Q{ns}']} for s, d in bets_transitions.items() for char, ns in d.items()] + [{'from': f'Q{s}', 'to': ['ε']} for s in bets_final],
-    start_symbol="Q0"
-)
-
-bets_pda_transitions = {}
-for s, d in bets_transitions.items():
-    bets_pda_transitions[s] = {}
-    for char, ns in d.items():
-        bets_pda_transitions[s][char] = {'ε': [(ns, [char])]}
-
-bets_pda = PDA(
-    states=bets_states,
-    input_alphabet=bets_alphabet,
-    stack_alphabet=bets_alphabet | {'Z0'},
-    transitions=bets_pda_transitions,
-    start_state=bets_start,
-    initial_stack='Z0',
-    final_states=bets_final
-)
-
 stars_states = {0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23}
 stars_alphabet = {'0','1'}
 stars_transitions = {
@@ -99,43 +95,250 @@ stars_start = 0
 stars_final = {10, 11, 18, 21, 22, 23}
 stars_trap = {4}
 
-try :
-    stars_dfa = LocalDFA(
-        states = stars_states,
-        alphabet = stars_alphabet,
-        transitions= stars_transitions,
-        start_state= stars_start,
-        final_states= stars_final,
-        trap_states= stars_trap
+
+def build_dfa(name: str, states: set, alphabet: set, transitions: dict, start: int, final: set, trap: set) -> LocalDFA:
+    """Builds and validates a built-in DFA.
+
+    Raises:
+        ValueError: The definition does not describe a valid DFA.
+    """
+    try:
+        dfa = LocalDFA(
+            states=states,
+            alphabet=alphabet,
+            transitions=transitions,
+            start_state=start,
+            final_states=final,
+            trap_states=trap
+            )
+    except Exception as e:
+        logger.error(f'Error Compiling {name} DFA. Please adhere to the formatting specified by the docstrings: {e}')
+        raise
+    logger.info(f'{name} DFA compiled successfully.')
+    return dfa
+
+
+def build_cfg(states: set, alphabet: set, transitions: dict, start: int, final: set) -> CFG:
+    """Builds the right-linear grammar of a built-in DFA: Q{s} -> a Q{next} per transition, Q{f} -> ε per final state."""
+    return CFG(
+        variables={f"Q{s}" for s in states},
+        terminals=alphabet,
+        rules=[{'from': f'Q{s}', 'to': [char, f'Q{ns}']} for s, d in transitions.items() for char, ns in d.items()] + [{'from': f'Q{s}', 'to': ['ε']} for s in final],
+        start_symbol=f"Q{start}",
+        early_exit=True
     )
-    logger.info('Stars DFA compiled successfully.')
-except Exception as e:
-    logger.error(f'Error Compiling Stars DFA. Please adhere to the formatting specified by the docstrings: {e}')
-
-stars_cfg = CFG(
-    variables={f"Q{s}" for s in stars_states},
-    terminals=stars_alphabet,
-    rules=[{'from': f'Q{s}', 'to': [char, f'Q{ns}']} for s, d in stars_transitions.items() for char, ns in d.items()] + [{'from': f'Q{s}', 'to': ['ε']} for s in stars_final],
-    start_symbol="Q0"
-)
-
-stars_pda_transitions = {}
-for s, d in stars_transitions.items():
-    stars_pda_transitions[s] = {}
-    for char, ns in d.items():
-        stars_pda_transitions[s][char] = {'ε': [(ns, [char])]}
-
-stars_pda = PDA(
-    states=stars_states,
-    input_alphabet=stars_alphabet,
-    stack_alphabet=stars_alphabet | {'Z0'},
-    transitions=stars_pda_transitions,
-    start_state=stars_start,
-    initial_stack='Z0',
-    final_states=stars_final
-)
 
 
+def build_pda(states: set, alphabet: set, transitions: dict, start: int, final: set) -> PDA:
+    """Builds the PDA of a built-in DFA: every transition pushes the symbol it reads."""
+    pda_transitions = {}
+    for s, d in transitions.items():
+        pda_transitions[s] = {}
+        for char, ns in d.items():
+            pda_transitions[s][char] = {'ε': [(ns, [char])]}
+
+    return PDA(
+        states=states,
+        input_alphabet=alphabet,
+        stack_alphabet=alphabet | {'Z0'},
+        transitions=pda_transitions,
+        start_state=start,
+        initial_stack='Z0',
+        final_states=final,
+        early_exit=True
+    )
+
+
+# The built-in machines by request 'dfa_type' and kind. Each is built on its first use (see `preload`).
+BUILTIN_MACHINES = {
+    'bets_dfa': {
+        'dfa': LazyMachine(lambda: build_dfa('Bets', bets_states, bets_alphabet, bets_transitions, bets_start, bets_final, bets_trap)),
+        'cfg': LazyMachine(lambda: build_cfg(bets_states, bets_alphabet, bets_transitions, bets_start, bets_final)),
+        'pda': LazyMachine(lambda: build_pda(bets_states, bets_alphabet, bets_transitions, bets_start, bets_final))
+    },
+    'stars_dfa': {
+        'dfa': LazyMachine(lambda: build_dfa('Stars', stars_states, stars_alphabet, stars_transitions, stars_start, stars_final, stars_trap)),
+        'cfg': LazyMachine(lambda: build_cfg(stars_states, stars_alphabet, stars_transitions, stars_start, stars_final)),
+        'pda': LazyMachine(lambda: build_pda(stars_states, stars_alphabet, stars_transitions, stars_start, stars_final))
+    }
+}
+
+
+def __getattr__(name: str):
+    """Serves the built-in machines as module attributes (`bets_dfa`, `stars_cfg`, ...), building them on first access."""
+    prefix, _, kind = name.rpartition('_')
+    machines = BUILTIN_MACHINES.get(f'{prefix}_dfa')
+    if machines is None or kind not in machines:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return machines[kind].get()
+
+
+def preload():
+    """Builds every built-in machine now instead of on its first use.
+
+    Call it in a server process before it forks its workers (for example with
+    gunicorn's `--preload`, or from its `when_ready` hook), so the workers
+    share the built machines instead of each building them on the request
+    path. Setting the PRELOAD_MACHINES environment variable calls it when
+    this module is imported.
+    """
+    for machines in BUILTIN_MACHINES.values():
+        for machine in machines.values():
+            machine.get()
+
+
+if os.environ.get('PRELOAD_MACHINES'):
+    preload()
+
+
+def find_machine(kind: str, machine_id, dfa_type) -> tuple[str, object]:
+    """Looks up the machine a simulate request refers to.
+
+    A registered machine is selected by its 'machine_id' (see `/machines`),
+    a built-in one by its 'dfa_type' (either 'bets_dfa' or 'stars_dfa').
+
+    Args:
+        kind: The kind of machine the route simulates: 'dfa', 'cfg' or 'pda'.
+        machine_id: The 'machine_id' of the request, or None.
+        dfa_type: The 'dfa_type' of the request, used without a machine id.
+
+    Returns:
+        A `(cache id, machine)` tuple, e.g. `('bets_cfg', bets_cfg)`.
+
+    Raises:
+        KeyError: No machine is registered under `machine_id`.
+        ValueError: Invalid DFA type, or a registered machine of another kind.
+    """
+    if machine_id is not None:
+        machine_kind, machine = registry.get(str(machine_id))
+        if machine_kind != kind:
+            raise ValueError(f'Machine {machine_id} is a {machine_kind}, not a {kind}.')
+        return str(machine_id), machine
+    machines = BUILTIN_MACHINES.get(str(dfa_type))
+    if machines is None:
+        raise ValueError(f'Invalid DFA type {dfa_type}: must be bets_dfa or stars_dfa')
+    return str(dfa_type).replace('_dfa', f'_{kind}'), machines[kind].get()
+
+
+def parse_timeout(timeout) -> float:
+    """Validates the 'timeout' of a search request.
+
+    Returns:
+        The deadline in seconds: MAX_SEARCH_TIMEOUT when `timeout` is None,
+        otherwise `timeout` capped at MAX_SEARCH_TIMEOUT.
+
+    Raises:
+        ValueError: `timeout` is not a positive number.
+    """
+    if timeout is None:
+        return MAX_SEARCH_TIMEOUT
+    if isinstance(timeout, bool) or not isinstance(timeout, (int, float)) or not timeout > 0:
+        raise ValueError(f'Invalid timeout: {timeout!r}. Must be a positive number of seconds.')
+    return min(float(timeout), MAX_SEARCH_TIMEOUT)
+
+
+def parse_session(session) -> str | None:
+    """Validates the 'session' of a simulate request: None, or a non-empty string of at most MAX_SESSION_LENGTH characters.
+
+    Raises:
+        ValueError: Any other value.
+    """
+    if session is None or (isinstance(session, str) and 0 < len(session) <= MAX_SESSION_LENGTH):
+        return session
+    raise ValueError(f'Invalid session: must be a non-empty string of at most {MAX_SESSION_LENGTH} characters.')
+
+
+def timeout_response(kind: str, error: SearchTimeout):
+    """The response to a search that timed out (504) or whose client went away (499), which is never cached."""
+    metrics.observe_timeout(kind, error.cancelled)
+    logger.warning(f'{kind.upper()} search abandoned: {error}')
+    return jsonify({'error': str(error), 'timeout': True}), 499 if error.cancelled else 504
+
+
+def cached_response(machine_id: str, engine: str, input_str: str, trace, simulate):
+    """Serves a simulation result from `result_cache`, running it on a miss.
+
+    The key is (machine id, machine version, engine, input, trace mode), with
+    the trace option normalized by `parse_trace`.
+
+    Args:
+        machine_id: The machine, e.g. 'bets_cfg'.
+        engine: The simulation engine the result comes from.
+        input_str: The simulated input.
+        trace: The trace option of the request (already validated).
+        simulate: Called without arguments on a miss; returns the result.
+
+    Returns:
+        A JSON response with the simulation result.
+    """
+    key = (machine_id, MACHINE_VERSION, engine, input_str, parse_trace(trace))
+    body = result_cache.get(key)
+    if body is not None:
+        return app.response_class(body, mimetype=app.json.mimetype)
+    response = jsonify(simulate())
+    result_cache.put(key, response.get_data())
+    return response
+
+
+def run_search(kind: str, machine_id: str, machine, input_str: str, trace, timeout: float | None = None,
+               session: str | None = None) -> dict:
+    """Runs one simulation and records its search-effort counters.
+
+    DFA runs are cheap and stay on the request thread. CFG and PDA searches
+    run in `search_pool`, so a slow one never holds this process or its GIL:
+    it is killed once `timeout` passes or the client disconnects.
+
+    With a `session`, the simulation resumes the session's incremental run
+    of the machine (see `checkpoint_logic`), so an input that only differs
+    from the session's last one at its end is only simulated from there.
+
+    The counters (see `metrics_logic.SearchStats`) go to `metrics` and to one
+    structured log line per call.
+
+    Args:
+        kind: The kind of machine: 'dfa', 'cfg' or 'pda'.
+        machine_id: The machine, e.g. 'bets_cfg', for the log and the workers' machine caches.
+        machine: The machine to simulate.
+        input_str: The simulated input.
+        trace: The trace option of the request.
+        timeout: Deadline in seconds of a pooled search (default: MAX_SEARCH_TIMEOUT).
+        session: The 'session' of the request, or None.
+
+    Returns:
+        The simulation result.
+
+    Raises:
+        SearchTimeout: The search passed its deadline or the client went away.
+    """
+    if kind == 'dfa' or search_pool is None:
+        stats = SearchStats()
+        if session is None:
+            result = machine.simulate(input_str, trace=trace, stats=stats)
+        else:
+            result = checkpoints.simulate(session, machine_id, machine, input_str, trace, stats)
+    else:
+        environ = request.environ
+        result, stats = search_pool.simulate(machine_id, machine, input_str, trace, timeout=timeout or MAX_SEARCH_TIMEOUT,
+                                             cancelled=lambda: client_disconnected(environ), session=session)
+    metrics.observe_search(kind, stats)
+    logger.info(f'Search effort for {machine_id}: {json.dumps(stats.as_dict())}')
+    return result
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Counts the request by endpoint and status code and records its latency in `metrics`."""
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe_request(endpoint, response.status_code, time.perf_counter() - start)
+    return response
+
 
 @app.route('/')
 def index():
@@ -152,13 +355,18 @@ def simulate_dfa():
     """Simulates a DFA based on the provided type and input.
 
     Accepts a JSON POST request containing 'dfa_type' (either 'bets_dfa' or
-    'stars_dfa') and 'dfa_input' (the string to simulate).
+    'stars_dfa') or the 'machine_id' of a registered DFA, 'dfa_input' (the
+    string to simulate), an optional 'trace' mode (see `trace_logic`,
+    'full' by default) and an optional 'session' id. Requests of one session
+    that edit the same input keystroke by keystroke only simulate what
+    follows the prefix they share with the previous one.
 
     Returns:
         A JSON response with the simulation result or an error message.
         Possible HTTP status codes:
         - 200: Simulation successful.
         - 400: Bad request (e.g., missing parameters, invalid DFA type).
+        - 404: Unknown machine id.
         - 415: Unsupported media type (request not JSON).
     
     Exceptions:
@@ -174,32 +382,215 @@ def simulate_dfa():
 
         dfa_type = simulation_data.get('dfa_type')
         dfa_input = simulation_data.get('dfa_input')
+        machine_id = simulation_data.get('machine_id')
 
-        if dfa_type == None or dfa_input == None:
+        if (dfa_type == None and machine_id == None) or dfa_input == None:
             logger.error(f'Missing dfa_type or dfa_input in simulation data')
             return jsonify({'error': 'Missing DFA type or DFA input in JSON object'}), 400
 
         dfa_type_str = str(dfa_type)
         dfa_input_str = str(dfa_input)
+        trace = simulation_data.get('trace')
 
         logger.info(f'Recieved dfa input type {dfa_type_str}')
         logger.info(f'Recieved dfa input type {dfa_input_str}')
 
-        if dfa_type_str == 'bets_dfa':
-            response_data = bets_dfa.simulate(dfa_input_str)
-
-        elif dfa_type_str == 'stars_dfa':
-            response_data = stars_dfa.simulate(dfa_input_str)
-        else:
+        try:
+            parse_trace(trace)
+            session = parse_session(simulation_data.get('session'))
+        except ValueError as e:
+            logger.error(f'Invalid trace mode or session recieved: {e}')
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            machine_key, dfa = find_machine('dfa', machine_id, dfa_type)
+        except KeyError:
+            logger.error('Unknown machine id recieved')
+            return jsonify({'error': f'Unknown machine id {machine_id}'}), 404
+        except ValueError as e:
             logger.error('Invalid DFA type recieved')
-            return jsonify({'error': f'Invalid DFA type {dfa_type_str}: must be bets_dfa or stars_dfa' }), 400
+            return jsonify({'error': str(e)}), 400
 
-        logger.info(f'Response data for {dfa_type_str}: {response_data}')
-        return jsonify(response_data), 200
+        response = cached_response(machine_key, 'dfa', dfa_input_str, trace, lambda: run_search('dfa', machine_key, dfa, dfa_input_str, trace, session=session))
+        logger.info(f'Response data for {machine_key}: {response.get_data(as_text=True)}')
+        return response, 200
     except Exception as e:
         logger.error(f'An unexpected error occured during simulation: {e}', exc_info=True)
         return jsonify({'error': f'Internal Server Error: An unexpected error occured during simulation: '}),500
 
+@app.route('/simulate-dfa/batch', methods=['POST'])
+def simulate_dfa_batch():
+    """Simulates a DFA on a list of inputs in one request.
+
+    Accepts a JSON POST request containing 'dfa_type' (either 'bets_dfa' or
+    'stars_dfa') or the 'machine_id' of a registered DFA, and 'dfa_inputs'
+    (a list of strings to simulate).
+
+    Returns:
+        A JSON response with parallel 'input', 'final_state', 'accepted' and
+        'error' lists (see `DFA.simulate_many`) or an error message.
+        Possible HTTP status codes:
+        - 200: Simulation successful.
+        - 400: Bad request (e.g., missing parameters, invalid DFA type).
+        - 404: Unknown machine id.
+        - 415: Unsupported media type (request not JSON).
+
+    Exceptions:
+        - 500: Internal server error.
+    """
+    if not request.is_json:
+        logger.warning('Request is not a JSON object.')
+        return jsonify({'error': 'Invalid request format: must be a JSON object.'}), 415
+    try:
+        simulation_data = request.get_json()
+        if not simulation_data:
+            return jsonify({'error': 'No JSON object recieved.'}), 400
+
+        dfa_type = simulation_data.get('dfa_type')
+        dfa_inputs = simulation_data.get('dfa_inputs')
+        machine_id = simulation_data.get('machine_id')
+
+        if (dfa_type == None and machine_id == None) or not isinstance(dfa_inputs, list):
+            logger.error(f'Missing dfa_type or dfa_inputs list in simulation data')
+            return jsonify({'error': 'Missing DFA type or DFA input list in JSON object'}), 400
+
+        dfa_type_str = str(dfa_type)
+        dfa_input_strs = [str(dfa_input) for dfa_input in dfa_inputs]
+
+        logger.info(f'Recieved {len(dfa_input_strs)} batch inputs for dfa type {dfa_type_str}')
+
+        try:
+            _, dfa = find_machine('dfa', machine_id, dfa_type)
+        except KeyError:
+            logger.error('Unknown machine id recieved')
+            return jsonify({'error': f'Unknown machine id {machine_id}'}), 404
+        except ValueError as e:
+            logger.error('Invalid DFA type recieved')
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify(dfa.simulate_many(dfa_input_strs)), 200
+    except Exception as e:
+        logger.error(f'An unexpected error occured during batch simulation: {e}', exc_info=True)
+        return jsonify({'error': f'Internal Server Error: An unexpected error occured during simulation: '}),500
+
+@app.route('/simulate-dfa/multi', methods=['POST'])
+def simulate_dfa_multi():
+    """Simulates several DFAs on one input in a single pass.
+
+    Accepts a JSON POST request containing 'machines' (a list of built-in DFA
+    types, 'bets_dfa' or 'stars_dfa', and 'machine_id's of registered DFAs)
+    and 'dfa_input' (the string to simulate). The input is read once for all
+    the machines (see `MultiDFA`).
+
+    Returns:
+        A JSON response with the 'input' and, under 'results', the run
+        summary of every machine by the name it was given in 'machines' (see
+        `DFARunner.finish`; a rejected machine's 'length' is the position of
+        the rejecting symbol), or an error message.
+        Possible HTTP status codes:
+        - 200: Simulation successful.
+        - 400: Bad request (e.g., missing parameters, invalid DFA type).
+        - 404: Unknown machine id.
+        - 415: Unsupported media type (request not JSON).
+
+    Exceptions:
+        - 500: Internal server error.
+    """
+    if not request.is_json:
+        logger.warning('Request is not a JSON object.')
+        return jsonify({'error': 'Invalid request format: must be a JSON object.'}), 415
+    try:
+        simulation_data = request.get_json()
+        if not simulation_data:
+            return jsonify({'error': 'No JSON object recieved.'}), 400
+
+        names = simulation_data.get('machines')
+        dfa_input = simulation_data.get('dfa_input')
+
+        if not isinstance(names, list) or not names or dfa_input == None:
+            logger.error(f'Missing machines list or dfa_input in simulation data')
+            return jsonify({'error': 'Missing machine list or DFA input in JSON object'}), 400
+        names = list(dict.fromkeys(str(name) for name in names))
+        if len(names) > MAX_MULTI_MACHINES:
+            return jsonify({'error': f'Too many machines: at most {MAX_MULTI_MACHINES} can be simulated at once.'}), 400
+
+        dfa_input_str = str(dfa_input)
+        logger.info(f'Recieved dfa input for {len(names)} machines')
+
+        keys, dfas = [], []
+        for name in names:
+            try:
+                if name in BUILTIN_MACHINES:
+                    key, dfa = find_machine('dfa', None, name)
+                else:
+                    key, dfa = find_machine('dfa', name, None)
+            except KeyError:
+                logger.error('Unknown machine id recieved')
+                return jsonify({'error': f'Unknown machine id {name}'}), 404
+            except ValueError as e:
+                logger.error('Invalid DFA type recieved')
+                return jsonify({'error': str(e)}), 400
+            keys.append(key)
+            dfas.append(dfa)
+
+        key = (MACHINE_VERSION, tuple(keys))
+        multi = multi_dfas.get(key)
+        if multi is None:
+            multi = MultiDFA(dfas)
+            multi_dfas.put(key, multi)
+
+        results = multi.simulate(dfa_input_str)
+        return jsonify({'input': dfa_input_str, 'results': dict(zip(names, results))}), 200
+    except Exception as e:
+        logger.error(f'An unexpected error occured during multi simulation: {e}', exc_info=True)
+        return jsonify({'error': f'Internal Server Error: An unexpected error occured during simulation: '}),500
+
+@app.route('/simulate-dfa/stream', methods=['POST'])
+def simulate_dfa_stream():
+    """Simulates a DFA on a raw (optionally chunked) request body without buffering it.
+
+    The DFA is selected with the 'dfa_type' query parameter (either 'bets_dfa'
+    or 'stars_dfa') or the 'machine_id' one of a registered DFA. The body is read in pieces and every byte is one input
+    symbol; reading stops as soon as the input is rejected.
+
+    Returns:
+        A JSON response with the run summary (see `DFARunner.finish`) or an
+        error message.
+        Possible HTTP status codes:
+        - 200: Simulation successful.
+        - 400: Bad request (e.g., missing or invalid DFA type).
+        - 404: Unknown machine id.
+
+    Exceptions:
+        - 500: Internal server error.
+    """
+    try:
+        dfa_type_str = str(request.args.get('dfa_type'))
+        machine_id = request.args.get('machine_id')
+
+        logger.info(f'Recieved dfa stream for type {dfa_type_str}')
+
+        try:
+            _, dfa = find_machine('dfa', machine_id, dfa_type_str)
+        except KeyError:
+            logger.error('Unknown machine id recieved')
+            return jsonify({'error': f'Unknown machine id {machine_id}'}), 404
+        except ValueError as e:
+            logger.error('Invalid DFA type recieved')
+            return jsonify({'error': str(e)}), 400
+        runner = dfa.runner()
+
+        while not runner.done:
+            chunk = request.stream.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            runner.feed(chunk)
+
+        return jsonify(runner.finish()), 200
+    except Exception as e:
+        logger.error(f'An unexpected error occured during stream simulation: {e}', exc_info=True)
+        return jsonify({'error': f'Internal Server Error: An unexpected error occured during simulation: '}),500
+
 @app.route('/simulate-cfg', methods=['POST'])
 def simulate_cfg():
     if not request.is_json:
@@ -207,16 +598,27 @@ def simulate_cfg():
     try:
         data = request.get_json()
         dfa_type = data.get('dfa_type')
+        machine_id = data.get('machine_id')
         input_str = data.get('dfa_input', '')
-        
-        if dfa_type == 'bets_dfa':
-            response_data = bets_cfg.simulate(input_str)
-        elif dfa_type == 'stars_dfa':
-            response_data = stars_cfg.simulate(input_str)
-        else:
-            return jsonify({'error': 'Invalid type'}), 400
+        trace = data.get('trace')
+
+        try:
+            parse_trace(trace)
+            timeout = parse_timeout(data.get('timeout'))
+            session = parse_session(data.get('session'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            machine_key, cfg = find_machine('cfg', machine_id, dfa_type)
+        except KeyError:
+            return jsonify({'error': f'Unknown machine id {machine_id}'}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
             
-        return jsonify(response_data), 200
+        return cached_response(machine_key, 'earley', input_str, trace, lambda: run_search('cfg', machine_key, cfg, input_str, trace, timeout, session)), 200
+    except SearchTimeout as e:
+        return timeout_response('cfg', e)
     except Exception as e:
         logger.error(f'CFG Error: {e}', exc_info=True)
         return jsonify({'error': 'Internal Server Error'}), 500
@@ -228,21 +630,109 @@ def simulate_pda():
     try:
         data = request.get_json()
         dfa_type = data.get('dfa_type')
+        machine_id = data.get('machine_id')
         input_str = data.get('dfa_input', '')
-        
-        if dfa_type == 'bets_dfa':
-            response_data = bets_pda.simulate(input_str)
-        elif dfa_type == 'stars_dfa':
-            response_data = stars_pda.simulate(input_str)
-        else:
-            return jsonify({'error': 'Invalid type'}), 400
+        trace = data.get('trace')
+
+        try:
+            parse_trace(trace)
+            timeout = parse_timeout(data.get('timeout'))
+            session = parse_session(data.get('session'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            machine_key, pda = find_machine('pda', machine_id, dfa_type)
+        except KeyError:
+            return jsonify({'error': f'Unknown machine id {machine_id}'}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
             
-        return jsonify(response_data), 200
+        return cached_response(machine_key, 'gss', input_str, trace, lambda: run_search('pda', machine_key, pda, input_str, trace, timeout, session)), 200
+    except SearchTimeout as e:
+        return timeout_response('pda', e)
     except Exception as e:
         logger.error(f'PDA Error: {e}', exc_info=True)
         return jsonify({'error': 'Internal Server Error'}), 500
 
 
+@app.route('/machines', methods=['POST'])
+def register_machine():
+    """Registers a user-defined machine.
+
+    Accepts a JSON POST request containing 'kind' ('dfa', 'cfg' or 'pda') and
+    'definition' (the machine, in the JSON shape of the frontend presets; see
+    `registry_logic`). The machine is validated and built once; simulate
+    requests then select it with the returned 'machine_id' instead of a
+    'dfa_type'.
+
+    The registry lives in the memory of the process that answers: with
+    several gunicorn workers or serverless instances, another process does
+    not know the id and answers 404. Registering is idempotent (the id is the
+    hash of the definition), so a client that gets a 404 for a machine id can
+    register the definition again and retry.
+
+    Returns:
+        A JSON response with the 'machine_id' and 'kind', or an error message.
+        Possible HTTP status codes:
+        - 200: The machine was already registered.
+        - 201: Machine registered.
+        - 400: Bad request (e.g., unknown kind, invalid definition).
+        - 415: Unsupported media type (request not JSON).
+
+    Exceptions:
+        - 500: Internal server error.
+    """
+    if not request.is_json:
+        logger.warning('Request is not a JSON object.')
+        return jsonify({'error': 'Invalid request format: must be a JSON object.'}), 415
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No JSON object recieved.'}), 400
+
+        kind = str(data.get('kind'))
+        try:
+            machine_id, new = registry.register(kind, data.get('definition'))
+        except ValueError as e:
+            logger.error(f'Invalid machine definition recieved: {e}')
+            return jsonify({'error': str(e)}), 400
+
+        logger.info(f'Registered {kind} {machine_id}')
+        return jsonify({'machine_id': machine_id, 'kind': kind}), 201 if new else 200
+    except Exception as e:
+        logger.error(f'An unexpected error occured during registration: {e}', exc_info=True)
+        return jsonify({'error': 'Internal Server Error: An unexpected error occured during registration.'}), 500
+
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """Reports the result cache statistics.
+
+    Returns:
+        A JSON response with the hit, miss, eviction and expiry counts and the
+        current size of `result_cache` (see `ResultCache.stats`).
+        Possible HTTP status codes:
+        - 200: Always.
+    """
+    return jsonify(result_cache.stats()), 200
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Exports the request and search-effort metrics for Prometheus.
+
+    Returns:
+        The metrics of `metrics` in the Prometheus text exposition format:
+        request and error counts and latency histograms per endpoint, and per
+        machine kind and engine the step, configuration, peak frontier and
+        trace length histograms and the pruned and limit-hit counts.
+        Possible HTTP status codes:
+        - 200: Always.
+    """
+    return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8'), 200
+
+
 if __name__ == '__main__':
     # logger_setup()
     # app.run(host='0.0.0.0', port=8000)
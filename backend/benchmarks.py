@@ -0,0 +1,259 @@
+"""Reproducible micro-benchmarks for the DFA, PDA and CFG engines.
+
+Runs every built-in machine (`bets_*`, `stars_*`) of the app on generated inputs
+of scaled lengths and reports, per (machine, engine, case, size), the latency
+percentiles over repeated runs, the throughput in symbols per second and the
+peak memory of one extra run under `tracemalloc`.
+
+Cases:
+
+- accepting: a word of exactly the given length in the language.
+- rejecting: a word of that length that stays out of the dead states but ends
+  in a non-final state, so the whole input is read.
+- adversarial: a rejecting word that also avoids the accepting sinks (so no
+  early exit applies) followed by a symbol outside the alphabet, so the run is
+  only rejected at its last symbol.
+
+Inputs come from a seeded generator, so two runs with the same options time the
+same words. Usage:
+
+    python benchmarks.py --out before.json
+    python benchmarks.py --out after.json --compare before.json
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+DEFAULT_SIZES = (10, 100, 1000, 10_000, 100_000, 1_000_000)
+# The PDA and CFG searches are much slower per symbol; larger sizes are skipped for them unless raised.
+DEFAULT_SEARCH_MAX_SIZE = 100_000
+CASES = ('accepting', 'rejecting', 'adversarial')
+KINDS = ('dfa', 'pda', 'cfg')
+
+
+def exact_length_word(dfa, length: int, targets: set, allowed: set, rng: random.Random) -> str | None:
+    """
+    A random word of exactly `length` symbols that leads the DFA from its start
+    state to one of `targets` through `allowed` states only, or None if there is none.
+
+    The sets `ready[k]` of states that can finish in exactly `k` more steps are
+    eventually periodic in `k`, so they are only computed until one repeats.
+    """
+    symbols = sorted(dfa.alphabet)
+    step = {state: {symbol: dfa.transitions[state][symbol] for symbol in symbols if symbol in dfa.transitions.get(state, {})}
+            for state in allowed}
+    ready = [frozenset(targets & allowed)]
+    seen = {ready[0]: 0}
+    while True:
+        following = frozenset(state for state in allowed if any(target in ready[-1] for target in step[state].values()))
+        if following in seen:
+            loop_start = seen[following]
+            break
+        seen[following] = len(ready)
+        ready.append(following)
+    period = len(ready) - loop_start
+
+    def ready_at(remaining):
+        return ready[remaining] if remaining < len(ready) else ready[loop_start + (remaining - loop_start) % period]
+
+    state = dfa.start_state
+    if state not in ready_at(length):
+        return None
+    word = []
+    for remaining in range(length - 1, -1, -1):
+        finishing = ready_at(remaining)
+        symbol = rng.choice([symbol for symbol, target in step[state].items() if target in finishing])
+        word.append(symbol)
+        state = step[state][symbol]
+    return ''.join(word)
+
+
+def make_input(dfa, case: str, size: int, rng: random.Random) -> str | None:
+    """The input of `case` with `size` symbols for the language of `dfa`, or None if it has none."""
+    live = set(dfa.states) - dfa.dead_states() - set(dfa.trap_states)
+    if case == 'accepting':
+        return exact_length_word(dfa, size, set(dfa.final_states), live, rng)
+    if case == 'rejecting':
+        return exact_length_word(dfa, size, live - set(dfa.final_states), live, rng)
+    inner = live - dfa.accepting_sink_states()
+    word = exact_length_word(dfa, size - 1, inner, inner, rng)
+    outside = next(symbol for symbol in '#$%&x?' if symbol not in dfa.alphabet)
+    return None if word is None else word + outside
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = max(0, min(len(sorted_values) - 1, -(-len(sorted_values) * fraction // 1) - 1))
+    return sorted_values[int(index)]
+
+
+def measure(run, size: int, repeat: int, warmup: int) -> dict:
+    """Times `run()` after `warmup` untimed calls, then measures its peak traced memory once."""
+    for _ in range(warmup):
+        run()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    median = percentile(timings, 0.5)
+    return {
+        'runs': repeat,
+        'min_s': timings[0],
+        'p50_s': median,
+        'p90_s': percentile(timings, 0.9),
+        'p99_s': percentile(timings, 0.99),
+        'max_s': timings[-1],
+        'symbols_per_s': size / median if median > 0 else None,
+        'peak_bytes': peak,
+        'accepted': result['accepted']
+    }
+
+
+def run_suite(machines=('bets', 'stars'), kinds=KINDS, cases=CASES, sizes=DEFAULT_SIZES,
+              search_max_size: int = DEFAULT_SEARCH_MAX_SIZE, repeat: int = 5, warmup: int = 1,
+              trace: str = 'none', seed: int = 0, progress=None) -> dict:
+    """
+    Runs the benchmarks.
+
+    Args:
+        machines: Built-in machine names, e.g. 'bets' for `bets_dfa`, `bets_pda` and `bets_cfg`.
+        kinds: Engines to time: 'dfa', 'pda' and/or 'cfg'.
+        cases: Input cases, see the module docstring.
+        sizes: Input lengths.
+        search_max_size: Largest size run on the PDA and CFG.
+        repeat: Timed runs per benchmark.
+        warmup: Untimed runs before them.
+        trace: Trace mode passed to `simulate` (see `trace_logic`).
+        seed: Seed of the input generator.
+        progress: Called with each result as it is produced.
+
+    Returns:
+        A JSON-serializable dict with the run settings under 'meta' and one entry per benchmark under 'results'.
+    """
+    import app
+
+    results = []
+    for name in machines:
+        builtin = app.BUILTIN_MACHINES[f'{name}_dfa']
+        dfa = builtin['dfa'].get()
+        for case in cases:
+            for size in sizes:
+                # One generator per input, so adding machines, cases or sizes does not change the other inputs.
+                word = make_input(dfa, case, size, random.Random(f'{seed}:{name}:{case}:{size}'))
+                if word is None:
+                    continue
+                for kind in kinds:
+                    if kind != 'dfa' and size > search_max_size:
+                        continue
+                    machine = builtin[kind].get()
+                    entry = {'machine': f'{name}_{kind}', 'case': case, 'size': size}
+                    entry.update(measure(lambda: machine.simulate(word, trace=trace), size, repeat, warmup))
+                    results.append(entry)
+                    if progress is not None:
+                        progress(entry)
+    return {
+        'meta': {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machines': list(machines),
+            'kinds': list(kinds),
+            'cases': list(cases),
+            'sizes': list(sizes),
+            'search_max_size': search_max_size,
+            'repeat': repeat,
+            'warmup': warmup,
+            'trace': trace,
+            'seed': seed
+        },
+        'results': results
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list[dict]:
+    """
+    Matches the results of two runs by (machine, case, size).
+
+    Returns:
+        One entry per benchmark present in both, with the ratio of the median
+        times (current / baseline) and whether it is a regression, i.e. slower
+        by more than `threshold`.
+    """
+    before = {(entry['machine'], entry['case'], entry['size']): entry for entry in baseline['results']}
+    rows = []
+    for entry in current['results']:
+        old = before.get((entry['machine'], entry['case'], entry['size']))
+        if old is None or not old['p50_s']:
+            continue
+        ratio = entry['p50_s'] / old['p50_s']
+        rows.append({
+            'machine': entry['machine'],
+            'case': entry['case'],
+            'size': entry['size'],
+            'baseline_p50_s': old['p50_s'],
+            'p50_s': entry['p50_s'],
+            'ratio': ratio,
+            'regression': ratio > 1 + threshold
+        })
+    return rows
+
+
+def _format(entry: dict) -> str:
+    rate = entry['symbols_per_s']
+    return (f"{entry['machine']:<10} {entry['case']:<11} {entry['size']:>9} "
+            f"p50 {entry['p50_s'] * 1e3:10.3f} ms  p99 {entry['p99_s'] * 1e3:10.3f} ms  "
+            f"{(rate or 0):14,.0f} sym/s  peak {entry['peak_bytes'] / 1024:10.1f} KiB")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the DFA, PDA and CFG engines on the built-in machines.')
+    parser.add_argument('--machines', nargs='+', default=['bets', 'stars'], choices=['bets', 'stars'])
+    parser.add_argument('--kinds', nargs='+', default=list(KINDS), choices=KINDS)
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=CASES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES), help='input lengths (default: 10 to 10^6)')
+    parser.add_argument('--search-max-size', type=int, default=DEFAULT_SEARCH_MAX_SIZE,
+                        help=f'largest size run on the PDA and CFG (default: {DEFAULT_SEARCH_MAX_SIZE})')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per benchmark')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs before them')
+    parser.add_argument('--trace', default='none', help='trace mode passed to simulate (default: none)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the input generator')
+    parser.add_argument('--out', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown of the median counted as a regression (default: 0.10)')
+    args = parser.parse_args(argv)
+    if args.repeat < 1 or args.warmup < 0:
+        parser.error('--repeat must be at least 1 and --warmup at least 0')
+
+    report = run_suite(args.machines, args.kinds, args.cases, args.sizes, args.search_max_size,
+                       args.repeat, args.warmup, args.trace, args.seed, progress=lambda entry: print(_format(entry), flush=True))
+    if args.out:
+        with open(args.out, 'w') as stream:
+            json.dump(report, stream, indent=2)
+
+    if not args.compare:
+        return 0
+    with open(args.compare) as stream:
+        rows = compare(json.load(stream), report, args.threshold)
+    print()
+    for row in rows:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f"{row['machine']:<10} {row['case']:<11} {row['size']:>9}  x{row['ratio']:.2f}{flag}")
+    return 1 if any(row['regression'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,376 @@
+"""Versioned binary images of DFAs, CFGs and PDAs.
+
+An image is a fixed header, a section directory and 8-byte aligned sections:
+
+    header      magic b'AUTOMATA', format version (u16), kind (u16), flags (u32),
+                section count (u32), 4 bytes of padding
+    directory   one entry per section: tag (4 bytes), offset (u64), length (u64)
+    sections    little-endian arrays
+
+Every image has a 'STRS' string table (u32 count, u32 end offsets, UTF-8
+bytes); the other sections refer to symbols by their index in it.
+
+A DFA image holds the tables of `CompiledDFA` in the form the simulation loops
+read them: the int32 transition, fast and verdict tables, the int64 state ids
+and one byte per state for the row, accept, trap, dead and accepting-sink
+flags. `load` memory-maps the file and the loaded DFA runs straight on the
+mapping, so forked workers share one copy through the page cache and nothing is
+validated or rebuilt. A PDA image holds its transitions and a CFG image its
+rules as int64 records. Their engines work on Python dicts, so loading rebuilds
+them from those tables (without the JSON parsing and checks of `registry_logic`).
+
+Images are trusted: `load` checks the header and the section bounds, not the
+tables. Write them with `dump` from machines that passed validation.
+"""
+from array import array
+from functools import cached_property
+import mmap
+import os
+import struct
+import sys
+
+from cfg_logic import CFG
+from dfa_logic import DFA, CompiledDFA
+from pda_logic import PDA
+
+MAGIC = b'AUTOMATA'
+FORMAT_VERSION = 1
+
+KIND_DFA = 1
+KIND_CFG = 2
+KIND_PDA = 3
+
+# Header flag: the machine was built with `early_exit`.
+FLAG_EARLY_EXIT = 1
+
+_HEADER = struct.Struct('<8sHHII4x')
+_ENTRY = struct.Struct('<4s4xQQ')
+_ALIGN = 8
+_DFA_META = struct.Struct('<QQQ')    # states, alphabet size, dense start index
+_PDA_META = struct.Struct('<qQ')     # start state, initial stack symbol
+_CFG_META = struct.Struct('<Q')      # start symbol
+_LITTLE = sys.byteorder == 'little'
+
+
+def _pack(typecode: str, values) -> bytes:
+    packed = array(typecode, values)
+    if not _LITTLE:
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _view(section: memoryview, typecode: str):
+    """The section as an array of `typecode`; a zero-copy view on little-endian hosts."""
+    if _LITTLE:
+        return section.cast(typecode)
+    values = array(typecode, bytes(section))
+    values.byteswap()
+    return values
+
+
+class _Strings:
+    """String table builder: hands out one index per distinct string, in order of first use."""
+
+    def __init__(self):
+        self.items = []
+        self._index = {}
+
+    def __call__(self, value: str) -> int:
+        index = self._index.get(value)
+        if index is None:
+            index = self._index[value] = len(self.items)
+            self.items.append(value)
+        return index
+
+    def encode(self) -> bytes:
+        blobs = [item.encode('utf-8') for item in self.items]
+        ends, total = [], 0
+        for blob in blobs:
+            total += len(blob)
+            ends.append(total)
+        return _pack('I', [len(blobs)]) + _pack('I', ends) + b''.join(blobs)
+
+
+def _decode_strings(section: memoryview) -> list[str]:
+    count = _view(section[:4], 'I')[0]
+    ends = _view(section[4:4 + 4 * count], 'I')
+    blob = section[4 + 4 * count:]
+    items, begin = [], 0
+    for end in ends:
+        items.append(str(blob[begin:end], 'utf-8'))
+        begin = end
+    return items
+
+
+def _state_ids(states) -> list[int]:
+    states = sorted(states, key=lambda state: (type(state).__name__, state))
+    if not all(isinstance(state, int) for state in states):
+        raise ValueError('Binary images need integer state ids.')
+    return states
+
+
+def dumps(machine) -> bytes:
+    """
+    Serializes a DFA, CFG or PDA.
+
+    Raises:
+        ValueError: The machine has non-integer states, or a DFA too large for int32 tables.
+        TypeError: Not a DFA, CFG or PDA.
+    """
+    strings = _Strings()
+    flags = FLAG_EARLY_EXIT if getattr(machine, 'early_exit', False) else 0
+    if isinstance(machine, DFA):
+        kind, sections = KIND_DFA, _dfa_sections(machine, strings)
+    elif isinstance(machine, PDA):
+        kind, sections = KIND_PDA, _pda_sections(machine, strings)
+    elif isinstance(machine, CFG):
+        kind, sections = KIND_CFG, _cfg_sections(machine, strings)
+    else:
+        raise TypeError(f'Cannot serialize a {type(machine).__name__}: must be a DFA, CFG or PDA.')
+    sections = [(b'STRS', strings.encode())] + sections
+
+    offset = _HEADER.size + _ENTRY.size * len(sections)
+    directory, body = [], []
+    for tag, data in sections:
+        padding = -offset % _ALIGN
+        body.append(bytes(padding))
+        offset += padding
+        directory.append(_ENTRY.pack(tag, offset, len(data)))
+        body.append(data)
+        offset += len(data)
+    return _HEADER.pack(MAGIC, FORMAT_VERSION, kind, flags, len(sections)) + b''.join(directory) + b''.join(body)
+
+
+def _dfa_sections(dfa: DFA, strings: _Strings) -> list:
+    compiled = dfa.compile()
+    size = len(compiled.state_ids)
+    if (size + 2) * compiled._stride >= 1 << 31:
+        raise ValueError(f'A DFA with {size} states and {compiled.width} symbols is too large for int32 tables.')
+    for symbol in compiled.symbols:
+        strings(symbol)
+    return [
+        (b'META', _DFA_META.pack(size, compiled.width, compiled.start)),
+        (b'SIDS', _pack('q', _state_ids(compiled.state_ids))),
+        (b'TABL', _pack('i', compiled.table)),
+        (b'FAST', _pack('i', compiled._fast)),
+        (b'VERD', _pack('i', compiled._verdict)),
+        (b'ROWS', bytes(compiled.has_row)),
+        (b'ACPT', bytes(compiled.accept)),
+        (b'TRAP', bytes(compiled.trap)),
+        (b'DEAD', bytes(compiled.dead)),
+        (b'SINK', bytes(compiled.accepting_sink))
+    ]
+
+
+def _pda_sections(pda: PDA, strings: _Strings) -> list:
+    input_alphabet = [strings(symbol) for symbol in sorted(pda.input_alphabet)]
+    stack_alphabet = [strings(symbol) for symbol in sorted(pda.stack_alphabet)]
+    # One record per move, in the order of the transition dicts: that order decides the search order.
+    records, pushed = [], []
+    for state, by_input in pda.transitions.items():
+        for symbol, by_top in by_input.items():
+            for stack_top, moves in by_top.items():
+                for next_state, push in moves:
+                    records += [state, strings(symbol), strings(stack_top), next_state, len(pushed), len(pushed) + len(push)]
+                    pushed += [strings(item) for item in push]
+    return [
+        (b'META', _PDA_META.pack(pda.start_state, strings(pda.initial_stack))),
+        (b'STAT', _pack('q', _state_ids(pda.states))),
+        (b'FINL', _pack('q', _state_ids(pda.final_states))),
+        (b'INAL', _pack('i', input_alphabet)),
+        (b'STAL', _pack('i', stack_alphabet)),
+        (b'TRNS', _pack('q', records)),
+        (b'PUSH', _pack('i', pushed))
+    ]
+
+
+def _cfg_sections(cfg: CFG, strings: _Strings) -> list:
+    variables = [strings(symbol) for symbol in sorted(cfg.variables)]
+    terminals = [strings(symbol) for symbol in sorted(cfg.terminals)]
+    records, bodies = [], []
+    for rule in cfg.rules:
+        records += [strings(rule['from']), len(bodies), len(bodies) + len(rule['to'])]
+        bodies += [strings(symbol) for symbol in rule['to']]
+    return [
+        (b'META', _CFG_META.pack(strings(cfg.start_symbol))),
+        (b'VARS', _pack('i', variables)),
+        (b'TERM', _pack('i', terminals)),
+        (b'RULE', _pack('q', records)),
+        (b'BODY', _pack('i', bodies))
+    ]
+
+
+def dump(machine, path):
+    """
+    Writes the image of `machine` to `path`. The file is written beside it and
+    renamed into place, so processes that have the old image mapped keep reading
+    a consistent copy.
+    """
+    data = dumps(machine)
+    staging = f'{os.fspath(path)}.tmp{os.getpid()}'
+    with open(staging, 'wb') as stream:
+        stream.write(data)
+    os.replace(staging, path)
+
+
+def loads(data):
+    """
+    Loads a machine from an image held in a bytes-like object. A DFA keeps
+    views of `data` instead of copies.
+
+    Raises:
+        ValueError: Not an image, an unsupported format version or truncated sections.
+    """
+    view = memoryview(data).cast('B')
+    if len(view) < _HEADER.size:
+        raise ValueError('Not a machine image: too short.')
+    magic, version, kind, flags, count = _HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise ValueError('Not a machine image: bad magic number.')
+    if version != FORMAT_VERSION:
+        raise ValueError(f'Unsupported machine image version {version}: this build reads version {FORMAT_VERSION}.')
+    if len(view) < _HEADER.size + _ENTRY.size * count:
+        raise ValueError('Truncated machine image: the section directory is incomplete.')
+    sections = {}
+    for entry in range(count):
+        tag, offset, length = _ENTRY.unpack_from(view, _HEADER.size + _ENTRY.size * entry)
+        if offset + length > len(view):
+            raise ValueError(f'Truncated machine image: section {tag.decode("ascii", "replace")} ends past the data.')
+        sections[tag.decode('ascii')] = view[offset:offset + length]
+    strings = _decode_strings(sections['STRS'])
+    early_exit = bool(flags & FLAG_EARLY_EXIT)
+    if kind == KIND_DFA:
+        return MappedDFA(MappedCompiledDFA(sections, strings))
+    if kind == KIND_PDA:
+        return _load_pda(sections, strings, early_exit)
+    if kind == KIND_CFG:
+        return _load_cfg(sections, strings, early_exit)
+    raise ValueError(f'Unknown machine kind {kind} in image.')
+
+
+def load(path, use_mmap: bool = True):
+    """
+    Loads a machine image from a file.
+
+    Args:
+        path: The image file.
+        use_mmap: Map the file read-only instead of reading it. The mapping is
+            released when the loaded machine is no longer referenced.
+    """
+    with open(path, 'rb') as stream:
+        if not use_mmap or os.fstat(stream.fileno()).st_size == 0:
+            return loads(stream.read())
+        return loads(mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+def _load_pda(sections: dict, strings: list, early_exit: bool) -> PDA:
+    start_state, initial_stack = _PDA_META.unpack(sections['META'])
+    records = _view(sections['TRNS'], 'q')
+    pushed = _view(sections['PUSH'], 'i')
+    transitions = {}
+    for begin in range(0, len(records), 6):
+        state, symbol, stack_top, next_state, push_begin, push_end = records[begin:begin + 6]
+        moves = transitions.setdefault(state, {}).setdefault(strings[symbol], {}).setdefault(strings[stack_top], [])
+        moves.append((next_state, [strings[item] for item in pushed[push_begin:push_end]]))
+    return PDA(
+        states=set(_view(sections['STAT'], 'q')),
+        input_alphabet={strings[index] for index in _view(sections['INAL'], 'i')},
+        stack_alphabet={strings[index] for index in _view(sections['STAL'], 'i')},
+        transitions=transitions,
+        start_state=start_state,
+        initial_stack=strings[initial_stack],
+        final_states=set(_view(sections['FINL'], 'q')),
+        early_exit=early_exit
+    )
+
+
+def _load_cfg(sections: dict, strings: list, early_exit: bool) -> CFG:
+    start_symbol, = _CFG_META.unpack(sections['META'])
+    records = _view(sections['RULE'], 'q')
+    bodies = _view(sections['BODY'], 'i')
+    rules = [{'from': strings[records[begin]], 'to': [strings[index] for index in bodies[records[begin + 1]:records[begin + 2]]]}
+             for begin in range(0, len(records), 3)]
+    return CFG(
+        variables={strings[index] for index in _view(sections['VARS'], 'i')},
+        terminals={strings[index] for index in _view(sections['TERM'], 'i')},
+        rules=rules,
+        start_symbol=strings[start_symbol],
+        early_exit=early_exit
+    )
+
+
+class _OffsetIds:
+    """Pre-multiplied row offset -> original state id, computed instead of stored (see `CompiledDFA.offset_ids`)."""
+
+    def __init__(self, state_ids, stride: int):
+        self.state_ids = state_ids
+        self.stride = stride
+
+    def __getitem__(self, offset: int):
+        return self.state_ids[offset // self.stride]
+
+
+class MappedCompiledDFA(CompiledDFA):
+    """A `CompiledDFA` whose tables are views of a machine image."""
+
+    def __init__(self, sections: dict, strings: list):
+        size, width, start = _DFA_META.unpack(sections['META'])
+        self.state_ids = _view(sections['SIDS'], 'q')
+        self.symbols: list = strings[:width]
+        self.columns: dict = {symbol: column for column, symbol in enumerate(self.symbols)}
+        self.width: int = width
+        self.table = _view(sections['TABL'], 'i')
+        self.has_row = sections['ROWS']
+        self.accept = sections['ACPT']
+        self.trap = sections['TRAP']
+        self.dead = sections['DEAD']
+        self.accepting_sink = sections['SINK']
+        self.start: int = start
+        self._stride: int = width + 1
+        self._sink: int = size * self._stride
+        self._accept_row: int = self._sink + self._stride
+        self._fast = _view(sections['FAST'], 'i')
+        self._verdict = _view(sections['VERD'], 'i')
+        self._fast_accept: bytes = bytes(self.accept) + b'\x00\x01'
+        self.offset_ids = _OffsetIds(self.state_ids, self._stride)
+        self._build_encoder()
+
+    @cached_property
+    def state_index(self) -> dict:
+        return {state: index for index, state in enumerate(self.state_ids)}
+
+
+class MappedDFA(DFA):
+    """
+    A DFA loaded from a machine image. It simulates on its compiled tables;
+    `states`, `transitions`, `final_states` and `trap_states` are only rebuilt
+    as sets and dicts when they are read.
+    """
+
+    def __init__(self, compiled: MappedCompiledDFA):
+        # No validation: the image was written from a DFA that passed it.
+        self._compiled = compiled
+        self.alphabet = set(compiled.symbols)
+        self.start_state = compiled.state_ids[compiled.start]
+
+    @cached_property
+    def states(self) -> set:
+        return set(self._compiled.state_ids)
+
+    @cached_property
+    def final_states(self) -> set:
+        compiled = self._compiled
+        return {state for index, state in enumerate(compiled.state_ids) if compiled.accept[index]}
+
+    @cached_property
+    def trap_states(self) -> set:
+        compiled = self._compiled
+        return {state for index, state in enumerate(compiled.state_ids) if compiled.trap[index]}
+
+    @cached_property
+    def transitions(self) -> dict:
+        compiled = self._compiled
+        state_ids, width = compiled.state_ids, compiled.width
+        return {state_ids[row]: {symbol: state_ids[compiled.table[row * width + column]]
+                                 for column, symbol in enumerate(compiled.symbols) if compiled.table[row * width + column] >= 0}
+                for row in range(len(state_ids)) if compiled.has_row[row]}
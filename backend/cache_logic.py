@@ -0,0 +1,112 @@
+"""Bounded LRU cache for simulation results, shared by the simulate endpoints.
+
+Keys are tuples such as `(machine id, machine version, engine, input, trace)`;
+values are the serialized responses, so a hit skips both the simulation and
+the JSON encoding.
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+class ResultCache:
+    """
+    Thread-safe LRU cache bounded by its number of entries and by the total
+    size of its values, with an optional time-to-live.
+
+    Lookups and updates take one lock, so a cache can be shared by the
+    threads of a worker. Values are computed outside of it: two threads that
+    miss on the same key at once both compute it and the last `put` wins.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024, ttl: float | None = None,
+                 sizeof=len, clock=time.monotonic):
+        """Creates an empty cache.
+
+        Args:
+            max_entries: The most entries kept at once.
+            max_bytes: The most total value size kept at once. A value larger
+                than this is never cached.
+            ttl: Seconds an entry stays valid after it is stored, or None for
+                no expiry.
+            sizeof: Maps a value to its size. Defaults to `len`, for bytes.
+            clock: Returns the current time in seconds, for the TTL.
+        """
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError('A result cache needs room for at least one entry and one byte.')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (value, size, expiry time or None), least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the value stored under `key` and marks it recently used, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= self.clock():
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value) -> bool:
+        """
+        Stores `value` under `key`, evicting least recently used entries
+        until both bounds hold again.
+
+        Returns:
+            Whether the value was stored; one larger than `max_bytes` is not.
+        """
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return False
+        expiry = None if self.ttl is None else self.clock() + self.ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expiry)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key):
+        self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        """Drops every entry; the statistics are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """The hit, miss, eviction and expiry counts and the current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl': self.ttl
+            }
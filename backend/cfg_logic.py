@@ -1,72 +1,783 @@
 from collections import deque
 import logging
+import math
+import threading
+import time
+
+from checkpoint_logic import shared_prefix
+from metrics_logic import SearchStats
+from trace_logic import TraceRecorder
 
 logger = logging.getLogger(__name__)
 
 class CFG:
-    """Class for simulating a Context-Free Grammar derivation via Leftmost Breadth-First-Search."""
+    """Class for simulating a Context-Free Grammar derivation with an Earley parser (or Leftmost Breadth-First-Search)."""
     
-    def __init__(self, variables: set[str], terminals: set[str], rules: list[dict], start_symbol: str):
+    def __init__(self, variables: set[str], terminals: set[str], rules: list[dict], start_symbol: str,
+                 early_exit: bool = False):
+        """
+        The grammar is compiled once (see `_compile`). Forms containing a
+        variable that cannot derive any terminal string, and forms that must
+        derive more characters than the target has, are always dropped from
+        the search (this never changes the result). With `early_exit`, a form
+        whose only variable is a trailing accepting sink (see
+        `_analyse_variables`) is completed directly, symbol by symbol.
+        """
         self.variables = variables
         self.terminals = terminals
         self.rules = rules
         self.start_symbol = start_symbol
+        self.early_exit = early_exit
+        self.generating, self.sink_rules = self._analyse_variables()
+        self._compile()
+
+    def _compile(self):
+        """
+        One-time grammar preprocessing shared by both engines.
+
+        - `_rhs`: the rule bodies without 'ε' markers.
+        - `_null_rule`: the nullable variables, see `_analyse_nullable`.
+        - `_min_yield`: the fewest characters each generating variable derives.
+        - `reachable`: the variables reachable from the start symbol through
+          rules without non-generating variables.
+        - `_by_lhs` and `_expansions`: per reachable variable, in rule order,
+          the indices of its useful rules (those without non-generating
+          variables) and `(rule, min yield of its body)` pairs. No other rule
+          can appear in a derivation of a terminal string.
+        """
+        self._rhs = [tuple(sym for sym in rule['to'] if sym != 'ε') for rule in self.rules]
+        self._null_rule = self._analyse_nullable()
+
+        useful = [index for index, body in enumerate(self._rhs)
+                  if all(sym not in self.variables or sym in self.generating for sym in body)]
+        self._min_yield = {}
+        changed = True
+        while changed:
+            changed = False
+            for index in useful:
+                body_yield = self._body_yield(self._rhs[index])
+                variable = self.rules[index]['from']
+                if body_yield is not None and body_yield < self._min_yield.get(variable, body_yield + 1):
+                    self._min_yield[variable] = body_yield
+                    changed = True
+
+        by_lhs = {}
+        for index in useful:
+            by_lhs.setdefault(self.rules[index]['from'], []).append(index)
+        self.reachable = set()
+        pending = [self.start_symbol] if self.start_symbol in self.generating else []
+        while pending:
+            variable = pending.pop()
+            if variable in self.reachable:
+                continue
+            self.reachable.add(variable)
+            pending.extend(sym for index in by_lhs.get(variable, ()) for sym in self._rhs[index] if sym in self.variables)
+        self._by_lhs = {variable: tuple(by_lhs[variable]) for variable in self.reachable}
+        self._expansions = {variable: tuple((self.rules[index], self._body_yield(self._rhs[index])) for index in indices)
+                            for variable, indices in self._by_lhs.items()}
+
+    def _body_yield(self, symbols) -> int | None:
+        """The fewest characters `symbols` derive, or None if a variable has no known yield yet."""
+        total = 0
+        for sym in symbols:
+            if sym in self.variables:
+                if sym not in self._min_yield:
+                    return None
+                total += self._min_yield[sym]
+            elif sym != 'ε':
+                total += len(sym)
+        return total
+
+    def _analyse_variables(self) -> tuple[set, dict]:
+        """
+        Finds the generating variables (those that derive some terminal string)
+        and the accepting sinks: variables with an ε-rule and, for every
+        terminal, a rule `X -> terminal Y` where Y is again an accepting sink,
+        so they derive every terminal string through one fixed derivation.
 
-    def simulate(self, target_string: str, max_depth: int = 150) -> dict:
+        Returns:
+            The generating variables, and for each accepting sink the map
+            terminal -> first such Y in rule order.
+        """
+        generating = set()
+        changed = True
+        while changed:
+            changed = False
+            for rule in self.rules:
+                if rule['from'] not in generating and all(sym not in self.variables or sym in generating for sym in rule['to']):
+                    generating.add(rule['from'])
+                    changed = True
+
+        symbols = self.terminals - {'ε'}
+        sinks = {r['from'] for r in self.rules if r['to'] == ['ε']}
+        sink_rules = {}
+        changed = True
+        while changed:
+            changed = False
+            sink_rules = {}
+            for variable in list(sinks):
+                steps = {}
+                for rule in self.rules:
+                    to = rule['to']
+                    if rule['from'] == variable and len(to) == 2 and to[0] in symbols and to[1] in sinks:
+                        steps.setdefault(to[0], to[1])
+                if len(steps) < len(symbols):
+                    sinks.discard(variable)
+                    changed = True
+                else:
+                    sink_rules[variable] = steps
+        return generating, sink_rules
+
+    def _analyse_nullable(self) -> dict:
+        """
+        Finds the variables that derive the empty string.
+
+        Returns:
+            For each nullable variable, the first rule (in rule order) that
+            derives it empty using only variables found nullable before it,
+            so following these rules always terminates.
+        """
+        null_rule = {}
+        changed = True
+        while changed:
+            changed = False
+            for index, rule in enumerate(self.rules):
+                if rule['from'] not in null_rule and all(sym in null_rule for sym in self._rhs[index]):
+                    null_rule[rule['from']] = index
+                    changed = True
+        return null_rule
+
+    def simulate(self, target_string: str, max_depth: int = 150, trace: str | None = None, engine: str = 'earley',
+                 max_nodes: int | None = None, time_limit: float | None = None, stats: SearchStats | None = None) -> dict:
         """
         Simulate the CFG and find the leftmost derivation sequence for the target string.
+        `trace` picks how much of the returned `sequence` is kept, see `trace_logic`; 'rle'
+        encodes the leftmost variable of each form (the terminal string for the last one).
+
+        The default 'earley' engine parses with `_simulate_earley` and needs no
+        depth limit. The 'bfs' engine searches sentential forms breadth first
+        and gives up on derivations longer than `max_depth` steps. The 'iddfs'
+        engine finds the same derivation as 'bfs' in O(max_depth) memory and
+        stops after `max_nodes` forms or `time_limit` seconds, see
+        `_simulate_iddfs`.
+
+        `stats`, if given, receives the search-effort counters of the run, see
+        `metrics_logic`.
         """
-        queue = deque([([self.start_symbol], [])])
-        
+        if engine not in ('earley', 'bfs', 'iddfs'):
+            raise ValueError(f'Unknown CFG engine "{engine}": must be earley, bfs or iddfs.')
+        if stats is None:
+            stats = SearchStats()
+        if engine == 'earley':
+            return stats.finish(engine, self._simulate_earley(target_string, trace, stats))
+        valid_from = self._valid_from(target_string)
+        if engine == 'iddfs':
+            return stats.finish(engine, self._simulate_iddfs(target_string, max_depth, trace, max_nodes, time_limit, stats, valid_from))
+        return stats.finish(engine, self._simulate_bfs(target_string, max_depth, trace, stats, valid_from))
+
+    def _valid_from(self, target_string: str) -> int:
+        """The position from which every character of the target is a terminal (0 without early exit, where it is unused)."""
+        if not (self.early_exit and self.sink_rules):
+            return 0
+        for index in range(len(target_string) - 1, -1, -1):
+            if target_string[index] not in self.terminals:
+                return index + 1
+        return 0
+
+    def _simulate_bfs(self, target_string: str, max_depth: int, trace: str | None, stats: SearchStats, valid_from: int) -> dict:
+        """Breadth-first search over leftmost sentential forms, up to `max_depth` steps (see `simulate`)."""
+        recorder = TraceRecorder(trace, state_of=self._form_state)
+        # Queue entries carry the index of the leftmost variable, the terminal prefix before it
+        # and the form's minimum yield, all updated incrementally on each expansion.
+        start_form = [self.start_symbol]
+        lead, derived_prefix = self._scan_lead(start_form, 0, "")
+        queue = deque([(start_form, [], lead, derived_prefix, self._body_yield(start_form) or 0)])
+        forms = 1
+        peak = 1
+        pruned = 0
+
+        def tally(steps):
+            stats.steps += steps
+            stats.configurations += forms
+            stats.peak_frontier = max(stats.peak_frontier, peak)
+            stats.pruned += pruned
+
         while queue:
-            current_form, history = queue.popleft()
+            if len(queue) > peak:
+                peak = len(queue)
+            current_form, history, lead, derived_prefix, min_yield = queue.popleft()
             
             # Check if all elements are terminals or epsilon
-            if not any(symbol in self.variables for symbol in current_form):
+            if lead == len(current_form):
                 current_str = "".join(s for s in current_form if s != 'ε')
                 if current_str == target_string:
+                    tally(forms - len(queue))
+                    recorder.extend(history)
+                    recorder.append(current_form)
                     return {
                         'input': target_string,
                         'accepted': True,
-                        'sequence': history + [current_form],
+                        'sequence': recorder.result(),
                         'error': None
                     }
                 continue 
 
             if len(history) >= max_depth:
+                stats.hit_limit = True
                 continue
 
-            # Prefix constraint: Check if the string derived so far matches the start of target
-            # Epsilon transitions are filtered out of the prefix.
-            derived_prefix = ""
-            valid_prefix = True
-            for sym in current_form:
-                if sym in self.terminals and sym != 'ε':
-                    derived_prefix += sym
-                elif sym in self.variables:
-                    break
-            
-            # Only prune if the derived string is strictly NOT a prefix of the target
-            # e.g. target='ab', derived='ac' -> prune.
-            if not target_string.startswith(derived_prefix):
-                continue
-            
-            # Leftmost derivation: find the first non-terminal
-            for i, symbol in enumerate(current_form):
-                if symbol in self.variables:
-                    applicable_rules = [r for r in self.rules if r['from'] == symbol]
-                    for rule in applicable_rules:
-                        replacement = rule['to'] if rule['to'] != ['ε'] else ['ε']
-                        new_form = current_form[:i] + replacement + current_form[i+1:]
-                        new_history = history + [current_form]
-                        # append to queue
-                        queue.append((new_form, new_history))
-                    break # Expand leftmost variable only
+            # Leftmost derivation: expand the first non-terminal
+            symbol = current_form[lead]
+            if self.early_exit and lead == len(current_form) - 1 and symbol in self.sink_rules \
+                    and len(derived_prefix) >= valid_from:
+                tally(forms - len(queue))
+                recorder.extend(history)
+                recorder.extend(self._complete_sink(current_form, target_string[len(derived_prefix):]))
+                return {
+                    'input': target_string,
+                    'accepted': True,
+                    'sequence': recorder.result(),
+                    'error': None
+                }
+            for rule, body_yield in self._expansions.get(symbol, ()):
+                # Length bound: the new form can never shrink below its minimum yield.
+                new_yield = min_yield - self._min_yield[symbol] + body_yield
+                if new_yield > len(target_string):
+                    pruned += 1
+                    continue
+                new_form = current_form[:lead] + rule['to'] + current_form[lead+1:]
+                new_lead, new_prefix = self._scan_lead(new_form, lead, derived_prefix)
+                # Prefix constraint: only keep forms whose derived prefix (ε filtered out) starts the
+                # target, e.g. target='ab', derived='ac' -> prune.
+                if new_lead < len(new_form) and not target_string.startswith(new_prefix):
+                    pruned += 1
+                    continue
+                queue.append((new_form, history + [current_form], new_lead, new_prefix, new_yield))
+                forms += 1
 
         # If loop exhausts queue without returning
+        tally(forms)
         return {
             'input': target_string,
             'accepted': False,
-            'sequence': [],
+            'sequence': recorder.result(),
             'error': f'Could not derive "{target_string}" or reached max depth limitations.'
         }
+
+    def _simulate_iddfs(self, target_string: str, max_depth: int, trace: str | None,
+                        max_nodes: int | None, time_limit: float | None, stats: SearchStats, valid_from: int) -> dict:
+        """
+        Iterative-deepening depth-first search over leftmost derivations.
+
+        Round `limit` (0 up to `max_depth`) searches derivations of at most
+        `limit` steps, trying rules in rule order, so the first derivation
+        found is the shortest one the BFS would reach first. Only the current
+        path is kept: a form is the matched part of `prefix` plus a persistent
+        stack `(symbol, rest, min yield)` of everything from its leftmost
+        variable on, so memory is O(max_depth) besides the memo. The BFS
+        length-bound and prefix pruning apply, and every terminal is matched
+        against the target as soon as it leads the form.
+
+        A form whose leftmost variable V is also its last symbol, at position
+        p, succeeds exactly when V derives `target_string[p:]`. A failed search
+        from such a form is memoized as a dead `(V, p)` pair with the depth it
+        was searched to (unlimited when no branch was cut off), and later
+        forms skip it.
+
+        Each visited form counts against `max_nodes`; `time_limit` is checked
+        every 1024 forms. Running out of either returns a rejection with
+        `exhausted` set, which says nothing about the target; every other
+        result has `exhausted` False.
+        """
+        n = len(target_string)
+        deadline = None if time_limit is None else time.monotonic() + time_limit
+        dead = {}
+        nodes = 0
+        peak = 0
+        pruned = 0
+        prefix = []
+        recorder = self._stack_recorder(trace, prefix)
+
+        def tally():
+            stats.steps += nodes
+            stats.configurations += nodes
+            stats.peak_frontier = max(stats.peak_frontier, peak)
+            stats.pruned += pruned
+
+        def push(symbols, rest):
+            for sym in reversed(symbols):
+                sym_yield = self._min_yield.get(sym, 0) if sym in self.variables else (0 if sym == 'ε' else len(sym))
+                rest = (sym, rest, sym_yield + (rest[2] if rest else 0))
+            return rest
+
+        def lead(rest, pos):
+            # Moves the leading non-variables into `prefix`; None if one does not match the target.
+            while rest is not None and rest[0] not in self.variables:
+                if rest[0] != 'ε':
+                    if not target_string.startswith(rest[0], pos):
+                        return None
+                    pos += len(rest[0])
+                prefix.append(rest[0])
+                rest = rest[1]
+            return rest, pos
+
+        def accept(frames, rest, pos, sink):
+            tally()
+            recorder.extend((frame[2], frame[0]) for frame in frames)
+            recorder.append((len(prefix), rest))
+            if sink:
+                variable = rest[0]
+                for char in target_string[pos:]:
+                    prefix.append(char)
+                    variable = self.sink_rules[variable][char]
+                    recorder.append((len(prefix), (variable, None, 0)))
+                prefix.append('ε')
+                recorder.append((len(prefix), None))
+            return {
+                'input': target_string,
+                'accepted': True,
+                'sequence': recorder.result(),
+                'error': None,
+                'exhausted': False
+            }
+
+        for limit in range(max_depth + 1):
+            del prefix[:]
+            form = lead(push([self.start_symbol], None), 0)
+            if form is None:
+                break
+            frames = []  # [stack, position, prefix length, expansions left, memo key, cut off]
+            cut = False
+            while True:
+                if form is not None:
+                    rest, pos = form
+                    form = None
+                    nodes += 1
+                    if (max_nodes is not None and nodes > max_nodes) or \
+                            (deadline is not None and nodes % 1024 == 0 and time.monotonic() > deadline):
+                        tally()
+                        stats.hit_limit = True
+                        return {
+                            'input': target_string,
+                            'accepted': False,
+                            'sequence': recorder.result(),
+                            'error': f'Search budget exhausted after {nodes - 1} forms: could not decide "{target_string}".',
+                            'exhausted': True
+                        }
+                    depth = len(frames)
+                    if rest is None:
+                        if pos == n:
+                            return accept(frames, rest, pos, False)
+                        continue
+                    variable = rest[0]
+                    if depth < max_depth and self.early_exit and rest[1] is None and variable in self.sink_rules \
+                            and pos >= valid_from:
+                        return accept(frames, rest, pos, True)
+                    key = (variable, pos) if rest[1] is None else None
+                    searched = dead.get(key, -1) if key else -1
+                    if depth == limit or limit - depth <= searched:
+                        if depth < limit:
+                            pruned += 1
+                        if depth == limit or searched != math.inf:
+                            if frames:
+                                frames[-1][5] = True
+                            else:
+                                cut = True
+                        continue
+                    frames.append([rest, pos, len(prefix), iter(self._expansions.get(variable, ())), key, False])
+                    if len(frames) > peak:
+                        peak = len(frames)
+                    continue
+
+                if not frames:
+                    break
+                frame = frames[-1]
+                rest, pos = frame[0], frame[1]
+                for rule, body_yield in frame[3]:
+                    del prefix[frame[2]:]
+                    # Length bound: the new form can never shrink below its minimum yield.
+                    if pos + rest[2] - self._min_yield[rest[0]] + body_yield > n:
+                        pruned += 1
+                        continue
+                    form = lead(push(rule['to'], rest[1]), pos)
+                    if form is not None:
+                        break
+                    pruned += 1
+                else:
+                    frames.pop()
+                    if frame[4] is not None:
+                        dead[frame[4]] = max(dead.get(frame[4], -1), limit - len(frames) if frame[5] else math.inf)
+                    if frame[5]:
+                        if frames:
+                            frames[-1][5] = True
+                        else:
+                            cut = True
+            if not cut:
+                break
+
+        tally()
+        stats.hit_limit = cut
+        return {
+            'input': target_string,
+            'accepted': False,
+            'sequence': recorder.result(),
+            'error': f'Could not derive "{target_string}" or reached max depth limitations.',
+            'exhausted': False
+        }
+
+    def _scan_lead(self, form: list, index: int, prefix: str) -> tuple[int, str]:
+        """
+        Moves from `index` to the leftmost variable of `form`, adding the
+        terminals passed (not 'ε') to `prefix`. Returns the variable's index
+        (`len(form)` if there is none) and the extended prefix.
+        """
+        while index < len(form) and form[index] not in self.variables:
+            if form[index] in self.terminals and form[index] != 'ε':
+                prefix += form[index]
+            index += 1
+        return index, prefix
+
+    def _simulate_earley(self, target_string: str, trace: str | None, stats: SearchStats,
+                         chart: 'EarleyChart | None' = None) -> dict:
+        """
+        Earley parse of the target string, then one leftmost derivation
+        rebuilt from the chart.
+
+        An item `(rule, dot, origin)` in set j says that the first `dot`
+        symbols of the rule derive `target_string[origin:j]`. Every item keeps
+        the back-pointer it was first added with, which only refers to items
+        added before it, so the derivation is read back without any search.
+        Nullable variables are stepped over when predicted (Aycock-Horspool),
+        and chains of right-recursive completions are collapsed into their
+        topmost item (Leo), so right-linear grammars such as the ones `app.py`
+        derives from DFAs parse in linear time. Other grammars take O(n³) at
+        most, O(n²) when unambiguous.
+
+        An unambiguous grammar has a single leftmost derivation per string,
+        so the sequence is the one the 'bfs' engine finds. `early_exit` only
+        changes the 'bfs' search; the chart never looks past the input.
+
+        `chart`, if given, is the `EarleyChart` of an earlier call, re-parsed
+        from where the inputs differ (see `IncrementalCFG`).
+        """
+        prefix = []
+        recorder = self._stack_recorder(trace, prefix)
+        if self.start_symbol in self.variables:
+            if chart is None:
+                chart = EarleyChart(self)
+            chart.parse(target_string, stats)
+            # Without a trace, only whether there is a derivation matters.
+            derivation = chart.derivation(build=recorder.mode != 'none')
+        else:
+            derivation = [] if target_string == ('' if self.start_symbol == 'ε' else self.start_symbol) else None
+        if derivation is None:
+            return {
+                'input': target_string,
+                'accepted': False,
+                'sequence': recorder.result(),
+                'error': f'Could not derive "{target_string}": it is not in the language of the grammar.'
+            }
+
+        # Replay the rules on the leftmost form, kept as the terminals before its leftmost
+        # variable plus a persistent stack `(symbol, rest)` of everything from that variable on.
+        rest = (self.start_symbol, None)
+        for index in [None] + derivation:
+            if index is not None:
+                rest = rest[1]
+                for sym in reversed(self.rules[index]['to']):
+                    rest = (sym, rest)
+            while rest is not None and rest[0] not in self.variables:
+                prefix.append(rest[0])
+                rest = rest[1]
+            recorder.append((len(prefix), rest))
+        return {
+            'input': target_string,
+            'accepted': True,
+            'sequence': recorder.result(),
+            'error': None
+        }
+
+    def incremental(self) -> 'IncrementalCFG':
+        """A run that re-parses edited inputs from where they differ from the last one (see `IncrementalCFG`)."""
+        return IncrementalCFG(self)
+
+    def _stack_recorder(self, trace: str | None, prefix: list) -> TraceRecorder:
+        """
+        A recorder for `(length, stack)` entries, the form `prefix[:length]`
+        followed by the symbols of the persistent stack. `prefix` is shared
+        and only ever grows along one derivation, so it is read at render time.
+        """
+        return TraceRecorder(trace, render=lambda entry: prefix[:entry[0]] + self._unstack(entry[1]),
+                             state_of=lambda entry: entry[1][0] if entry[1] else "".join(s for s in prefix[:entry[0]] if s != 'ε'))
+
+    @staticmethod
+    def _unstack(rest: tuple | None) -> list:
+        """The symbols of a persistent `(symbol, rest)` stack, top first."""
+        symbols = []
+        while rest is not None:
+            symbols.append(rest[0])
+            rest = rest[1]
+        return symbols
+
+    def _complete_sink(self, form: list, rest: str) -> list:
+        """Derives `rest` from the trailing accepting sink of `form`; returns `form` and every form after it."""
+        forms = [form]
+        prefix, variable = form[:-1], form[-1]
+        for char in rest:
+            prefix = prefix + [char]
+            variable = self.sink_rules[variable][char]
+            forms.append(prefix + [variable])
+        forms.append(prefix + ['ε'])
+        return forms
+
+    def _form_state(self, form: list) -> str:
+        """The leftmost variable of a sentential form, or its terminal string."""
+        for symbol in form:
+            if symbol in self.variables:
+                return symbol
+        return "".join(s for s in form if s != 'ε')
+
+
+class EarleyChart:
+    """
+    The chart of the Earley recognizer of `CFG._simulate_earley`, kept
+    between calls to `parse`.
+
+    Set j is final once it has been processed: later sets never add to it.
+    Processing it reads at most `lookahead` characters from j on (the longest
+    terminal), so it stays valid while they do not change. `parse` rolls the
+    chart back to the last set that is still valid for the new input, using
+    the agenda lengths recorded before each set was processed, and goes on
+    from there.
+    """
+
+    def __init__(self, cfg: CFG):
+        self.cfg = cfg
+        self.text = ''
+        self.kept = 0
+        self.lookahead = max([len(sym) for body in cfg._rhs for sym in body if sym not in cfg.variables] + [1])
+        self.sets = [{}]  # item -> back-pointer: None, ('scan',), ('null',), ('child', origin, item) or ('leo', origin, item)
+        self.agendas = [[]]
+        # Per processed set: the items with the dot right before each variable, the tops of the Leo
+        # chains started there, the Leo completions added to it, and the agenda lengths of the sets
+        # it can scan into as they were before it was processed.
+        self.waiting = []
+        self.leo_tops = []
+        self.triggers = []
+        self.marks = []
+        for index in cfg._by_lhs.get(cfg.start_symbol, ()):
+            self.sets[0][(index, 0, 0)] = None
+            self.agendas[0].append((index, 0, 0))
+
+    def parse(self, text: str, stats: SearchStats):
+        """
+        Brings the chart up to date with `text`, counting the items of the
+        sets it processes in `stats`. `kept` is then the number of sets kept
+        from the last call.
+        """
+        shared = shared_prefix(self.text, text)
+        if shared == len(self.text) == len(text):
+            keep = len(self.marks)
+        else:
+            keep = min(len(self.marks), max(0, shared - self.lookahead + 1))
+        if keep < len(self.marks):
+            self._rollback(keep)
+        self.text = text
+        n = len(text)
+        # Sets past the kept ones only hold items scanned from the shared prefix, so none lies past `n`.
+        del self.sets[n + 1:], self.agendas[n + 1:]
+        while len(self.sets) <= n:
+            self.sets.append({})
+            self.agendas.append([])
+        if keep <= n:
+            self._process(keep, stats)
+        self.kept = keep
+
+    def _rollback(self, keep: int):
+        """Restores the chart as it was right before set `keep` was processed."""
+        for offset, length in enumerate(self.marks[keep]):
+            agenda, items = self.agendas[keep + offset], self.sets[keep + offset]
+            del agenda[length:]
+            while len(items) > length:
+                items.popitem()
+        del self.sets[keep + len(self.marks[keep]):], self.agendas[keep + len(self.marks[keep]):]
+        del self.waiting[keep:], self.leo_tops[keep:], self.triggers[keep:], self.marks[keep:]
+
+    def _process(self, start: int, stats: SearchStats):
+        """Processes the sets from `start` to the end of the text."""
+        target_string = self.text
+        n = len(target_string)
+        cfg = self.cfg
+        rules, rhs, variables, null_rule, by_lhs = cfg.rules, cfg._rhs, cfg.variables, cfg._null_rule, cfg._by_lhs
+        sets, agendas, waiting, leo_tops = self.sets, self.agendas, self.waiting, self.leo_tops
+
+        def add(j, item, back):
+            if item not in sets[j]:
+                sets[j][item] = back
+                agendas[j].append(item)
+
+        def leo_top(position, variable):
+            # The topmost item of the deterministic completion chain started by `variable`
+            # completing from `position`, or None when the chain has no first link.
+            key = (position, variable)
+            links = []
+            top = None
+            while key[1] not in leo_tops[key[0]]:
+                items = waiting[key[0]].get(key[1], ())
+                if len(items) != 1 or items[0][1] + 1 != len(rhs[items[0][0]]):
+                    leo_tops[key[0]][key[1]] = None
+                    break
+                rule, dot, origin = items[0]
+                links.append((key, (rule, dot + 1, origin)))
+                if origin == key[0]:
+                    break
+                key = (origin, rules[rule]['from'])
+            else:
+                top = leo_tops[key[0]][key[1]]
+            for key, advanced in reversed(links):
+                top = top or advanced
+                leo_tops[key[0]][key[1]] = top
+            return leo_tops[position][variable]
+
+        for j in range(start, n + 1):
+            self.marks.append(tuple(len(agendas[m]) for m in range(j, min(j + self.lookahead, n + 1))))
+            waiting.append({})
+            leo_tops.append({})
+            triggers = []
+            self.triggers.append(triggers)
+            agenda = agendas[j]
+            cursor = 0
+            while cursor < len(agenda):
+                item = agenda[cursor]
+                cursor += 1
+                rule, dot, origin = item
+                body = rhs[rule]
+                if dot == len(body):
+                    variable = rules[rule]['from']
+                    top = leo_top(origin, variable) if origin < j else None
+                    if top is not None:
+                        add(j, top, ('leo', origin, item))
+                        triggers.append((origin, item))
+                        continue
+                    for parent, parent_dot, parent_origin in waiting[origin].get(variable, ()):
+                        add(j, (parent, parent_dot + 1, parent_origin), ('child', origin, item))
+                    continue
+                symbol = body[dot]
+                if symbol in variables:
+                    waiting[j].setdefault(symbol, []).append(item)
+                    for index in by_lhs.get(symbol, ()):
+                        add(j, (index, 0, j), None)
+                    if symbol in null_rule:
+                        add(j, (rule, dot + 1, origin), ('null',))
+                elif target_string.startswith(symbol, j):
+                    add(j + len(symbol), (rule, dot + 1, origin), ('scan',))
+
+        items = sum(len(agendas[j]) for j in range(start, n + 1))
+        stats.steps += items
+        stats.configurations += items
+        stats.peak_frontier = max(stats.peak_frontier, max(len(agendas[j]) for j in range(start, n + 1)))
+
+    def derivation(self, build: bool = True) -> list | None:
+        """
+        The indices of the rules applied by one leftmost derivation of the
+        text, in order, or None if there is none. With `build` False, an empty
+        list stands for any derivation.
+        """
+        n = len(self.text)
+        cfg = self.cfg
+        rules, rhs, null_rule = cfg.rules, cfg._rhs, cfg._null_rule
+        sets, agendas, waiting, leo_tops = self.sets, self.agendas, self.waiting, self.leo_tops
+
+        # Items Leo skipped are rebuilt on demand: `unroll` gives every link of a chain
+        # a ('child', ...) back-pointer in `overlay`, including the top one.
+        overlay = {}
+
+        def unroll(j, origin, item):
+            child, key = item, (origin, rules[item[0]]['from'])
+            top = leo_tops[key[0]][key[1]]
+            links = []
+            while True:
+                rule, dot, link_origin = waiting[key[0]][key[1]][0]
+                advanced = (rule, dot + 1, link_origin)
+                overlay[(advanced, j)] = ('child', key[0], child)
+                links.append(advanced)
+                if advanced == top:
+                    return links
+                child, key = advanced, (link_origin, rules[rule]['from'])
+
+        accepted = None
+        for item in agendas[n]:
+            if item[2] == 0 and item[1] == len(rhs[item[0]]) and rules[item[0]]['from'] == cfg.start_symbol:
+                accepted = item
+                break
+        for origin, item in self.triggers[n]:
+            if accepted is not None:
+                break
+            for link in unroll(n, origin, item):
+                if link[2] == 0 and rules[link[0]]['from'] == cfg.start_symbol:
+                    accepted = link
+                    break
+        if accepted is None:
+            return None
+        if not build:
+            return []
+
+        # Preorder walk of the derivation tree: the leftmost derivation applies rules in this order.
+        derivation = []
+        pending = [(accepted, n)]
+        while pending:
+            item, j = pending.pop()
+            if j is None:
+                # A nullable variable derived empty through its `null_rule`.
+                derivation.append(null_rule[item])
+                pending.extend((sym, None) for sym in reversed(rhs[null_rule[item]]))
+                continue
+            derivation.append(item[0])
+            children = []
+            while item[1] > 0:
+                back = overlay.get((item, j)) or sets[j][item]
+                if back[0] == 'leo':
+                    unroll(j, back[1], back[2])
+                    back = overlay[(item, j)]
+                symbol = rhs[item[0]][item[1] - 1]
+                if back[0] == 'scan':
+                    j -= len(symbol)
+                elif back[0] == 'null':
+                    children.append((symbol, None))
+                else:
+                    children.append((back[2], j))
+                    j = back[1]
+                item = (item[0], item[1] - 1, item[2])
+            pending.extend(children)
+        return derivation
+
+    def footprint(self) -> int:
+        """Estimated bytes held by the chart."""
+        return 160 * sum(len(agenda) for agenda in self.agendas) + 120 * len(self.marks) + len(self.text)
+
+
+class IncrementalCFG:
+    """
+    Re-parses edited inputs with the default 'earley' engine, keeping the
+    `EarleyChart` of the last input (see `checkpoint_logic`).
+    """
+
+    def __init__(self, cfg: CFG):
+        self.cfg = cfg
+        self.chart = EarleyChart(cfg) if cfg.start_symbol in cfg.variables else None
+        self.lock = threading.Lock()
+
+    @property
+    def resumed(self) -> int:
+        """The Earley sets the last call kept."""
+        return self.chart.kept if self.chart is not None else 0
+
+    def simulate(self, target_string: str, trace: str | None = None, stats: SearchStats | None = None) -> dict:
+        """The result of `cfg.simulate(target_string, trace=trace)`, parsing only the sets the edit changed."""
+        if stats is None:
+            stats = SearchStats()
+        result = self.cfg._simulate_earley(target_string, trace, stats, chart=self.chart)
+        return stats.finish('earley', result)
+
+    def footprint(self) -> int:
+        return self.chart.footprint() if self.chart is not None else 0
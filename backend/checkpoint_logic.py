@@ -0,0 +1,89 @@
+"""Checkpoints for re-simulating an input after a small edit.
+
+The visualizer re-sends the whole input on every keystroke. Each machine has
+an `incremental()` run that keeps, per position of the last input it
+simulated, what its engine had computed there:
+
+- DFA (`dfa_logic.IncrementalDFA`): the state after every prefix.
+- PDA (`pda_logic.IncrementalPDA`): the configuration chain of a
+  deterministic PDA, or the graph-structured stack and the ε-closure of every
+  position.
+- CFG (`cfg_logic.IncrementalCFG`): the Earley chart, set by set.
+
+A new input only re-simulates from the end of the prefix it shares with the
+last one, so appending or deleting a character redoes one position of work
+instead of the whole input. The results are exactly those of `simulate` with
+the default engine; only the effort counters of the `stats` differ, since they
+count the work done by that call.
+
+Every run has a `lock`, held while it simulates, and a `footprint()`, its
+estimated size in bytes. `CheckpointStore` keeps the runs of client sessions
+in a bounded LRU.
+"""
+from cache_logic import ResultCache
+
+
+def shared_prefix(old: str, new: str) -> int:
+    """The length of the longest common prefix of two strings, found with slice comparisons (no per-character loop)."""
+    if new.startswith(old):
+        return len(old)
+    low, high = 0, min(len(old), len(new))
+    # old[:low] == new[:low], and they differ before `high`.
+    while low < high:
+        middle = (low + high + 1) // 2
+        if old[low:middle] == new[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+class CheckpointStore:
+    """
+    The incremental runs of client sessions, by (session, machine id), in a
+    `ResultCache` bounded by their estimated memory footprint.
+    Thread-safe: a run busy with one request of a session is not shared with
+    a concurrent one, which simulates on a fresh run instead.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024, ttl: float | None = 600):
+        """Creates an empty store.
+
+        Args:
+            max_entries: The most runs kept at once.
+            max_bytes: The memory budget of the runs, by their `footprint()`.
+            ttl: Seconds a session's run is kept after its last request.
+        """
+        self._runs = ResultCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl, sizeof=lambda run: run.footprint())
+
+    def simulate(self, session: str, machine_id: str, machine, input_string: str, trace=None, stats=None) -> dict:
+        """
+        Simulates `input_string` on the session's run of the machine, resuming
+        from its last input. The result is that of `machine.simulate`.
+
+        Args:
+            session: Identifies the client's edit session.
+            machine_id: Identifies `machine`; a different machine must never reuse an id.
+            machine: A DFA, PDA or CFG.
+            input_string: The simulated input.
+            trace: The trace option (see `trace_logic`).
+            stats: Receives the effort counters of the call (see `metrics_logic`).
+        """
+        key = (session, machine_id)
+        run = self._runs.get(key)
+        if run is None or not run.lock.acquire(blocking=False):
+            run = machine.incremental()
+            run.lock.acquire()
+        try:
+            result = run.simulate(input_string, trace=trace, stats=stats)
+        finally:
+            run.lock.release()
+        # Stored again after every call: its footprint changed.
+        self._runs.put(key, run)
+        return result
+
+    def __len__(self):
+        return len(self._runs)
+
+    def stats(self) -> dict:
+        return self._runs.stats()
@@ -0,0 +1,251 @@
+"""Counting, sampling and enumerating the strings a DFA accepts or rejects.
+
+`DFALanguage(dfa)` is the set of strings over the alphabet of `dfa` that it
+accepts, and `DFALanguage(dfa, accepted=False)` the set of those it rejects
+(the complement within the alphabet; strings with other symbols are left out).
+Both are read off the transition table, where a rejecting step (trap entry,
+missing transition) leads to an absorbing dead state:
+
+- `count(n)`: the number of strings of length n, exactly, from the n-th power
+  of the transition count matrix (NumPy, with Python integers) or by dynamic
+  programming without NumPy.
+- `sample(n, k)`: k strings of length n drawn uniformly and independently.
+  Every symbol is drawn with the weight of the number of strings that can
+  still complete it. The NumPy sampler draws all k strings together; where
+  the weights of a step add up to more than 63 bits it shifts them all right
+  until they fit. Each weight then loses less than one unit of a total of at
+  least 2^62, so every symbol's probability changes by less than
+  (alphabet size) * 2^-62 in absolute terms. The relative change is not
+  bounded: a symbol whose weight is tiny next to another's can lose most of
+  it, or never be drawn. The Python sampler (without NumPy) is exact.
+- `strings(max_length)`: every string up to a length, in shortlex order.
+
+Sampling and enumeration keep the completion counts of every length up to n,
+which are n-bit integers, so they are meant for lengths up to a few
+thousand; `count` keeps nothing. Usage:
+
+    python corpus_logic.py count --machine bets --lengths 10 100 1000
+    python corpus_logic.py sample --machine stars --lengths 20 --count 1000000 --out corpus.tsv
+    python corpus_logic.py enumerate --regex '(a + b)*abb' --max-length 6 --label rejected
+
+`sample` and `enumerate` write one `string<TAB>1` (accepted) or
+`string<TAB>0` (rejected) line per string.
+"""
+import argparse
+import functools
+import random
+import sys
+
+# Bits of the per-symbol weights kept by the vectorized sampler (they are summed in int64).
+WEIGHT_BITS = 63
+LABELS = ('accepted', 'rejected', 'both')
+
+
+@functools.cache
+def _numpy():
+    """NumPy, imported on first use, or None when it is not installed."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class DFALanguage:
+    """The accepted (or rejected) strings of a DFA, see the module docstring."""
+
+    def __init__(self, dfa, accepted: bool = True):
+        """
+        Args:
+            dfa: A `dfa_logic.DFA`.
+            accepted: False for the strings the DFA rejects.
+        """
+        compiled = dfa.compile()
+        # The input is read one character at a time, so longer symbols never match.
+        self.symbols = [symbol for symbol in compiled.symbols if len(symbol) == 1]
+        self.accepted = accepted
+        size = len(compiled.state_ids)
+        stride, sink = compiled._stride, compiled._sink
+        dead = size
+        self.targets = []
+        for row in range(size):
+            offsets = [compiled._fast[row * stride + compiled.columns[symbol]] for symbol in self.symbols]
+            self.targets.append([dead if offset == sink else offset // stride for offset in offsets])
+        self.targets.append([dead] * len(self.symbols))
+        self.final = [bool(compiled.accept[row]) == accepted for row in range(size)] + [not accepted]
+        self.start = compiled.start
+        # `_completions[k][state]`: the strings of length k that lead from `state` to a final state.
+        self._completions = [[int(final) for final in self.final]]
+
+    def _extend(self, length: int) -> list:
+        completions = self._completions
+        while len(completions) <= length:
+            last = completions[-1]
+            completions.append([sum(last[target] for target in row) for row in self.targets])
+        return completions
+
+    def count(self, length: int) -> int:
+        """The number of strings of exactly `length` symbols."""
+        if length < len(self._completions):
+            return self._completions[length][self.start]
+        np = _numpy()
+        if np is None:
+            last = self._completions[-1]
+            for _ in range(len(self._completions) - 1, length):
+                last = [sum(last[target] for target in row) for row in self.targets]
+            return last[self.start]
+        matrix = np.zeros((len(self.targets), len(self.targets)), dtype=object)
+        for state, row in enumerate(self.targets):
+            for target in row:
+                matrix[state, target] += 1
+        paths = np.linalg.matrix_power(matrix, length)[self.start]
+        return int(sum(paths[state] for state, final in enumerate(self.final) if final))
+
+    def sample(self, length: int, count: int = 1, seed=None) -> list[str]:
+        """
+        Draws `count` strings of `length` symbols, uniformly and independently.
+
+        Args:
+            length: The length of the strings.
+            count: How many to draw.
+            seed: Seeds the generator, for a reproducible draw.
+
+        Raises:
+            ValueError: There is no string of that length.
+        """
+        completions = self._extend(length)
+        if not completions[length][self.start]:
+            raise ValueError(f'There are no {"accepted" if self.accepted else "rejected"} strings of length {length}.')
+        np = _numpy()
+        if np is not None and '\0' not in self.symbols:
+            return self._sample_vectorized(np, length, count, seed)
+        rng = random.Random(seed)
+        symbols, targets = self.symbols, self.targets
+        words = []
+        for _ in range(count):
+            state = self.start
+            word = []
+            for remaining in range(length, 0, -1):
+                draw = rng.randrange(completions[remaining][state])
+                following = completions[remaining - 1]
+                for column, target in enumerate(targets[state]):
+                    draw -= following[target]
+                    if draw < 0:
+                        break
+                word.append(symbols[column])
+                state = target
+            words.append(''.join(word))
+        return words
+
+    def _sample_vectorized(self, np, length: int, count: int, seed) -> list[str]:
+        # All the strings advance one symbol per step; a column is drawn with the weight of its completions.
+        if length == 0:
+            return [''] * count
+        completions = self._completions
+        rng = np.random.default_rng(seed)
+        targets = np.array(self.targets, dtype=np.int64)
+        states = np.full(count, self.start, dtype=np.int64)
+        codes = np.empty((count, length), dtype=np.int64)
+        for step in range(length):
+            following = completions[length - step - 1]
+            weights = []
+            for row in self.targets:
+                row_weights = [following[target] for target in row]
+                shift = max(0, sum(row_weights).bit_length() - WEIGHT_BITS)
+                weights.append([weight >> shift for weight in row_weights])
+            cumulative = np.cumsum(np.array(weights, dtype=np.int64), axis=1)[states]
+            draws = rng.integers(0, cumulative[:, -1])
+            columns = (cumulative <= draws[:, None]).sum(axis=1)
+            codes[:, step] = columns
+            states = targets[states, columns]
+        points = np.array([ord(symbol) for symbol in self.symbols], dtype=np.uint32)[codes]
+        # Rows of code points read as fixed-width unicode strings.
+        return np.ascontiguousarray(points).view(f'<U{length}').ravel().tolist()
+
+    def strings(self, max_length: int, min_length: int = 0):
+        """Yields every string with `min_length` to `max_length` symbols in shortlex order."""
+        completions = self._extend(max_length)
+        symbols, targets = self.symbols, self.targets
+        for length in range(min_length, max_length + 1):
+            if not completions[length][self.start]:
+                continue
+            # Only prefixes that some string of this length completes are expanded.
+            pending = [(self.start, length, '')]
+            while pending:
+                state, remaining, prefix = pending.pop()
+                if remaining == 0:
+                    yield prefix
+                    continue
+                for column in range(len(symbols) - 1, -1, -1):
+                    target = targets[state][column]
+                    if completions[remaining - 1][target]:
+                        pending.append((target, remaining - 1, prefix + symbols[column]))
+
+
+def load_dfa(machine: str | None = None, regex: str | None = None):
+    """The built-in DFA `machine` ('bets' or 'stars') of the app, or the DFA of `regex` (see `regex_logic`)."""
+    if regex is not None:
+        from regex_logic import compile_regex
+        return compile_regex(regex)
+    import app
+    return app.BUILTIN_MACHINES[f'{machine}_dfa']['dfa'].get()
+
+
+def _languages(dfa, label: str) -> list[tuple[DFALanguage, int]]:
+    kept = ('accepted', 'rejected') if label == 'both' else (label,)
+    return [(DFALanguage(dfa, accepted=name == 'accepted'), int(name == 'accepted')) for name in kept]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Count, sample or enumerate the strings a DFA accepts or rejects.')
+    parser.add_argument('command', choices=['count', 'sample', 'enumerate'])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--machine', default='bets', choices=['bets', 'stars'], help='built-in DFA (default: bets)')
+    source.add_argument('--regex', help='use the DFA of this regex instead')
+    parser.add_argument('--label', default='both', choices=LABELS, help='strings to count or generate (default: both)')
+    parser.add_argument('--lengths', nargs='+', type=int, default=[10], help='string lengths for count and sample (default: 10)')
+    parser.add_argument('--count', type=int, default=1000, help='strings sampled per length and label (default: 1000)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the sampler')
+    parser.add_argument('--min-length', type=int, default=0, help='shortest string enumerated')
+    parser.add_argument('--max-length', type=int, default=10, help='longest string enumerated (default: 10)')
+    parser.add_argument('--limit', type=int, help='stop after this many strings per label')
+    parser.add_argument('--out', help='write the strings to this file instead of stdout')
+    args = parser.parse_args(argv)
+    if min(args.lengths) < 0 or args.count < 0 or args.min_length < 0 or args.max_length < args.min_length:
+        parser.error('lengths and counts must not be negative, and --max-length not below --min-length')
+    try:
+        dfa = load_dfa(args.machine, args.regex)
+    except ValueError as e:
+        parser.error(str(e))
+    languages = _languages(dfa, args.label)
+
+    if args.command == 'count':
+        for length in args.lengths:
+            counts = {('accepted' if flag else 'rejected'): language.count(length) for language, flag in languages}
+            print(length, ' '.join(f'{name}={value}' for name, value in counts.items()))
+        return 0
+
+    stream = open(args.out, 'w', encoding='utf-8') if args.out else sys.stdout
+    try:
+        for language, flag in languages:
+            suffix = f'\t{flag}\n'
+            if args.command == 'sample':
+                for length in args.lengths:
+                    if not language.count(length):
+                        continue
+                    # The seed is mixed with the length and label, so each draw stays the same when the others change.
+                    words = language.sample(length, args.count, seed=(args.seed << 32) ^ (length << 1) ^ flag)
+                    stream.write(suffix.join(words) + suffix if words else '')
+            else:
+                for index, word in enumerate(language.strings(args.max_length, args.min_length)):
+                    if args.limit is not None and index >= args.limit:
+                        break
+                    stream.write(word + suffix)
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
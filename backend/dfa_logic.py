@@ -4,6 +4,47 @@ This module can also serve as a standalone CLI app for manual testing.
 Reference: S.P Eugene Xavier, "Theory of Automata, Formal Languages, and Computation"
 '''
 
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import mmap
+import os
+import threading
+
+from checkpoint_logic import shared_prefix
+from metrics_logic import SearchStats
+from trace_logic import TraceRecorder
+
+
+@functools.cache
+def _numpy():
+    '''
+    Imports NumPy on first use, so importing this module stays cheap for callers that never run a batch.
+
+    Returns:
+        out: the `numpy` module, or None when it is not installed (the batch engine falls back to the scalar loop).
+    '''
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+# Symbols scanned between two sink checks in `CompiledDFA.accepts`.
+_BLOCK_SIZE = 4096
+
+# Inputs shorter than this are not worth the process round trip in `DFA.simulate_parallel`.
+PARALLEL_MIN_LENGTH = 1 << 16
+
+# Status codes used by the batch engine, indexed into the reject markers that `DFA.simulate` appends.
+STATUS_OK = 0
+STATUS_INVALID_SYMBOL = 1
+STATUS_NO_TRANSITION = 2
+STATUS_INVALID_TARGET = 3
+STATUS_TRAP_STATE = 4
+REJECT_MARKERS = (None, 'REJECT_STATE_INVALID_SYMBOL', 'REJECT_STATE_NO_TRANSITION', 'REJECT_STATE_INVALID_TARGET', 'REJECT_STATE_TRAP_STATE')
+
 class DFA:
     '''Class for compiling, simulating, and validating the DFA'''
     def __init__(self, states: set[int], alphabet: set[str], transitions: dict[int,dict[str,int]], start_state:int, final_states: set[int], trap_states: set[int]):
@@ -76,65 +117,259 @@ class DFA:
         self.start_state:int = start_state
         self.final_states: set = final_states
         self.trap_states: set = trap_states
+        self._compiled: CompiledDFA | None = None
+
+    def compile(self) -> 'CompiledDFA':
+        '''
+        Builds (once) and returns the flat integer-table form of this DFA.
+
+        Returns:
+            out: CompiledDFA
+        '''
+        if self._compiled is None:
+            self._compiled = CompiledDFA(self)
+        return self._compiled
+
+    def accepts(self, input_string: str) -> bool:
+        '''
+        Accept-only fast path. Gives the same verdict as `simulate(...)['accepted']` without building a trace.
+
+        Parameters:
+            input_string (str): User input string to process.
+
+        Returns:
+            out: bool
+        '''
+        return self.compile().accepts(input_string)
 
-    def simulate(self, input_string: str) -> dict:
+    def simulate(self, input_string: str, trace: str | None = None, stats: SearchStats | None = None) -> dict:
         '''
         Simulates the DFA on the given input string.
 
         Parameters:
             input_string (str): User input string to process.
+            trace (str): How much of `state_sequence` to return, see `trace_logic` ('full' by default).
+            stats (SearchStats): Filled with the effort counters of the run, see `metrics_logic`; steps are symbols read.
 
         Returns:
             out: dict
+
+        Exceptions:
+            Value Error: Unknown trace mode.
         '''
-        current_state = self.start_state
-        state_sequence = []
-        state_sequence.append(current_state)
+        compiled = self.compile()
+        state_ids = compiled.state_ids
+        offset_ids = compiled.offset_ids
+        recorder = TraceRecorder(trace, render=lambda entry: entry if isinstance(entry, str) else offset_ids[entry])
+        recorder.state_of = recorder.render
         error_message = None
         is_accepted = False
 
-        for symbol in input_string:
+        if recorder.mode in ('none', 'summary'):
+            current, status, position = compiled.run(input_string)
+            read = position
+            recorder.length = position + 1 + (status == STATUS_TRAP_STATE) + (status != STATUS_OK)
+            symbol = input_string[position] if status != STATUS_OK else None
+        else:
+            record, stop, current = compiled.walk(input_string, None if recorder.mode == 'full' else recorder)
+            if recorder.mode == 'full':
+                record = recorder.items = list(map(offset_ids.__getitem__, record))
+                recorder.render = None
+                render_state = state_ids.__getitem__
+            else:
+                render_state = lambda index: index * compiled._stride
+            status = STATUS_OK
+            read = len(input_string) if stop is None else stop
+            if stop is not None:
+                # The table folds every rejection into one sink; replay the failing step to tell them apart.
+                symbol = input_string[stop]
+                current, status = compiled.status_at(current, symbol)
+                if status == STATUS_TRAP_STATE:
+                    record.append(render_state(current))
+                record.append(REJECT_MARKERS[status])
 
-            if symbol not in self.alphabet:
-                state_sequence.append('REJECT_STATE_INVALID_SYMBOL')
-                error_message = str(f'Simulation Error: Symbol "{symbol}" not in alphabet {self.alphabet}.')
-                break
-            
-            state_transitions = self.transitions.get(current_state)
+        if status != STATUS_OK:
+            error_message = self.error_message(status, symbol, state_ids[current])
 
-            if state_transitions is None:
-                state_sequence.append('REJECT_STATE_NO_TRANSITION')
-                error_message = str(f'Simulation Error: State "{current_state}" has no defined transitions.')
-                break
+        if error_message is None:
+            is_accepted = bool(compiled.accept[current])
 
-            next_state = state_transitions.get(symbol)
+        result = {
+            'input': input_string,
+            'final_state': state_ids[current],
+            'accepted': is_accepted,
+            'state_sequence': recorder.result(),
+            'error': error_message
+        }
+        if stats is not None:
+            stats.steps = stats.configurations = read
+            stats.peak_frontier = 1
+            stats.finish('dfa', result)
+        return result
 
-            if next_state is None or next_state not in self.states:
-                state_sequence.append('REJECT_STATE_INVALID_TARGET')
-                error_message = str(f'Simulation Error: "{next_state}" has no defined state transition. Set a valid state transition for all cases, and define all states.')
+
+    def error_message(self, status: int, symbol: str, state) -> str | None:
+        '''
+        Builds the `error` text `simulate` reports for a rejecting step.
+
+        Parameters:
+            status (int): One of the `STATUS_*` codes.
+            symbol (str): The symbol that was being read.
+            state (int): The state reported as final (the trap state for `STATUS_TRAP_STATE`).
+
+        Returns:
+            out: str, or None for `STATUS_OK`.
+        '''
+        if status == STATUS_INVALID_SYMBOL:
+            return str(f'Simulation Error: Symbol "{symbol}" not in alphabet {self.alphabet}.')
+        if status == STATUS_NO_TRANSITION:
+            return str(f'Simulation Error: State "{state}" has no defined transitions.')
+        if status == STATUS_INVALID_TARGET:
+            next_state = None
+            return str(f'Simulation Error: "{next_state}" has no defined state transition. Set a valid state transition for all cases, and define all states.')
+        if status == STATUS_TRAP_STATE:
+            return str(f'Simulation Error: Transition leads to trap state {state}.')
+        return None
+
+    def dead_states(self) -> set:
+        '''
+        States from which no final state can be reached (trap states included), found by reachability analysis.
+
+        Returns:
+            out: set
+        '''
+        compiled = self.compile()
+        return {state for index, state in enumerate(compiled.state_ids) if compiled.dead[index]}
+
+    def accepting_sink_states(self) -> set:
+        '''
+        Final states from which every continuation over the alphabet is accepted.
+
+        Returns:
+            out: set
+        '''
+        compiled = self.compile()
+        return {state for index, state in enumerate(compiled.state_ids) if compiled.accepting_sink[index]}
+
+    def runner(self) -> 'DFARunner':
+        '''
+        Starts an incremental run that is fed the input piece by piece (see `DFARunner`).
+
+        Returns:
+            out: DFARunner
+        '''
+        return DFARunner(self)
+
+    def incremental(self) -> 'IncrementalDFA':
+        '''
+        Starts a run that re-simulates edited inputs from the prefix they share with the last one (see `IncrementalDFA`).
+
+        Returns:
+            out: IncrementalDFA
+        '''
+        return IncrementalDFA(self)
+
+    def simulate_parallel(self, input_string: str, workers: int | None = None, executor=None) -> dict:
+        '''
+        Runs one long input across several processes. Each worker maps every start state to where its chunk
+        leads (or where it is rejected); the maps are then composed in order, so the verdict, final state and
+        reported rejection are exactly those of the serial runner.
+
+        Parameters:
+            input_string (str): User input string to process.
+            workers (int): Number of chunks (default: CPU count). Inputs shorter than `PARALLEL_MIN_LENGTH`
+                run serially.
+            executor (Executor): Optional `concurrent.futures` executor to reuse; a process pool is created
+                for the call otherwise.
+
+        Returns:
+            out: dict, see `DFARunner.finish`.
+        '''
+        compiled = self.compile()
+        workers = workers or os.cpu_count() or 1
+        if workers < 2 or len(input_string) < PARALLEL_MIN_LENGTH:
+            return self.runner().feed(input_string).finish()
+
+        codes = compiled.encode(input_string)
+        bounds = [len(codes) * part // workers for part in range(workers + 1)]
+        # The table of a memory-mapped machine (see `binary_logic`) is a memoryview, which does not pickle.
+        fast = compiled._fast if isinstance(compiled._fast, tuple) else tuple(compiled._fast)
+        jobs = [(fast, compiled._stride, compiled._sink, len(compiled.state_ids), codes[begin:end]) for begin, end in zip(bounds, bounds[1:])]
+        if executor is None:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                summaries = list(pool.map(_chunk_summary, *zip(*jobs)))
+        else:
+            summaries = list(executor.map(_chunk_summary, *zip(*jobs)))
+
+        runner = self.runner()
+        stride = compiled._stride
+        current = compiled.start
+        for begin, summary in zip(bounds, summaries):
+            offset, stop = summary[current]
+            current = offset // stride
+            if stop >= 0:
+                runner.position = begin + stop
+                runner.symbol = input_string[runner.position]
+                current, runner.status = compiled.status_at(current, runner.symbol)
                 break
+        else:
+            runner.position = len(input_string)
+        runner._current = current * stride
+        return runner.finish()
+
+    def simulate_file(self, path, chunk_size: int = 1 << 20) -> dict:
+        '''
+        Runs the DFA over a file without reading it into memory. The file is memory-mapped and each byte is
+        read as one latin-1 symbol.
 
-            current_state = next_state
-            state_sequence.append(current_state)
+        Parameters:
+            path (str | PathLike): File to validate.
+            chunk_size (int): Bytes translated per step.
 
-            if current_state in self.trap_states:
-                state_sequence.append('REJECT_STATE_TRAP_STATE')
-                error_message = str(f'Simulation Error: Transition leads to trap state {next_state}.')
-                break    
+        Returns:
+            out: dict, see `DFARunner.finish`.
+        '''
+        runner = self.runner()
+        with open(path, 'rb') as stream:
+            if os.fstat(stream.fileno()).st_size == 0:
+                return runner.finish()
+            with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                runner.feed(buffer, chunk_size=chunk_size)
+        return runner.finish()
 
-        if error_message is None:
-            is_accepted = current_state in self.final_states
+    def simulate_many(self, input_strings: list[str]) -> dict:
+        '''
+        Simulates the DFA on many input strings at once. Uses the NumPy batch engine when NumPy is installed.
 
+        Parameters:
+            input_strings (list): User input strings to process.
+
+        Returns:
+            out: dict of parallel lists. `error` holds the reject marker `simulate` would have appended
+            (e.g. 'REJECT_STATE_TRAP_STATE'), or None.
+        '''
+        compiled = self.compile()
+        np = _numpy()
+        if np is not None:
+            final_indices, statuses = compiled.run_many(input_strings)
+            final_indices = final_indices.tolist()
+            statuses = statuses.tolist()
+        else:
+            final_indices, statuses = [], []
+            for input_string in input_strings:
+                final_index, status, _ = compiled.run(input_string)
+                final_indices.append(final_index)
+                statuses.append(status)
 
+        state_ids = compiled.state_ids
+        accept = compiled.accept
         return {
-            'input': input_string,
-            'final_state': current_state,
-            'accepted': is_accepted,
-            'state_sequence': state_sequence,
-            'error': error_message
+            'input': list(input_strings),
+            'final_state': [state_ids[index] for index in final_indices],
+            'accepted': [status == STATUS_OK and bool(accept[index]) for index, status in zip(final_indices, statuses)],
+            'error': [REJECT_MARKERS[status] for status in statuses]
         }
 
-
     def dfa_properties(self) -> dict:
         '''
         Packs all info about the DFA in a dictionary.
@@ -152,6 +387,891 @@ class DFA:
             'trap_states': sorted(list(self.trap_states))
         }
 
+    def minimize(self) -> tuple['DFA', dict]:
+        '''
+        Builds the minimal DFA for the same language with Hopcroft's partition refinement, O(n·k·log n).
+
+        Equivalence is taken over the accepted language: entering a trap state and a missing transition both
+        reject, so they are merged into one dead class, which becomes the only trap state of the result.
+        Unreachable states are dropped. Minimized states are numbered in breadth-first order from the start
+        state (which is always 0), so the result is the same for equivalent inputs.
+
+        Returns:
+            out: `(minimized, state_map)` where `state_map` maps every original state to its minimized state
+            (None for unreachable states). `minimized_classes(state_map)` gives the inverse.
+        '''
+        compiled = self.compile()
+        size = len(compiled.state_ids)
+        width = compiled.width
+        dead = size
+
+        # Complete the table: missing targets and trap entries go to the dead state, which loops on itself.
+        # A trap state only keeps its own row when it is the start state; it is never entered otherwise.
+        delta = []
+        for index in range(size):
+            row = []
+            for column in range(width):
+                target = compiled.table[index * width + column] if compiled.has_row[index] else -1
+                row.append(dead if target < 0 or compiled.trap[target] else target)
+            delta.append(row)
+        delta.append([dead] * width)
+        accepting = {index for index in range(size) if compiled.accept[index] and not (compiled.trap[index] and index != compiled.start)}
+
+        blocks = _hopcroft(delta, width, accepting)
+
+        block_of = [0] * (size + 1)
+        for block_id, block in enumerate(blocks):
+            for index in block:
+                block_of[index] = block_id
+
+        # Renumber the blocks reachable from the start block in breadth-first order.
+        numbering = {block_of[compiled.start]: 0}
+        order = [block_of[compiled.start]]
+        for block_id in order:
+            member = next(iter(blocks[block_id]))
+            for column in range(width):
+                target_block = block_of[delta[member][column]]
+                if target_block not in numbering:
+                    numbering[target_block] = len(order)
+                    order.append(target_block)
+
+        transitions = {}
+        for block_id in order:
+            member = next(iter(blocks[block_id]))
+            transitions[numbering[block_id]] = {compiled.symbols[column]: numbering[block_of[delta[member][column]]] for column in range(width)}
+        dead_block = numbering.get(block_of[dead])
+        final_states = {numbering[block_id] for block_id in order if next(iter(blocks[block_id])) in accepting}
+
+        minimized = DFA(
+            states=set(range(len(order))),
+            alphabet=set(self.alphabet),
+            transitions=transitions,
+            start_state=0,
+            final_states=final_states,
+            trap_states=set() if dead_block is None or dead_block in final_states else {dead_block}
+        )
+        state_map = {state: numbering.get(block_of[index]) for index, state in enumerate(compiled.state_ids)}
+        return minimized, state_map
+
+
+def _hopcroft(delta: list[list[int]], width: int, accepting: set[int]) -> list[set[int]]:
+    '''
+    Hopcroft's partition refinement over a complete transition table.
+
+    Args:
+        delta (list): `delta[state][column]` is the next state.
+        width (int): Number of columns.
+        accepting (set): Accepting states.
+
+    Returns:
+        out: The blocks of equivalent states.
+    '''
+    inverse = [[[] for _ in range(len(delta))] for _ in range(width)]
+    for state, row in enumerate(delta):
+        for column, target in enumerate(row):
+            inverse[column][target].append(state)
+
+    rejecting = set(range(len(delta))) - accepting
+    blocks = [block for block in (set(accepting), rejecting) if block]
+    block_of = [0] * len(delta)
+    for block_id, block in enumerate(blocks):
+        for state in block:
+            block_of[state] = block_id
+    # Only the smaller half needs to be a splitter.
+    waiting = [min(blocks, key=len)] if len(blocks) == 2 else []
+
+    while waiting:
+        # Copy: the splitter's own block may be split (in place) while its columns are processed.
+        splitter = set(waiting.pop())
+        for column in range(width):
+            predecessors = set()
+            for target in splitter:
+                predecessors.update(inverse[column][target])
+            touched = {}
+            for state in predecessors:
+                touched.setdefault(block_of[state], set()).add(state)
+            for block_id, inside in touched.items():
+                block = blocks[block_id]
+                if len(inside) == len(block):
+                    continue
+                block -= inside
+                new_id = len(blocks)
+                blocks.append(inside)
+                for state in inside:
+                    block_of[state] = new_id
+                # `block` is mutated in place, so a pending splitter for it now stands for the remainder.
+                if any(pending is block for pending in waiting):
+                    waiting.append(inside)
+                else:
+                    waiting.append(inside if len(inside) <= len(block) else block)
+    return blocks
+
+
+def _advance(fast: tuple, sink: int, current: int, codes, begin: int) -> tuple[int, int]:
+    '''
+    Runs one table track over `codes[begin:]`, block by block like `CompiledDFA.accepts`.
+
+    Returns:
+        out: `(offset, stop)`; `stop` is the position of the rejecting code (and `offset` the state before it),
+        or -1 when the track reached the end.
+    '''
+    for block_begin in range(begin, len(codes), _BLOCK_SIZE):
+        block = codes[block_begin:block_begin + _BLOCK_SIZE]
+        following = current
+        for code in block:
+            following = fast[following + code]
+        if following == sink:
+            for offset, code in enumerate(block):
+                following = fast[current + code]
+                if following == sink:
+                    return current, block_begin + offset
+                current = following
+        current = following
+    return current, -1
+
+
+def _chunk_summary(fast: tuple, stride: int, sink: int, size: int, codes) -> list[tuple[int, int]]:
+    '''
+    Worker for `DFA.simulate_parallel`: maps every start state to the result of running it over `codes`.
+
+    All start states are tracked together, grouped by their current state, until they merge into a single
+    track, which then runs at the speed of the serial loop. For small DFAs that merge happens within a few
+    symbols, so a chunk costs about the same as one serial pass.
+
+    Returns:
+        out: `summary[start] = (offset, stop)` as returned by `_advance` for that start state.
+    '''
+    summary = [None] * size
+    groups = {index * stride: [index] for index in range(size)}
+    position = 0
+    while len(groups) > 1 and position < len(codes):
+        code = codes[position]
+        following_groups = {}
+        for current, starts in groups.items():
+            following = fast[current + code]
+            if following == sink:
+                for start in starts:
+                    summary[start] = (current, position)
+            else:
+                following_groups.setdefault(following, []).extend(starts)
+        groups = following_groups
+        position += 1
+    for current, starts in groups.items():
+        result = _advance(fast, sink, current, codes, position)
+        for start in starts:
+            summary[start] = result
+    return summary
+
+
+def minimized_classes(state_map: dict) -> dict:
+    '''
+    Inverts the `state_map` returned by `DFA.minimize`.
+
+    Args:
+        state_map (dict): Original state -> minimized state (or None).
+
+    Returns:
+        out: Minimized state -> sorted list of the original states it stands for.
+    '''
+    classes = {}
+    for state, minimized in state_map.items():
+        if minimized is not None:
+            classes.setdefault(minimized, []).append(state)
+    return {minimized: sorted(states) for minimized, states in sorted(classes.items())}
+
+
+class _UnknownSymbol(dict):
+    '''`str.translate` table that sends every symbol outside the alphabet to a reserved column.'''
+    def __init__(self, mapping: dict, missing: int):
+        super().__init__(mapping)
+        self.missing = missing
+
+    def __missing__(self, key):
+        return self.missing
+
+
+class CompiledDFA:
+    '''Flat integer-table form of a validated DFA, used by the simulation hot loops.'''
+    def __init__(self, dfa: DFA):
+        '''
+        Renumbers the states of `dfa` to 0..n-1 and lays the transition function out as a dense row-major table.
+
+        Args:
+            dfa (DFA): A DFA that already passed the validation in `DFA.__init__`.
+
+        Attributes:
+            state_ids (list): Dense index -> original state id.
+            state_index (dict): Original state id -> dense index.
+            columns (dict): Symbol -> table column.
+            width (int): Number of columns (size of the alphabet).
+            table (array): `int32` table of `n * width` entries; `table[state * width + column]` is the next dense index, or -1 when undefined.
+            has_row (bytearray): 1 where the original state has an entry in `transitions`.
+            accept (bytearray): 1 for final states.
+            trap (bytearray): 1 for trap states.
+            start (int): Dense index of the start state.
+        '''
+        self.state_ids: list = sorted(dfa.states)
+        self.state_index: dict = {state: index for index, state in enumerate(self.state_ids)}
+        self.symbols: list = sorted(dfa.alphabet)
+        self.columns: dict = {symbol: column for column, symbol in enumerate(self.symbols)}
+        self.width: int = len(self.symbols)
+
+        size = len(self.state_ids)
+        self.table: array = array('i', [-1]) * (size * self.width)
+        self.has_row: bytearray = bytearray(size)
+        self.accept: bytearray = bytearray(size)
+        self.trap: bytearray = bytearray(size)
+
+        for state, paths in dfa.transitions.items():
+            row = self.state_index[state]
+            self.has_row[row] = 1
+            for symbol, target in paths.items():
+                self.table[row * self.width + self.columns[symbol]] = self.state_index[target]
+        for state in dfa.final_states:
+            self.accept[self.state_index[state]] = 1
+        for state in dfa.trap_states:
+            self.trap[self.state_index[state]] = 1
+        self.start: int = self.state_index[dfa.start_state]
+
+        self._build_fast_table()
+
+    def _build_fast_table(self):
+        '''
+        Builds the table used by the hot loops. It has one extra column for symbols outside the alphabet and one
+        extra absorbing sink row, stores targets pre-multiplied by the row stride, and folds every rejecting step
+        (invalid symbol, missing row, missing target, trap entry) into the sink, so a step is a single lookup.
+        '''
+        size = len(self.state_ids)
+        stride = self.width + 1
+        sink = size * stride
+        fast = [sink] * ((size + 1) * stride)
+        for row in range(size):
+            if not self.has_row[row]:
+                continue
+            for column in range(self.width):
+                target = self.table[row * self.width + column]
+                if target >= 0 and not self.trap[target]:
+                    fast[row * stride + column] = target * stride
+        self._stride: int = stride
+        self._sink: int = sink
+        # Pre-multiplied row offset -> original state id (None between rows).
+        self.offset_ids: list = [None] * len(fast)
+        for index, state in enumerate(self.state_ids):
+            self.offset_ids[index * stride] = state
+        self._fast: tuple = tuple(fast)
+        self._fast_accept: bytes = bytes(self.accept) + b'\x00\x01'
+        self._analyse_liveness(fast)
+        self._build_encoder()
+
+    def _build_encoder(self):
+        '''Builds the `str.translate` table of `encode`, or None when the alphabet does not fit byte-wide codes.'''
+        # Byte-wide column codes let the loops iterate over a bytes object instead of a str.
+        if self._stride <= 256:
+            self._encode = _UnknownSymbol({ord(symbol): column for symbol, column in self.columns.items() if len(symbol) == 1}, self.width)
+        else:
+            self._encode = None
+
+    def _analyse_liveness(self, fast: list):
+        '''
+        Finds the dead states (no final state reachable) and the accepting sinks (final states whose every
+        continuation over the alphabet stays final) of the table, and builds the verdict table `accepts` runs:
+        entering a dead state goes straight to the reject sink and entering an accepting sink goes to a second
+        absorbing row that only leaves, to the reject sink, on a symbol outside the alphabet.
+        '''
+        size = len(self.state_ids)
+        stride = self._stride
+        sink = self._sink
+        successors = [[fast[row * stride + column] // stride for column in range(self.width) if fast[row * stride + column] != sink] for row in range(size)]
+
+        predecessors = [[] for _ in range(size)]
+        for row, targets in enumerate(successors):
+            for target in targets:
+                predecessors[target].append(row)
+        live = bytearray(size)
+        pending = [row for row in range(size) if self.accept[row]]
+        for row in pending:
+            live[row] = 1
+        while pending:
+            for row in predecessors[pending.pop()]:
+                if not live[row]:
+                    live[row] = 1
+                    pending.append(row)
+        self.dead: bytearray = bytearray(1 - flag for flag in live)
+
+        sinks = bytearray(1 if self.accept[row] and len(successors[row]) == self.width else 0 for row in range(size))
+        changed = True
+        while changed:
+            changed = False
+            for row in range(size):
+                if sinks[row] and not all(sinks[target] for target in successors[row]):
+                    sinks[row] = 0
+                    changed = True
+        self.accepting_sink: bytearray = sinks
+
+        accept_row = sink + stride
+        verdict = list(fast) + [accept_row] * self.width + [sink]
+        for offset, target in enumerate(fast):
+            if target != sink:
+                if self.dead[target // stride]:
+                    verdict[offset] = sink
+                elif sinks[target // stride]:
+                    verdict[offset] = accept_row
+        self._verdict: tuple = tuple(verdict)
+        self._accept_row: int = accept_row
+
+    def encode(self, input_string: str):
+        '''
+        Maps an input string to table columns. Symbols outside the alphabet get the reserved column `width`.
+
+        Args:
+            input_string (str): User input string to process.
+
+        Returns:
+            out: bytes when the alphabet fits in a byte, otherwise a list of ints.
+        '''
+        if self._encode is not None:
+            return input_string.translate(self._encode).encode('latin-1')
+        columns = self.columns
+        width = self.width
+        return [columns.get(symbol, width) for symbol in input_string]
+
+    def accepts(self, input_string: str) -> bool:
+        '''
+        Accept-only run over the table. No trace is built.
+
+        The input is scanned in blocks without a per-symbol branch. Dead states lead to the absorbing reject
+        sink and accepting sinks to an absorbing accept row, both checked once per block: a rejected run stops
+        early, and an accepted one only has to confirm that the rest of the input stays inside the alphabet.
+
+        Args:
+            input_string (str): User input string to process.
+
+        Returns:
+            out: True when the input ends in a final state without any rejection on the way.
+        '''
+        verdict = self._verdict
+        sink = self._sink
+        current = self.start * self._stride
+        if self.dead[self.start] and input_string:
+            return False
+        codes = self.encode(input_string)
+        for begin in range(0, len(codes), _BLOCK_SIZE):
+            for code in codes[begin:begin + _BLOCK_SIZE]:
+                current = verdict[current + code]
+            if current == sink:
+                return False
+            if current == self._accept_row:
+                if isinstance(codes, bytes):
+                    return codes.find(self.width, begin + _BLOCK_SIZE) < 0
+                return self.width not in codes[begin + _BLOCK_SIZE:]
+        return bool(self._fast_accept[current // self._stride])
+
+    def walk(self, input_string: str, record=None) -> tuple:
+        '''
+        Runs the table and records every state entered.
+
+        Args:
+            input_string (str): User input string to process.
+            record (list): Receives the pre-multiplied offset (see `offset_ids`) of the start state and of every
+                state entered. Anything with `append` and `len` works; defaults to a new list.
+
+        Returns:
+            out: `(record, stop, index)` where `stop` is the position of the symbol that rejected the run
+            (see `DFA.simulate` for the reasons), or None if the whole input was read, and `index` is the dense
+            index of the last state entered.
+        '''
+        fast = self._fast
+        sink = self._sink
+        stride = self._stride
+        current = self.start * stride
+        offsets = [] if record is None else record
+        append = offsets.append
+        append(current)
+        following = current
+        for code in self.encode(input_string):
+            following = fast[current + code]
+            if following == sink:
+                break
+            current = following
+            append(current)
+        stop = len(offsets) - 1 if following == sink else None
+        return offsets, stop, current // stride
+
+    def status_at(self, index: int, symbol: str) -> tuple[int, int]:
+        '''
+        Classifies a single step the way `DFA.simulate` does.
+
+        Args:
+            index (int): Dense index of the current state.
+            symbol (str): The symbol being read.
+
+        Returns:
+            out: `(index, status)`; `index` is the state `simulate` reports as final if the run stops here.
+        '''
+        column = self.columns.get(symbol)
+        if column is None:
+            return index, STATUS_INVALID_SYMBOL
+        if not self.has_row[index]:
+            return index, STATUS_NO_TRANSITION
+        target = self.table[index * self.width + column]
+        if target < 0:
+            return index, STATUS_INVALID_TARGET
+        if self.trap[target]:
+            return target, STATUS_TRAP_STATE
+        return target, STATUS_OK
+
+    def run(self, input_string: str) -> tuple[int, int]:
+        '''
+        Scalar run without a trace.
+
+        Args:
+            input_string (str): User input string to process.
+
+        Returns:
+            out: `(index, status, position)` with the reported final dense state, a `STATUS_*` code and the
+            position of the rejecting symbol (the input length when the whole input was read).
+        '''
+        fast = self._fast
+        sink = self._sink
+        current = self.start * self._stride
+        for position, code in enumerate(self.encode(input_string)):
+            following = fast[current + code]
+            if following == sink:
+                return *self.status_at(current // self._stride, input_string[position]), position
+            current = following
+        return current // self._stride, STATUS_OK, len(input_string)
+
+    def byte_table(self) -> bytes:
+        '''
+        Builds (once) the `bytes.translate` table that maps a byte, read as a latin-1 symbol, to its column.
+
+        Returns:
+            out: bytes of length 256, or raises ValueError when the alphabet does not fit byte-wide codes.
+        '''
+        if getattr(self, '_byte_table', None) is None:
+            if self._encode is None:
+                raise ValueError('Binary input needs an alphabet with fewer than 256 symbols.')
+            self._byte_table = bytes(self.columns.get(chr(byte), self.width) for byte in range(256))
+        return self._byte_table
+
+    def batch_table(self):
+        '''
+        Builds (once) the NumPy table used by `run_many`. Rows are dense states and columns are symbol columns,
+        followed by the invalid-symbol column and a padding column that leaves the state unchanged. Rejecting
+        entries hold the negated `STATUS_*` code, trap entries keep their target and are flagged by `trap`.
+
+        Returns:
+            out: `numpy.ndarray` of shape `(n, width + 2)`.
+        '''
+        if getattr(self, '_batch_table', None) is None:
+            np = _numpy()
+            size = len(self.state_ids)
+            table = np.full((size, self.width + 2), -STATUS_INVALID_TARGET, dtype=np.int32)
+            dense = np.frombuffer(self.table, dtype=np.int32).reshape(size, self.width) if self.width else np.empty((size, 0), dtype=np.int32)
+            table[:, :self.width] = np.where(dense >= 0, dense, -STATUS_INVALID_TARGET)
+            table[np.frombuffer(bytes(self.has_row), dtype=np.uint8) == 0, :self.width] = -STATUS_NO_TRANSITION
+            table[:, self.width] = -STATUS_INVALID_SYMBOL
+            table[:, self.width + 1] = np.arange(size, dtype=np.int32)
+            self._batch_table = table
+        return self._batch_table
+
+    def run_many(self, input_strings: list[str]):
+        '''
+        Vectorized run over many inputs. All inputs are concatenated into one ragged code buffer, sorted by
+        length, and advanced one symbol per NumPy step; at step `j` only the inputs longer than `j` take part.
+
+        Args:
+            input_strings (list): User input strings to process.
+
+        Returns:
+            out: `(indices, statuses)` NumPy arrays in input order, as `run` would return them per string.
+        '''
+        np = _numpy()
+        count = len(input_strings)
+        table = self.batch_table()
+        trap = np.frombuffer(bytes(self.trap), dtype=np.uint8).astype(bool)
+        lengths = np.fromiter((len(input_string) for input_string in input_strings), dtype=np.int64, count=count)
+        codes = self.encode(''.join(input_strings))
+        codes = np.frombuffer(codes, dtype=np.uint8) if isinstance(codes, bytes) else np.asarray(codes, dtype=np.int64)
+        offsets = np.zeros(count, dtype=np.int64)
+        np.cumsum(lengths[:-1], out=offsets[1:])
+
+        order = np.argsort(-lengths, kind='stable')
+        sorted_offsets = offsets[order]
+        active_counts = np.searchsorted(-lengths[order], -np.arange(int(lengths.max()) if count else 0), side='left')
+        states = np.full(count, self.start, dtype=np.int32)
+        statuses = np.zeros(count, dtype=np.int32)
+        padding = self.width + 1
+
+        for step, active in enumerate(active_counts.tolist()):
+            running = statuses[:active] == STATUS_OK
+            columns = np.where(running, codes[sorted_offsets[:active] + step], padding)
+            following = table[states[:active], columns]
+            rejected = following < 0
+            statuses[:active][rejected] = -following[rejected]
+            following = np.where(rejected, states[:active], following)
+            entered_trap = running & ~rejected & trap[following]
+            statuses[:active][entered_trap] = STATUS_TRAP_STATE
+            states[:active] = following
+
+        indices = np.empty(count, dtype=np.int32)
+        result_statuses = np.empty(count, dtype=np.int32)
+        indices[order] = states
+        result_statuses[order] = statuses
+        return indices, result_statuses
+
+
+
+class DFARunner:
+    '''Incremental DFA run that keeps only the current state and position.'''
+    def __init__(self, dfa: DFA):
+        '''
+        Args:
+            dfa (DFA): The machine to run.
+        '''
+        self.dfa: DFA = dfa
+        self.compiled: CompiledDFA = dfa.compile()
+        self.position: int = 0
+        self.status: int = STATUS_OK
+        self.symbol: str | None = None
+        self._current: int = self.compiled.start * self.compiled._stride
+
+    @property
+    def done(self) -> bool:
+        '''True once the run was rejected; later input is ignored.'''
+        return self.status != STATUS_OK
+
+    @property
+    def state(self):
+        '''The state `simulate` would report as final if the input ended here.'''
+        return self.compiled.state_ids[self._current // self.compiled._stride]
+
+    def feed(self, chunk, chunk_size: int = 1 << 20) -> 'DFARunner':
+        '''
+        Consumes the next piece of input.
+
+        Args:
+            chunk (str | bytes | bytearray | memoryview | mmap): The next piece. Binary input is read one latin-1
+                symbol per byte and translated `chunk_size` bytes at a time, so an `mmap` is never copied whole.
+            chunk_size (int): Bytes translated per step for binary input.
+
+        Returns:
+            out: self, so calls can be chained.
+        '''
+        if self.done:
+            return self
+        if isinstance(chunk, str):
+            self._consume(self.compiled.encode(chunk), chunk)
+            return self
+        view = memoryview(chunk).cast('B')
+        for begin in range(0, len(view), chunk_size):
+            piece = bytes(view[begin:begin + chunk_size])
+            self._consume(piece.translate(self.compiled.byte_table()), piece)
+            if self.done:
+                break
+        return self
+
+    def _consume(self, codes, source):
+        fast = self.compiled._fast
+        sink = self.compiled._sink
+        for begin in range(0, len(codes), _BLOCK_SIZE):
+            block = codes[begin:begin + _BLOCK_SIZE]
+            current = self._current
+            for code in block:
+                current = fast[current + code]
+            if current == sink:
+                # Replay the block one step at a time to find the rejecting symbol.
+                current = self._current
+                for offset, code in enumerate(block):
+                    following = fast[current + code]
+                    if following == sink:
+                        break
+                    current = following
+                symbol = source[begin + offset]
+                self.symbol = symbol if isinstance(symbol, str) else chr(symbol)
+                index, self.status = self.compiled.status_at(current // self.compiled._stride, self.symbol)
+                self._current = index * self.compiled._stride
+                self.position += offset
+                return
+            self._current = current
+            self.position += len(block)
+
+    def finish(self) -> dict:
+        '''
+        Ends the run.
+
+        Returns:
+            out: dict with `length` (symbols read, or the position of the rejecting symbol), `final_state`, `accepted`, the reject
+            marker `simulate` would have appended as `rejection` and its message as `error`.
+        '''
+        final_state = self.state
+        return {
+            'length': self.position,
+            'final_state': final_state,
+            'accepted': not self.done and bool(self.compiled.accept[self._current // self.compiled._stride]),
+            'rejection': REJECT_MARKERS[self.status],
+            'error': self.dfa.error_message(self.status, self.symbol, final_state)
+        }
+
+
+class IncrementalDFA:
+    '''Re-simulation that keeps the state after every prefix of the last input, see `checkpoint_logic`.'''
+    def __init__(self, dfa: DFA):
+        '''
+        Args:
+            dfa (DFA): The machine to run.
+        '''
+        self.dfa: DFA = dfa
+        self.compiled: CompiledDFA = dfa.compile()
+        self.input: str = ''
+        self.resumed: int = 0
+        self.lock = threading.Lock()
+        # Pre-multiplied offset of the state after each prefix, up to the rejecting symbol if there was one.
+        self._offsets: list = [self.compiled.start * self.compiled._stride]
+        self._stop: int | None = None
+
+    def simulate(self, input_string: str, trace: str | None = None, stats: SearchStats | None = None) -> dict:
+        '''
+        Simulates the DFA on the given input string, reading only what follows the prefix it shares with the last input.
+
+        Parameters:
+            input_string (str): User input string to process.
+            trace (str): How much of `state_sequence` to return, see `trace_logic` ('full' by default).
+            stats (SearchStats): Filled with the effort counters of the call; steps are the symbols read by it.
+
+        Returns:
+            out: dict, the same as `DFA.simulate(input_string, trace)`.
+
+        Exceptions:
+            Value Error: Unknown trace mode.
+        '''
+        compiled = self.compiled
+        stride = compiled._stride
+        recorder = TraceRecorder(trace, render=lambda entry: entry if isinstance(entry, str) else compiled.offset_ids[entry])
+        recorder.state_of = recorder.render
+        offsets = self._offsets
+        self.resumed = shared_prefix(self.input, input_string)
+        self.input = input_string
+        read = 0
+        if self._stop is None or self._stop >= self.resumed:
+            # Everything after the shared prefix is read again.
+            del offsets[self.resumed + 1:]
+            self._stop = None
+            fast = compiled._fast
+            sink = compiled._sink
+            current = offsets[-1]
+            append = offsets.append
+            for code in compiled.encode(input_string[len(offsets) - 1:]):
+                read += 1
+                following = fast[current + code]
+                if following == sink:
+                    self._stop = len(offsets) - 1
+                    break
+                current = following
+                append(current)
+
+        current = offsets[-1] // stride
+        status = STATUS_OK
+        symbol = None
+        if self._stop is not None:
+            symbol = input_string[self._stop]
+            current, status = compiled.status_at(current, symbol)
+        if recorder.mode in ('none', 'summary'):
+            recorder.length = len(offsets)
+        else:
+            recorder.extend(offsets[-recorder.k:] if recorder.mode == 'last' else offsets)
+            recorder.length = len(offsets)
+        if status == STATUS_TRAP_STATE:
+            recorder.append(current * stride)
+        if status != STATUS_OK:
+            recorder.append(REJECT_MARKERS[status])
+
+        error_message = self.dfa.error_message(status, symbol, compiled.state_ids[current]) if status != STATUS_OK else None
+        result = {
+            'input': input_string,
+            'final_state': compiled.state_ids[current],
+            'accepted': error_message is None and bool(compiled.accept[current]),
+            'state_sequence': recorder.result(),
+            'error': error_message
+        }
+        if stats is not None:
+            stats.steps = stats.configurations = read
+            stats.peak_frontier = 1
+            stats.finish('dfa', result)
+        return result
+
+    def footprint(self) -> int:
+        '''
+        Returns:
+            out: int, the estimated bytes held by the checkpoints.
+        '''
+        return 40 * len(self._offsets) + len(self.input)
+
+
+class MultiDFA:
+    '''
+    Runs several DFAs over one input in a single pass. The machines advance together through their product
+    automaton, which is built on demand over the union of their alphabets: a product state is the tuple of the
+    machines' table offsets, and each new (state, symbol) pair is expanded once and then costs one lookup, however
+    many machines there are. Past `max_states` product states the run goes on with one lookup per machine and
+    symbol in their own tables (stacked tables), so a large product never takes more memory than that.
+    '''
+    def __init__(self, dfas: list[DFA], max_states: int = 4096):
+        '''
+        Args:
+            dfas (list): The machines to run, in the order of the results.
+            max_states (int): The most product states kept.
+
+        Exceptions:
+            Value Error: No machine to run.
+        '''
+        if not dfas:
+            raise ValueError('A multi-DFA run needs at least one DFA.')
+        self.dfas: list = list(dfas)
+        self.compiled: list = [dfa.compile() for dfa in self.dfas]
+        self.max_states: int = max_states
+        # Only single-character symbols can match the input, which is read one character at a time.
+        symbols = sorted({symbol for compiled in self.compiled for symbol in compiled.symbols if len(symbol) == 1})
+        self.columns: dict = {symbol: column for column, symbol in enumerate(symbols)}
+        self.width: int = len(symbols)
+        self._stride: int = self.width + 1
+        self._encode = _UnknownSymbol({ord(symbol): column for symbol, column in self.columns.items()}, self.width) if self._stride <= 256 else None
+        # Union column -> column of each machine; the last union column (outside every alphabet) is reserved too.
+        self._column_maps: list = [tuple(compiled.columns.get(symbol, compiled.width) for symbol in symbols) + (compiled.width,) for compiled in self.compiled]
+        self._sinks: tuple = tuple(compiled._sink for compiled in self.compiled)
+        start = tuple(compiled.start * compiled._stride for compiled in self.compiled)
+        # Product state index -> offsets; `_delta` is indexed by pre-multiplied state plus column, -1 until expanded.
+        # Steps on which a machine is rejected stay -1 there and are kept in `_rejecting` with the machines they reject.
+        self._states: list = [start]
+        self._index: dict = {start: 0}
+        self._delta: list = [-1] * self._stride
+        self._rejecting: dict = {}
+        self._lock = threading.Lock()
+
+    def encode(self, input_string: str):
+        '''
+        Maps an input string to union columns, like `CompiledDFA.encode`.
+
+        Returns:
+            out: bytes when the union alphabet fits in a byte, otherwise a list of ints.
+        '''
+        if self._encode is not None:
+            return input_string.translate(self._encode).encode('latin-1')
+        columns = self.columns
+        width = self.width
+        return [columns.get(symbol, width) for symbol in input_string]
+
+    def _expand(self, current: int, code: int) -> tuple:
+        '''
+        Expands one product step.
+
+        Returns:
+            out: `(following, rejected)` with the pre-multiplied next product state (None when it would exceed
+            `max_states`) and the indices of the machines the step rejects.
+        '''
+        with self._lock:
+            known = self._rejecting.get(current + code)
+            if known is not None:
+                return known
+            following = self._delta[current + code]
+            if following >= 0:
+                return following, ()
+            state = self._states[current // self._stride]
+            target = tuple(compiled._fast[offset + column_map[code]] for compiled, column_map, offset in zip(self.compiled, self._column_maps, state))
+            index = self._index.get(target)
+            if index is None:
+                if len(self._states) >= self.max_states:
+                    return None, ()
+                index = self._index[target] = len(self._states)
+                self._states.append(target)
+                self._delta.extend([-1] * self._stride)
+            following = index * self._stride
+            rejected = tuple(machine for machine, sink in enumerate(self._sinks) if state[machine] != sink and target[machine] == sink)
+            if rejected:
+                self._rejecting[current + code] = (following, rejected)
+            else:
+                self._delta[current + code] = following
+            return following, rejected
+
+    def run(self, input_string: str) -> tuple[list, dict]:
+        '''
+        Scans the input once for every machine. The scan stops early once every machine is rejected.
+
+        Args:
+            input_string (str): User input string to process.
+
+        Returns:
+            out: `(offsets, stops)` with each machine's final table offset, and for each rejected machine the
+            position of the rejecting symbol and the offset of the state before it.
+        '''
+        codes = self.encode(input_string)
+        delta = self._delta
+        stride = self._stride
+        stops = {}
+        current = 0
+        for position, code in enumerate(codes):
+            following = delta[current + code]
+            if following < 0:
+                following, rejected = self._expand(current, code)
+                if following is None:
+                    offsets = list(self._states[current // stride])
+                    self._run_stacked(offsets, codes, position, stops)
+                    return offsets, stops
+                for machine in rejected:
+                    stops[machine] = (position, self._states[current // stride][machine])
+                if len(stops) == len(self.dfas):
+                    break
+            current = following
+        return list(self._states[current // stride]), stops
+
+    def _run_stacked(self, offsets: list, codes, begin: int, stops: dict):
+        '''Advances every machine still running over `codes[begin:]` in its own table (see `run`).'''
+        tables = [(machine, compiled._fast, self._column_maps[machine], compiled._sink) for machine, compiled in enumerate(self.compiled) if machine not in stops]
+        for position in range(begin, len(codes)):
+            code = codes[position]
+            for machine, fast, column_map, sink in tables:
+                following = fast[offsets[machine] + column_map[code]]
+                if following == sink:
+                    stops[machine] = (position, offsets[machine])
+                offsets[machine] = following
+            if len(tables) > len(self.dfas) - len(stops):
+                tables = [table for table in tables if table[0] not in stops]
+                if not tables:
+                    return
+
+    def simulate(self, input_string: str) -> list[dict]:
+        '''
+        Runs every machine over the input in one pass.
+
+        Parameters:
+            input_string (str): User input string to process.
+
+        Returns:
+            out: One dict per machine, in order, as `DFARunner.finish` returns it for the whole input: the
+            verdict, the final state, and for a rejected machine the position of the rejecting symbol as `length`.
+        '''
+        offsets, stops = self.run(input_string)
+        results = []
+        for machine, (dfa, compiled) in enumerate(zip(self.dfas, self.compiled)):
+            runner = dfa.runner()
+            if machine in stops:
+                runner.position, offset = stops[machine]
+                runner.symbol = input_string[runner.position]
+                index, runner.status = compiled.status_at(offset // compiled._stride, runner.symbol)
+                runner._current = index * compiled._stride
+            else:
+                runner.position = len(input_string)
+                runner._current = offsets[machine]
+            results.append(runner.finish())
+        return results
+
+    def footprint(self) -> int:
+        '''
+        Returns:
+            out: int, the most bytes the product table can grow to.
+        '''
+        return self.max_states * (8 * self._stride + 64 + 16 * len(self.dfas))
+
 
 if __name__ == '__main__':
 
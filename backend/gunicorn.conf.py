@@ -0,0 +1,10 @@
+"""gunicorn settings for a long-running server: `gunicorn -c gunicorn.conf.py app:app` from this directory.
+
+The search pool of `app` is off by default, because spawning its worker
+processes would slow down every cold start of a serverless instance. A
+long-running server pays that once, so it is turned on here, with one search
+worker per CPU unless SEARCH_WORKERS is already set (0 keeps it off).
+"""
+import os
+
+os.environ.setdefault('SEARCH_WORKERS', str(os.cpu_count() or 1))
@@ -0,0 +1,186 @@
+"""Search-effort counters and Prometheus-style metrics.
+
+`SearchStats` holds the counters of one `simulate` call. Every simulator takes
+an optional `stats` argument and fills it in:
+
+- engine: the engine that produced the result (e.g. 'gss', or 'linear' for
+  the queue-free deterministic PDA path).
+- steps: configurations (PDA), sentential forms or Earley items (CFG), or
+  symbols (DFA) processed.
+- configurations: distinct configurations, forms or items created.
+- peak_frontier: the largest queue, closure, Earley set or search depth.
+- pruned: branches dropped without being explored (cycle checks, dead states,
+  length and prefix bounds, memoized failures).
+- hit_limit: whether `max_steps`, `max_depth` or a search budget cut the
+  search short, so a rejection may be inconclusive.
+- trace_length: entries in the returned trace (None with trace 'none').
+
+`MetricsRegistry` keeps counters and histograms and renders them in the
+Prometheus text exposition format for `/metrics`.
+"""
+import bisect
+import threading
+
+
+class SearchStats:
+    """Search-effort counters of one `simulate` call; see the module docstring."""
+    __slots__ = ('engine', 'steps', 'configurations', 'peak_frontier', 'pruned', 'hit_limit', 'trace_length')
+
+    def __init__(self):
+        self.engine = None
+        self.steps = 0
+        self.configurations = 0
+        self.peak_frontier = 0
+        self.pruned = 0
+        self.hit_limit = False
+        self.trace_length = None
+
+    def finish(self, engine: str, result: dict) -> dict:
+        """Records the engine and the trace length of `result`, and returns it."""
+        self.engine = engine
+        sequence = result.get('sequence', result.get('state_sequence'))
+        if isinstance(sequence, list):
+            self.trace_length = len(sequence)
+        elif isinstance(sequence, dict):
+            self.trace_length = sequence['length']
+        return result
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Latency buckets in seconds, and buckets for per-call effort counts (powers of 4).
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = tuple(4 ** power for power in range(13))
+
+
+def _labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _number(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination."""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount=1):
+        """Adds `amount` to the count of the label values (in the order of `labels`)."""
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def value(self, *values):
+        return self._values.get(values, 0)
+
+    def samples(self) -> list[str]:
+        with self._lock:
+            return [f'{self.name}{_labels(self.labels, values)} {_number(count)}' for values, count in sorted(self._values.items())]
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observed values per label combination."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, *values, value):
+        """Records one observation of `value` for the label values (in the order of `labels`)."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *values):
+        series = self._series.get(values)
+        return series[2] if series else 0
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    bound_label = 'le="' + _number(bound) + '"'
+                    lines.append(f'{self.name}_bucket{_labels(self.labels, values, bound_label)} {cumulative}')
+                lines.append(f'{self.name}_sum{_labels(self.labels, values)} {_number(total)}')
+                lines.append(f'{self.name}_count{_labels(self.labels, values)} {count}')
+        return lines
+
+
+class MetricsRegistry:
+    """The request and search-effort metrics of the app."""
+
+    def __init__(self, namespace: str = 'automata'):
+        self.requests = Counter(f'{namespace}_requests_total', 'HTTP requests by endpoint and status code.', ('endpoint', 'status'))
+        self.errors = Counter(f'{namespace}_request_errors_total', 'HTTP requests answered with a 4xx or 5xx status.', ('endpoint',))
+        self.latency = Histogram(f'{namespace}_request_duration_seconds', 'HTTP request latency.', ('endpoint',))
+        search = ('kind', 'engine')
+        self.searches = Counter(f'{namespace}_searches_total', 'Simulations run (cache hits excluded).', search)
+        self.steps = Histogram(f'{namespace}_search_steps', 'Steps taken per simulation.', search, COUNT_BUCKETS)
+        self.configurations = Histogram(f'{namespace}_search_configurations', 'Configurations explored per simulation.', search, COUNT_BUCKETS)
+        self.peak_frontier = Histogram(f'{namespace}_search_peak_frontier', 'Peak frontier size per simulation.', search, COUNT_BUCKETS)
+        self.trace_length = Histogram(f'{namespace}_search_trace_length', 'Trace entries returned per simulation.', search, COUNT_BUCKETS)
+        self.pruned = Counter(f'{namespace}_search_pruned_total', 'Branches pruned without being explored.', search)
+        self.limit_hits = Counter(f'{namespace}_search_limit_hits_total', 'Simulations cut short by a step, depth or budget limit.', search)
+        self.timeouts = Counter(f'{namespace}_search_timeouts_total', 'Searches abandoned at their deadline or because the client went away.', ('kind', 'reason'))
+        self._metrics = [self.requests, self.errors, self.latency, self.searches, self.steps, self.configurations,
+                         self.peak_frontier, self.trace_length, self.pruned, self.limit_hits, self.timeouts]
+
+    def observe_request(self, endpoint: str, status: int, seconds: float):
+        self.requests.inc(endpoint, status)
+        if status >= 400:
+            self.errors.inc(endpoint)
+        self.latency.observe(endpoint, value=seconds)
+
+    def observe_search(self, kind: str, stats: SearchStats):
+        labels = (kind, stats.engine)
+        self.searches.inc(*labels)
+        self.steps.observe(*labels, value=stats.steps)
+        self.configurations.observe(*labels, value=stats.configurations)
+        self.peak_frontier.observe(*labels, value=stats.peak_frontier)
+        if stats.trace_length is not None:
+            self.trace_length.observe(*labels, value=stats.trace_length)
+        self.pruned.inc(*labels, amount=stats.pruned)
+        if stats.hit_limit:
+            self.limit_hits.inc(*labels)
+
+    def observe_timeout(self, kind: str, cancelled: bool):
+        self.timeouts.inc(kind, 'cancelled' if cancelled else 'deadline')
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
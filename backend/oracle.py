@@ -0,0 +1,154 @@
+"""Long-lived oracle process for the parity check of the TypeScript engines.
+
+Reads one JSON request per line on stdin and writes one JSON response per
+line on stdout, flushed after each, until stdin is closed:
+
+    {"id": 1, "kind": "dfa", "definition": {...}, "inputs": ["", "ab"]}
+    {"id": 1, "machine_id": "...", "engine": "dfa", "results": [{...}, {...}]}
+
+- kind: 'dfa', 'cfg' or 'pda'.
+- definition: the machine in the JSON shape of the frontend presets (see
+  `registry_logic`), or machine: the id returned for an earlier definition,
+  or a built-in machine such as 'bets_dfa' or 'stars_pda'. A built-in
+  machine is registered like a definition, from the tables of `app`.
+- engine (optional): 'dfa'; 'earley', 'bfs' or 'iddfs' for a CFG; 'gss' or
+  'bfs' for a PDA. Defaults to the first.
+- trace (optional): the trace option (see `trace_logic`), 'full' by default.
+- inputs: the strings to simulate.
+
+Each result is the `simulate` result of one input, in order; `id` is echoed
+back. A bad request gets `{"id": ..., "error": "..."}` and the process goes
+on. Definitions are built as in the parity check (CFGs and PDAs without
+early exit), once per process: a definition sent again is recognized by its
+content hash. Usage:
+
+    python oracle.py < requests.ndjson
+"""
+import json
+import sys
+
+from registry_logic import MachineRegistry
+from trace_logic import parse_trace
+
+ENGINES = {'dfa': ('dfa',), 'cfg': ('earley', 'bfs', 'iddfs'), 'pda': ('gss', 'bfs')}
+
+
+class Oracle:
+    """Answers oracle requests, keeping every machine it built."""
+
+    def __init__(self, max_machines: int = 4096):
+        self.registry = MachineRegistry(max_machines=max_machines)
+
+    def machine(self, kind: str, request: dict) -> tuple[str, object]:
+        """
+        The id and built machine a request names.
+
+        Raises:
+            ValueError: Unknown kind, invalid definition, or a machine of another kind.
+            KeyError: Unknown machine.
+        """
+        if kind not in ENGINES:
+            raise ValueError(f'Unknown machine kind "{kind}": must be one of {", ".join(ENGINES)}.')
+        if 'definition' in request:
+            machine_id, _ = self.registry.register(kind, request['definition'])
+        else:
+            machine_id = str(request.get('machine'))
+            if machine_id not in self.registry:
+                machine_id, _ = self.registry.register(kind, _builtin_definition(kind, machine_id))
+        machine_kind, machine = self.registry.get(machine_id)
+        if machine_kind != kind:
+            raise ValueError(f'Machine {machine_id} is a {machine_kind}, not a {kind}.')
+        return machine_id, machine
+
+    def handle(self, request) -> dict:
+        """The response to one request."""
+        if not isinstance(request, dict):
+            return {'id': None, 'error': 'A request must be a JSON object.'}
+        response = {'id': request.get('id')}
+        try:
+            kind = request.get('kind')
+            machine_id, machine = self.machine(kind, request)
+            engine = request.get('engine') or ENGINES[kind][0]
+            if engine not in ENGINES[kind]:
+                raise ValueError(f'Unknown {kind} engine "{engine}": must be one of {", ".join(ENGINES[kind])}.')
+            inputs = request.get('inputs')
+            if not isinstance(inputs, list) or not all(isinstance(value, str) for value in inputs):
+                raise ValueError('inputs must be a list of strings.')
+            trace = request.get('trace')
+            parse_trace(trace)
+            if kind == 'dfa':
+                results = [machine.simulate(value, trace=trace) for value in inputs]
+            else:
+                results = [machine.simulate(value, trace=trace, engine=engine) for value in inputs]
+        except KeyError as e:
+            response['error'] = f'Unknown machine {e}.'
+            return response
+        except ValueError as e:
+            response['error'] = str(e)
+            return response
+        except Exception as e:
+            response['error'] = f'Internal error: {e!r}'
+            return response
+        response.update(machine_id=machine_id, engine=engine, results=results)
+        return response
+
+    def serve(self, stdin=sys.stdin, stdout=sys.stdout):
+        """Answers the requests of `stdin`, one per line, until it is closed."""
+        for line in iter(stdin.readline, ''):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = {'id': None, 'error': f'Invalid JSON: {e}'}
+            else:
+                response = self.handle(request)
+            stdout.write(json.dumps(response) + '\n')
+            stdout.flush()
+
+
+def _builtin_definition(kind: str, name: str) -> dict:
+    """
+    The definition of a built-in machine of the app by name ('bets_dfa',
+    'stars_cfg', ...), derived from its DFA as `app.build_cfg` and
+    `app.build_pda` do, in the same rule and transition order. The app is
+    only imported for these.
+    """
+    prefix, _, machine_kind = name.rpartition('_')
+    if machine_kind != kind:
+        raise KeyError(name)
+    import app
+    machines = app.BUILTIN_MACHINES.get(f'{prefix}_dfa')
+    if machines is None:
+        raise KeyError(name)
+    dfa = machines['dfa'].get()
+    if kind == 'dfa':
+        return {
+            'states': [{'id': state} for state in dfa.states],
+            'alphabet': list(dfa.alphabet),
+            'transitions': {str(state): paths for state, paths in dfa.transitions.items()},
+            'startState': dfa.start_state,
+            'acceptingStates': list(dfa.final_states),
+            'trapStates': list(dfa.trap_states)
+        }
+    if kind == 'cfg':
+        return {
+            'variables': [f'Q{state}' for state in dfa.states],
+            'terminals': list(dfa.alphabet),
+            'rules': [{'from': f'Q{state}', 'to': [symbol, f'Q{target}']} for state, paths in dfa.transitions.items()
+                      for symbol, target in paths.items()] + [{'from': f'Q{state}', 'to': ['ε']} for state in dfa.final_states],
+            'startSymbol': f'Q{dfa.start_state}'
+        }
+    return {
+        'states': [{'id': state} for state in dfa.states],
+        'inputAlphabet': list(dfa.alphabet),
+        'stackAlphabet': list(dfa.alphabet) + ['Z0'],
+        'transitions': [{'from': state, 'input': symbol, 'stackTop': 'ε', 'to': target, 'push': [symbol]}
+                        for state, paths in dfa.transitions.items() for symbol, target in paths.items()],
+        'startState': dfa.start_state,
+        'initialStackSymbol': 'Z0',
+        'acceptingStates': list(dfa.final_states)
+    }
+
+if __name__ == '__main__':
+    Oracle().serve()
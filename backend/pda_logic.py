@@ -1,13 +1,127 @@
+from bisect import bisect_left
 from collections import deque
 import logging
+import threading
+
+from checkpoint_logic import shared_prefix
+from metrics_logic import SearchStats
+from trace_logic import TraceRecorder
 
 logger = logging.getLogger(__name__)
 
+class StackPool:
+    """
+    Persistent, hash-consed stacks. A stack is an int id (0 is the empty stack)
+    naming a cell `(top symbol, id of the stack below)`. Push and pop are O(1),
+    stacks share every common bottom, and equal stacks always get the same id,
+    so ids can stand in for whole stacks in sets and comparisons.
+    """
+
+    def __init__(self):
+        self.symbols = [None]
+        self.below = [0]
+        self._cells = {}
+
+    def push(self, stack: int, symbol: str) -> int:
+        key = (stack, symbol)
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.below.append(stack)
+        return cell
+
+    def pop(self, stack: int) -> int:
+        return self.below[stack]
+
+    def top(self, stack: int) -> str:
+        return self.symbols[stack] if stack else 'ε'
+
+    def to_list(self, stack: int) -> list[str]:
+        """The stack as a list, bottom first."""
+        items = []
+        while stack:
+            items.append(self.symbols[stack])
+            stack = self.below[stack]
+        items.reverse()
+        return items
+
+
+class GraphStack:
+    """
+    Graph-structured stack for `PDA._simulate_gss`. A vertex is an int id
+    holding one stack symbol and an ordered set of the vertices right below
+    it; vertex 0 is the empty stack. A stack is any path from a vertex down
+    to 0, so one vertex stands for every stack that has it on top.
+
+    Vertices are keyed by `(position, next_state, pushed, depth)`: every move
+    that pushes the same symbols into the same state at the same input
+    position reuses one chain of vertices and only adds an edge below it, so
+    common stack suffixes and identical pushes are shared.
+    """
+
+    def __init__(self):
+        self.symbols = [None]
+        self.below = [{}]
+        self.depth = [0]
+        self._vertices = {}
+
+    def vertex(self, key: tuple, symbol: str, depth: int) -> int:
+        found = self._vertices.get(key)
+        if found is None:
+            found = self._vertices[key] = len(self.symbols)
+            self.symbols.append(symbol)
+            self.below.append({})
+            self.depth.append(depth)
+        return found
+
+    def add_edge(self, vertex: int, below: int) -> bool:
+        """Adds `below` under `vertex`; returns whether the edge is new."""
+        if below in self.below[vertex]:
+            return False
+        self.below[vertex][below] = None
+        return True
+
+    def top(self, vertex: int) -> str:
+        return self.symbols[vertex] if vertex else 'ε'
+
+    def truncate(self, size: int):
+        """Removes every vertex from `size` on, with the edges below them."""
+        del self.symbols[size:], self.below[size:], self.depth[size:]
+        while len(self._vertices) >= size:
+            self._vertices.popitem()
+
+    def first_path(self, vertex: int) -> tuple:
+        """
+        One concrete stack below `vertex`, as a top-first cons list
+        `(vertex, rest)` ending in `(0, None)`. It follows the oldest edge of
+        each vertex, which always points at an older vertex, so it ends.
+        """
+        vertices = []
+        while vertex:
+            vertices.append(vertex)
+            vertex = next(iter(self.below[vertex]))
+        path = (0, None)
+        for vertex in reversed(vertices):
+            path = (vertex, path)
+        return path
+
+    def to_list(self, path: tuple) -> list[str]:
+        """A cons-list stack as a list, bottom first."""
+        items = []
+        while path[0]:
+            items.append(self.symbols[path[0]])
+            path = path[1]
+        items.reverse()
+        return items
+
+
 class PDA:
-    """Class for simulating a Pushdown Automaton using Breadth-First-Search."""
+    """Class for simulating a Pushdown Automaton over a graph-structured stack (or with Breadth-First-Search)."""
     
     def __init__(self, states: set[int], input_alphabet: set[str], stack_alphabet: set[str], 
-                 transitions: dict, start_state: int, initial_stack: str, final_states: set[int]):
+                 transitions: dict, start_state: int, initial_stack: str, final_states: set[int],
+                 early_exit: bool = False):
         """
         transitions structure:
         {
@@ -17,6 +131,13 @@ class PDA:
                }
            }
         }
+
+        With `early_exit`, `simulate` stops expanding configurations in a dead
+        state and accepts as soon as it reaches an accepting sink with only
+        alphabet symbols left (see `_analyse_states`). The returned sequence
+        is then completed with one stack-ignoring move into a sink per
+        remaining symbol (see `_sink_steps`), so it still ends at the end of
+        the input.
         """
         self.states = states
         self.input_alphabet = input_alphabet
@@ -25,105 +146,740 @@ class PDA:
         self.start_state = start_state
         self.initial_stack = initial_stack
         self.final_states = final_states
+        self.early_exit = early_exit
+        self.dead_states, self.accepting_sinks = self._analyse_states()
+        self._moves = {}
+        for state in self.states:
+            for symbol in list(self.input_alphabet) + [None]:
+                for stack_top in list(self.stack_alphabet) + ['ε']:
+                    self.moves(state, symbol, stack_top)
+        # A DPDA never offers more than one move for a (state, symbol, stack top) it can be in. Only real
+        # stack symbols count; an empty stack is rare and `_simulate_linear` checks it at run time.
+        self.deterministic = all(len(moves) <= 1 for (_, _, stack_top), moves in self._moves.items() if stack_top != 'ε')
+        self.has_epsilon = any('ε' in by_input for by_input in self.transitions.values())
+
+    def moves(self, state: int, symbol: str | None, stack_top: str) -> tuple:
+        """
+        The moves available in a configuration, from the flat index built by
+        the constructor (entries for unforeseen symbols are added on demand).
+
+        Args:
+            state: The current state.
+            symbol: The next input symbol, or None at the end of the input.
+            stack_top: The top of the stack, 'ε' when it is empty.
+
+        Returns:
+            A tuple of `(pops, next_state, pushed, consumes)` moves, in the
+            order the search tries them: symbol with stack top, symbol with
+            any stack, ε-input with stack top, ε-input with any stack.
+            `pushed` lists the symbols to push in push order.
+        """
+        key = (state, symbol, stack_top)
+        found = self._moves.get(key)
+        if found is None:
+            state_trans = self.transitions.get(state, {})
+            found = []
+            groups = []
+            if symbol is not None:
+                groups.append((state_trans.get(symbol, {}).get(stack_top, []), True, True))
+                groups.append((state_trans.get(symbol, {}).get('ε', []), False, True))
+            groups.append((state_trans.get('ε', {}).get(stack_top, []), True, False))
+            groups.append((state_trans.get('ε', {}).get('ε', []), False, False))
+            for transitions, reads_stack, consumes in groups:
+                for next_st, pushes in transitions:
+                    pushed = tuple(reversed(pushes)) if pushes and pushes != ['ε'] else ()
+                    found.append((reads_stack and stack_top != 'ε', next_st, pushed, consumes))
+            found = self._moves[key] = tuple(found)
+        return found
 
-    def simulate(self, input_string: str) -> dict:
+    def _analyse_states(self) -> tuple[set, set]:
+        """
+        Stack-independent reachability analysis over the state graph.
+
+        A state is dead when no final state is reachable from it through any
+        transition; ignoring the stack only adds paths, so this never marks a
+        live state dead. A final state is an accepting sink when every input
+        symbol has a transition that ignores the stack ('ε' stack top, so it
+        can always fire) into another accepting sink.
+        """
+        predecessors = {}
+        for state, by_input in self.transitions.items():
+            for by_stack in by_input.values():
+                for moves in by_stack.values():
+                    for next_st, _ in moves:
+                        predecessors.setdefault(next_st, set()).add(state)
+        live = set(self.final_states)
+        pending = list(live)
+        while pending:
+            for state in predecessors.get(pending.pop(), ()):
+                if state not in live:
+                    live.add(state)
+                    pending.append(state)
+        dead_states = set(self.states) - live
+
+        sinks = set(self.final_states)
+        changed = True
+        while changed:
+            changed = False
+            for state in list(sinks):
+                by_input = self.transitions.get(state, {})
+                for symbol in self.input_alphabet:
+                    moves = by_input.get(symbol, {}).get('ε', [])
+                    if not any(next_st in sinks for next_st, _ in moves):
+                        sinks.discard(state)
+                        changed = True
+                        break
+        return dead_states, sinks
+
+    def simulate(self, input_string: str, trace: str | None = None, max_steps: int = 1000, engine: str = 'gss',
+                 stats: SearchStats | None = None) -> dict:
         """
         Simulate the PDA on the input string.
-        Since PDAs can be non-deterministic, we use BFS to explore paths.
-        Each configuration is: (current_state, consumed_length, stack_list)
-        History tracks the progression of states and stack for visualization.
+
+        The default 'gss' engine advances every configuration in lockstep over
+        a graph-structured stack (see `_simulate_gss`). It has no step cap and
+        stays polynomial on ambiguous PDAs; a DPDA without ε-moves takes the
+        queue-free `_simulate_linear` path instead.
+
+        The 'bfs' engine explores paths one configuration at a time and gives
+        up after `max_steps` configurations.
+        Each configuration is a parent-pointer node: (current_state, consumed_length, stack, parent),
+        where stack is an id into a `StackPool`, so stacks share their common bottoms and are hashed in O(1).
+        History (the progression of states and stack for visualization) is only rebuilt for the one path
+        that is returned. `trace` picks how much of it is built, see `trace_logic`.
+
+        `stats`, if given, receives the search-effort counters of the run
+        (see `metrics_logic`); its engine is 'linear' when the queue-free path
+        answered.
         """
-        # initial queue element: (state, index_of_input, stack, history_sequence)
-        queue = deque([(self.start_state, 0, [self.initial_stack], [])])
+        if engine not in ('gss', 'bfs'):
+            raise ValueError(f'Unknown PDA engine "{engine}": must be gss or bfs.')
+        if stats is None:
+            stats = SearchStats()
+        stacks = StackPool()
+        valid_from = self._valid_from(input_string)
+        recorder = TraceRecorder(trace, render=lambda node: self._step_view(input_string, node[0], node[1], stacks.to_list(node[2])), state_of=lambda node: node[0])
+        if engine == 'gss':
+            if self.deterministic and not self.has_epsilon:
+                result = self._simulate_linear(input_string, stacks, recorder, None, stats, valid_from)
+                if result is not None:
+                    return stats.finish('linear', result)
+            return stats.finish('gss', self._simulate_gss(input_string, trace, stats))
+        if self.deterministic:
+            result = self._simulate_linear(input_string, stacks, recorder, max_steps, stats, valid_from)
+            if result is not None:
+                return stats.finish('linear', result)
+        return stats.finish('bfs', self._simulate_bfs(input_string, stacks, recorder, max_steps, stats, valid_from))
+
+    def _valid_from(self, input_string: str) -> int:
+        """The position from which every symbol of the input is in the alphabet (0 without early exit, where it is unused)."""
+        if not (self.early_exit and self.accepting_sinks):
+            return 0
+        return _invalid_positions([], self.input_alphabet, input_string, 0)
+
+    def _sink_accepts(self, state: int, input_idx: int, valid_from: int) -> bool:
+        """Whether the early exit accepts at `state`: an accepting sink with only alphabet symbols left to read."""
+        return self.early_exit and state in self.accepting_sinks and input_idx >= valid_from
+
+    def _sink_steps(self, state: int, input_idx: int, input_string: str):
+        """
+        Yields `(state, input_idx, pushed)` for each move that reads the rest
+        of the input from the accepting sink `state` at `input_idx`: a move
+        that ignores the stack into another sink, which `_analyse_states`
+        guarantees for every alphabet symbol. `pushed` lists the symbols the
+        move pushes, in push order.
+        """
+        sinks = self.accepting_sinks
+        for input_idx in range(input_idx, len(input_string)):
+            _, state, pushed, _ = next(move for move in self.moves(state, input_string[input_idx], 'ε')
+                                       if move[3] and move[1] in sinks)
+            yield state, input_idx + 1, pushed
+
+    def _complete_sink(self, node: tuple, input_string: str, stacks: 'StackPool') -> list[tuple]:
+        """The nodes that follow `node`, in an accepting sink, to the end of the input (see `_sink_steps`)."""
+        nodes = []
+        stack = node[2]
+        for state, input_idx, pushed in self._sink_steps(node[0], node[1], input_string):
+            for push_sym in pushed:
+                stack = stacks.push(stack, push_sym)
+            node = (state, input_idx, stack, node)
+            nodes.append(node)
+        return nodes
+
+    def _record_accepted(self, node: tuple, input_string: str, stacks: 'StackPool', recorder: TraceRecorder):
+        """Records the path to an accepting node, completed to the end of the input if it was accepted early."""
+        recorder.extend(self._path(node))
+        if node[1] < len(input_string) and recorder.mode != 'none':
+            recorder.extend(self._complete_sink(node, input_string, stacks))
+
+    def _simulate_bfs(self, input_string: str, stacks: 'StackPool', recorder: TraceRecorder, max_steps: int, stats: SearchStats,
+                      valid_from: int) -> dict:
+        """Breadth-first search over configurations, giving up after `max_steps` of them (see `simulate`)."""
+        # initial queue element: (state, index_of_input, stack, parent_node)
+        queue = deque([(self.start_state, 0, stacks.push(0, self.initial_stack), None)])
         visited_states = set()  # To avoid infinite epsilon loops without stack growth
-        max_steps = 1000
         steps = 0
+        configurations = 1
+        peak = 1
+        pruned = 0
+
+        def tally():
+            stats.steps += steps
+            stats.configurations += configurations
+            stats.peak_frontier = max(stats.peak_frontier, peak)
+            stats.pruned += pruned
         
-        longest_error_path = []
+        longest_error_node = None
         longest_index = 0
 
         while queue and steps < max_steps:
             steps += 1
-            current_state, input_idx, current_stack, history = queue.popleft()
-            
-            # Format configuration for frontend animation or logging
-            stack_view = current_stack.copy()
-            # The frontend script.js animatePDA will want the "state_sequence" 
-            # and potentially stack states. To simplify and align with DFA visualization, 
-            # we'll record the state visited at each step.
-            new_history = history + [{
-                'state': current_state,
-                'stack': stack_view,
-                'consumed': input_string[:input_idx],
-                'remaining': input_string[input_idx:]
-            }]
+            if len(queue) > peak:
+                peak = len(queue)
+            node = queue.popleft()
+            current_state, input_idx, current_stack, _ = node
 
             # Check acceptance (by final state and end of input)
             if input_idx == len(input_string) and current_state in self.final_states:
+                tally()
+                recorder.extend(self._path(node))
                 return {
                     'input': input_string,
                     'accepted': True,
-                    'sequence': new_history,
+                    'sequence': recorder.result(),
+                    'error': None
+                }
+
+            if self._sink_accepts(current_state, input_idx, valid_from):
+                tally()
+                self._record_accepted(node, input_string, stacks, recorder)
+                return {
+                    'input': input_string,
+                    'accepted': True,
+                    'sequence': recorder.result(),
                     'error': None
                 }
 
             if input_idx > longest_index:
                 longest_index = input_idx
-                longest_error_path = new_history
-
-            # Determine available transitions
-            state_trans = self.transitions.get(current_state, {})
-            # Look at transitions for current input symbol
-            available_transitions = []
-            
-            stack_top = current_stack[-1] if current_stack else 'ε'
-            
-            if input_idx < len(input_string):
-                current_char = input_string[input_idx]
-                # Match symbol and stack
-                for next_st, pushes in state_trans.get(current_char, {}).get(stack_top, []):
-                    available_transitions.append(('match', current_char, next_st, pushes))
-                # Match symbol and epsilon stack (ignore stack)
-                for next_st, pushes in state_trans.get(current_char, {}).get('ε', []):
-                    available_transitions.append(('match_eps_stack', current_char, next_st, pushes))
-                    
-            # Match epsilon input and top stack
-            for next_st, pushes in state_trans.get('ε', {}).get(stack_top, []):
-                available_transitions.append(('eps_input', 'ε', next_st, pushes))
-            # Match epsilon input and epsilon stack
-            for next_st, pushes in state_trans.get('ε', {}).get('ε', []):
-                available_transitions.append(('eps_both', 'ε', next_st, pushes))
+                longest_error_node = node
+
+            if self.early_exit and current_state in self.dead_states:
+                pruned += 1
+                continue
 
             # Apply transitions
-            for trans_type, consumed_char, next_st, pushes in available_transitions:
-                next_stack = current_stack.copy()
-                
-                # Pop logic
-                if trans_type in ('match', 'eps_input') and stack_top != 'ε':
-                    if next_stack:
-                        next_stack.pop()
-                
-                # Push logic
-                if pushes and pushes != ['ε']:
-                    # Usually multiple pushed symbols are pushed right-to-left
-                    # So the first element in list is top of stack
-                    for push_sym in reversed(pushes):
-                        next_stack.append(push_sym)
-
-                next_idx = input_idx + 1 if consumed_char != 'ε' else input_idx
-                
+            symbol = input_string[input_idx] if input_idx < len(input_string) else None
+            for next_st, next_idx, next_stack, consumes in self._expand(node, symbol, stacks):
                 # Cycle check for epsilon transitions
-                state_sig = (next_st, next_idx, tuple(next_stack))
-                if consumed_char == 'ε' and state_sig in visited_states:
+                state_sig = (next_st, next_idx, next_stack)
+                if not consumes and state_sig in visited_states:
+                    pruned += 1
                     continue
                 visited_states.add(state_sig)
                 
-                queue.append((next_st, next_idx, next_stack, new_history))
+                queue.append((next_st, next_idx, next_stack, node))
+                configurations += 1
 
         # Failed
+        tally()
+        stats.hit_limit = bool(queue)
+        recorder.extend(self._path(longest_error_node or node))
+        return {
+            'input': input_string,
+            'accepted': False,
+            'sequence': recorder.result(),
+            'error': 'Input rejected: no valid path reached an accepting state.'
+        }
+
+    def _expand(self, node: tuple, symbol: str | None, stacks: 'StackPool') -> list[tuple]:
+        """The `(next_state, next_idx, next_stack, consumes)` successors of a configuration."""
+        current_state, input_idx, current_stack, _ = node
+        successors = []
+        for pops, next_st, pushed, consumes in self.moves(current_state, symbol, stacks.top(current_stack)):
+            next_stack = stacks.pop(current_stack) if pops else current_stack
+            # Usually multiple pushed symbols are pushed right-to-left
+            # So the first element in list is top of stack
+            for push_sym in pushed:
+                next_stack = stacks.push(next_stack, push_sym)
+            successors.append((next_st, input_idx + 1 if consumes else input_idx, next_stack, consumes))
+        return successors
+
+    def incremental(self) -> 'IncrementalPDA':
+        """A run that re-simulates edited inputs from where they differ from the last one (see `IncrementalPDA`)."""
+        return IncrementalPDA(self)
+
+    def _simulate_linear(self, input_string: str, stacks: 'StackPool', recorder: TraceRecorder, max_steps: int | None,
+                         stats: SearchStats, valid_from: int) -> dict | None:
+        """
+        Queue-free run for deterministic PDAs. It follows the single path the
+        BFS would take, with the same step budget, acceptance checks, ε-cycle
+        check and rejection path, so the result is the same. A `max_steps` of
+        None runs without a budget; only safe without ε-moves, where every
+        step consumes a symbol.
+
+        Returns:
+            The result, or None if a configuration with more than one move was
+            met (the caller then falls back to the BFS).
+        """
+        node = (self.start_state, 0, stacks.push(0, self.initial_stack), None)
+        longest_error_node = None
+        longest_index = 0
+        # Signatures only repeat at the same input position, so the cycle check can forget older positions.
+        visited_states = set()
+        visited_index = 0
+        has_epsilon = self.has_epsilon
+        steps = 0
+        pruned = 0
+
+        def tally():
+            stats.steps += steps
+            stats.configurations += steps
+            stats.peak_frontier = max(stats.peak_frontier, 1)
+            stats.pruned += pruned
+
+        while node is not None and (max_steps is None or steps < max_steps):
+            steps += 1
+            last_node = node
+            current_state, input_idx, current_stack, _ = node
+
+            if (input_idx == len(input_string) and current_state in self.final_states
+                    or self._sink_accepts(current_state, input_idx, valid_from)):
+                tally()
+                self._record_accepted(node, input_string, stacks, recorder)
+                return {
+                    'input': input_string,
+                    'accepted': True,
+                    'sequence': recorder.result(),
+                    'error': None
+                }
+
+            if input_idx > longest_index:
+                longest_index = input_idx
+                longest_error_node = node
+
+            if self.early_exit and current_state in self.dead_states:
+                pruned += 1
+                break
+
+            symbol = input_string[input_idx] if input_idx < len(input_string) else None
+            moves = self.moves(current_state, symbol, stacks.top(current_stack))
+            if len(moves) > 1:
+                tally()
+                return None
+            following = None
+            for pops, next_st, pushed, consumes in moves:
+                next_stack = stacks.pop(current_stack) if pops else current_stack
+                for push_sym in pushed:
+                    next_stack = stacks.push(next_stack, push_sym)
+                next_idx = input_idx + 1 if consumes else input_idx
+                if not has_epsilon:
+                    following = (next_st, next_idx, next_stack, node)
+                    continue
+                if next_idx != visited_index:
+                    visited_states.clear()
+                    visited_index = next_idx
+                state_sig = (next_st, next_idx, next_stack)
+                if not consumes and state_sig in visited_states:
+                    pruned += 1
+                    continue
+                visited_states.add(state_sig)
+                following = (next_st, next_idx, next_stack, node)
+            node = following
+
+        tally()
+        stats.hit_limit = node is not None
+        recorder.extend(self._path(longest_error_node or last_node))
         return {
             'input': input_string,
             'accepted': False,
-            'sequence': longest_error_path or new_history,
+            'sequence': recorder.result(),
             'error': 'Input rejected: no valid path reached an accepting state.'
         }
+
+    def _simulate_gss(self, input_string: str, trace: str | None, stats: SearchStats) -> dict:
+        """
+        Lockstep simulation over a `GraphStack`.
+
+        A configuration is `(state, vertex, position)` and stands for every
+        stack below `vertex`, so identical (state, stack top) pairs are merged
+        instead of branching. Each position first takes the ε-closure of its
+        configurations, then shifts them all over the next symbol. Pops follow
+        every edge below the popped vertex; when an ε-move later adds an edge
+        under a vertex that was already popped at this position, those pops
+        are replayed over the new edge. The work is polynomial in the input
+        length and needs no step cap.
+
+        Every configuration keeps the derivation it was first reached by, and
+        every edge the move that added it, so one concrete path (with real
+        stacks) can be rebuilt for the response. The state of the run is kept
+        in a `GSSRun`.
+        """
+        return GSSRun(self).run(input_string, trace, stats)
+
+    def _gss_result(self, input_string: str, trace: str | None, gss: GraphStack, derivations: dict,
+                    origins: dict, config: tuple, accepted: bool) -> dict:
+        """
+        Rebuilds one concrete path to `config` from the derivations kept by
+        `_simulate_gss` and formats the response.
+
+        Walking back, the concrete stack is a cons list of vertices. A 'step'
+        keeps it, a 'pop' puts the popped vertex back on top, and a 'push'
+        drops the pushed vertices and continues from the move that added the
+        edge the stack actually goes through, so every step is a real move.
+        A path accepted early in a sink is completed to the end of the input;
+        those steps keep the symbols they push above the path.
+        """
+        recorder = TraceRecorder(trace, render=lambda step: self._step_view(input_string, step[0], step[1], gss.to_list(step[2]) + list(step[3])), state_of=lambda step: step[0])
+        steps = []
+        path = gss.first_path(config[1])
+        tail = []
+        if accepted and config[2] < len(input_string) and recorder.mode != 'none':
+            pushed = ()
+            for state, input_idx, push in self._sink_steps(config[0], config[2], input_string):
+                pushed += push
+                tail.append((state, input_idx, path, pushed))
+        # Without a trace the path is not needed.
+        while recorder.mode != 'none':
+            steps.append((config[0], config[2], path, ()))
+            derivation = derivations[config]
+            if derivation is None:
+                break
+            kind, parent, popped = derivation
+            if kind == 'push':
+                for _ in range(gss.depth[path[0]] - 1):
+                    path = path[1]
+                lowest, path = path
+                parent, popped = origins[(lowest, path[0])]
+            if popped:
+                path = (popped, path)
+            config = parent
+        steps.reverse()
+        recorder.extend(steps + tail)
+        return {
+            'input': input_string,
+            'accepted': accepted,
+            'sequence': recorder.result(),
+            'error': None if accepted else 'Input rejected: no valid path reached an accepting state.'
+        }
+
+    @staticmethod
+    def _path(node: tuple) -> list[tuple]:
+        """Follows parent pointers back to the start configuration; returns the nodes in order."""
+        path = []
+        while node is not None:
+            path.append(node)
+            node = node[3]
+        path.reverse()
+        return path
+
+    @staticmethod
+    def _step_view(input_string: str, state: int, input_idx: int, stack: list) -> dict:
+        """Formats one history step for the frontend."""
+        return {
+            'state': state,
+            'stack': stack,
+            'consumed': input_string[:input_idx],
+            'remaining': input_string[input_idx:]
+        }
+
+
+def _invalid_positions(invalid: list, alphabet: set, text: str, shared: int) -> int:
+    """
+    Updates `invalid`, the positions of the symbols of the last input that
+    are not in `alphabet`, for `text`, which shares its first `shared`
+    symbols with it. Returns the position from which every symbol of `text`
+    is in the alphabet.
+    """
+    del invalid[bisect_left(invalid, shared):]
+    invalid.extend(index for index in range(shared, len(text)) if text[index] not in alphabet)
+    return invalid[-1] + 1 if invalid else 0
+
+
+class GSSRun:
+    """
+    The state of `PDA._simulate_gss`, kept between calls to `run`.
+
+    The ε-closure of position p only depends on the first p symbols, and the
+    graph-structured stack, the derivations and the origins only ever grow:
+    everything added after the closure of p is keyed by a later position.
+    Their sizes right after each closure are recorded, so `run` can truncate
+    them back to the last closure the new input shares and go on from there.
+    """
+
+    def __init__(self, pda: PDA):
+        self.pda = pda
+        self.text = ''
+        self.gss = GraphStack()
+        bottom = self.gss.vertex(('initial',), pda.initial_stack, 1)
+        self.gss.add_edge(bottom, 0)
+        self.start = (pda.start_state, bottom, 0)
+        self.derivations = {self.start: None}  # configuration -> ('step' | 'pop' | 'push', parent, popped vertex)
+        self.origins = {}  # (lowest pushed vertex, vertex below) -> (parent, popped vertex)
+        # Per position whose closure was taken: the closure, its first final and first
+        # accepting-sink configurations, and the structure sizes right after it.
+        self.closures = []
+        self.accepting = []
+        self.marks = []
+        self.sinks = []  # positions whose closure holds an accepting sink, increasing
+        self.halt = None  # the position whose shift left no configuration
+        self.invalid = []
+        self.kept = 0
+
+    def run(self, input_string: str, trace: str | None, stats: SearchStats) -> dict:
+        """The result of `PDA._simulate_gss` on `input_string`, taking only the closures it does not share."""
+        pda = self.pda
+        shared = shared_prefix(self.text, input_string)
+        tail_ok = _invalid_positions(self.invalid, pda.input_alphabet, input_string, shared)
+        self.text = input_string
+        if self.closures:
+            self._rollback(min(len(self.closures) - 1, shared), shared)
+        self.kept = len(self.closures)
+
+        counts = [0, 0, 0]  # configurations processed, peak closure, pruned
+        if not self.closures:
+            self._close([self.start], 0, counts)
+        n = len(input_string)
+        while True:
+            position = len(self.closures) - 1
+            # The first position where the lockstep loop accepts: an accepting sink with a
+            # valid tail, or a final state at the end of the input.
+            found = bisect_left(self.sinks, tail_ok)
+            candidates = [self.sinks[found]] if found < len(self.sinks) and self.sinks[found] < n else []
+            if position == n and self.accepting[n][0] is not None:
+                candidates.append(n)
+            if candidates:
+                accept_at = min(candidates)
+                config = self.accepting[accept_at][0 if accept_at == n else 1]
+                break
+            if position == n or self.halt is not None:
+                accept_at = None
+                break
+            frontier = self._shift(position, input_string[position])
+            if not frontier:
+                self.halt = position
+                continue
+            self._close(frontier, position + 1, counts)
+
+        stats.steps += counts[0]
+        stats.configurations += len(self.derivations)
+        stats.peak_frontier = max(stats.peak_frontier, counts[1])
+        stats.pruned += counts[2]
+        if accept_at is None:
+            return pda._gss_result(input_string, trace, self.gss, self.derivations, self.origins, self.closures[-1][0], False)
+        return pda._gss_result(input_string, trace, self.gss, self.derivations, self.origins, config, True)
+
+    def _rollback(self, last: int, shared: int):
+        """Keeps the closures up to `last`, undoing the shift that followed it unless it read a shared symbol."""
+        if self.halt is not None and self.halt < shared:
+            return
+        self.halt = None
+        vertices, derivations, origins = self.marks[last]
+        self.gss.truncate(vertices)
+        while len(self.derivations) > derivations:
+            self.derivations.popitem()
+        while len(self.origins) > origins:
+            self.origins.popitem()
+        del self.closures[last + 1:], self.accepting[last + 1:], self.marks[last + 1:]
+        del self.sinks[bisect_left(self.sinks, last + 1):]
+
+    def _close(self, frontier: list, position: int, counts: list):
+        """Takes the ε-closure of the configurations at `position` and records it."""
+        pda = self.pda
+        gss = self.gss
+        # `listeners` remembers ε-pops per vertex for replay on late edges.
+        closure = list(frontier)
+        listeners = {}
+        late = deque()
+        cursor = 0
+        while cursor < len(closure) or late:
+            if late:
+                vertex, below, (parent, next_st, pushed) = late.popleft()
+                self._apply(parent, next_st, pushed, vertex, below, position, closure, listeners, late)
+                continue
+            config = closure[cursor]
+            cursor += 1
+            state, vertex, _ = config
+            if pda.early_exit and state in pda.dead_states:
+                counts[2] += 1
+                continue
+            for pops, next_st, pushed, consumes in pda.moves(state, None, gss.top(vertex)):
+                if not pops:
+                    self._apply(config, next_st, pushed, None, vertex, position, closure, listeners, late)
+                    continue
+                listeners.setdefault(vertex, []).append((config, next_st, pushed))
+                for below in list(gss.below[vertex]):
+                    self._apply(config, next_st, pushed, vertex, below, position, closure, listeners, late)
+
+        counts[0] += len(closure)
+        counts[1] = max(counts[1], len(closure))
+        first_final = next((config for config in closure if config[0] in pda.final_states), None)
+        first_sink = None
+        if pda.early_exit:
+            first_sink = next((config for config in closure if config[0] in pda.accepting_sinks), None)
+            if first_sink is not None:
+                self.sinks.append(position)
+        self.closures.append(closure)
+        self.accepting.append((first_final, first_sink))
+        self.marks.append((len(gss.symbols), len(self.derivations), len(self.origins)))
+
+    def _shift(self, position: int, symbol: str) -> list:
+        """The configurations of position + 1: the closure of `position` shifted over `symbol`."""
+        pda = self.pda
+        gss = self.gss
+        frontier = []
+        listeners = {}
+        late = deque()
+        for config in self.closures[position]:
+            state, vertex, _ = config
+            if pda.early_exit and state in pda.dead_states:
+                continue
+            for pops, next_st, pushed, consumes in pda.moves(state, symbol, gss.top(vertex)):
+                if not consumes:
+                    continue
+                for below in (list(gss.below[vertex]) if pops else (vertex,)):
+                    self._apply(config, next_st, pushed, vertex if pops else None, below, position + 1, frontier, listeners, late)
+        return frontier
+
+    def _apply(self, parent, next_st, pushed, popped, below, index, added, listeners, late):
+        gss = self.gss
+        derivations = self.derivations
+        if not pushed:
+            config = (next_st, below, index)
+            if config not in derivations:
+                derivations[config] = ('pop' if popped else 'step', parent, popped)
+                added.append(config)
+            return
+        lowest = vertex = gss.vertex((index, next_st, pushed, 1), pushed[0], 1)
+        new_edge = gss.add_edge(lowest, below)
+        for depth in range(1, len(pushed)):
+            upper = gss.vertex((index, next_st, pushed, depth + 1), pushed[depth], depth + 1)
+            gss.add_edge(upper, vertex)
+            vertex = upper
+        if new_edge:
+            self.origins[(lowest, below)] = (parent, popped)
+            late.extend((lowest, below, listener) for listener in listeners.get(lowest, ()))
+        config = (next_st, vertex, index)
+        if config not in derivations:
+            derivations[config] = ('push', parent, None)
+            added.append(config)
+
+    def footprint(self) -> int:
+        """Estimated bytes held by the run."""
+        return 200 * (len(self.gss.symbols) + len(self.derivations) + len(self.origins)) + 100 * len(self.closures) + len(self.text)
+
+
+class IncrementalPDA:
+    """
+    Re-simulates edited inputs with the default 'gss' engine, keeping the
+    state of the last input (see `checkpoint_logic`): the configuration chain
+    of a DPDA without ε-moves (the `_simulate_linear` path), or a `GSSRun`
+    once the chain meets a configuration with more than one move.
+    """
+
+    def __init__(self, pda: PDA):
+        self.pda = pda
+        self.input = ''
+        self.resumed = 0
+        self.lock = threading.Lock()
+        self._stacks = StackPool()
+        self._chain = [(pda.start_state, 0, self._stacks.push(0, pda.initial_stack), None)] if pda.deterministic and not pda.has_epsilon else None
+        self._sinks = []  # chain positions in an accepting sink, with early_exit
+        self._halt = None  # (position, reason) where the chain stops: 'dead', 'stuck' or 'ambiguous'
+        self._invalid = []
+        self._gss = None
+
+    def simulate(self, input_string: str, trace: str | None = None, stats: SearchStats | None = None) -> dict:
+        """The result of `pda.simulate(input_string, trace=trace)`, simulating only what follows the shared prefix."""
+        if stats is None:
+            stats = SearchStats()
+        shared = shared_prefix(self.input, input_string)
+        self.input = input_string
+        result = self._simulate_chain(input_string, trace, shared, stats) if self._chain is not None else None
+        if result is not None:
+            self.resumed = min(shared + 1, len(self._chain))
+            return stats.finish('linear', result)
+        if self._gss is None:
+            self._gss = GSSRun(self.pda)
+        result = self._gss.run(input_string, trace, stats)
+        self.resumed = self._gss.kept
+        return stats.finish('gss', result)
+
+    def _simulate_chain(self, input_string: str, trace: str | None, shared: int, stats: SearchStats) -> dict | None:
+        """
+        `_simulate_linear` over the kept chain: node i only depends on the
+        first i symbols, so the chain is cut after the shared prefix and
+        extended from there.
+
+        Returns:
+            The result, or None where `_simulate_linear` would give up.
+        """
+        pda = self.pda
+        chain = self._chain
+        stacks = self._stacks
+        del chain[shared + 1:]
+        del self._sinks[bisect_left(self._sinks, len(chain)):]
+        if self._halt is not None:
+            # A dead state stops the chain whatever follows; the other reasons depend on the next symbol.
+            position, reason = self._halt
+            if position >= len(chain) or (reason != 'dead' and position >= shared):
+                self._halt = None
+        tail_ok = _invalid_positions(self._invalid, pda.input_alphabet, input_string, shared)
+        n = len(input_string)
+        steps = 0
+        pruned = 0
+
+        def accepting_node():
+            # The first node of the chain where the linear loop accepts.
+            found = bisect_left(self._sinks, tail_ok)
+            candidates = [self._sinks[found]] if found < len(self._sinks) and self._sinks[found] < n else []
+            if len(chain) == n + 1 and chain[n][0] in pda.final_states:
+                candidates.append(n)
+            return min(candidates) if candidates else None
+
+        accept_at = accepting_node()
+        while accept_at is None and self._halt is None and len(chain) <= n:
+            node = chain[-1]
+            state, position, stack, _ = node
+            steps += 1
+            if pda.early_exit and state in pda.dead_states:
+                pruned += 1
+                self._halt = (position, 'dead')
+                break
+            symbol = input_string[position] if position < n else None
+            moves = pda.moves(state, symbol, stacks.top(stack))
+            if len(moves) != 1:
+                self._halt = (position, 'ambiguous' if moves else 'stuck')
+                break
+            pops, next_st, pushed, _ = moves[0]
+            next_stack = stacks.pop(stack) if pops else stack
+            for push_sym in pushed:
+                next_stack = stacks.push(next_stack, push_sym)
+            chain.append((next_st, position + 1, next_stack, node))
+            if pda.early_exit and next_st in pda.accepting_sinks:
+                self._sinks.append(position + 1)
+            accept_at = accepting_node()
+
+        stats.steps += steps
+        stats.configurations += steps
+        stats.peak_frontier = max(stats.peak_frontier, 1)
+        stats.pruned += pruned
+        if accept_at is None and self._halt is not None and self._halt[1] == 'ambiguous':
+            return None
+        recorder = TraceRecorder(trace, render=lambda node: pda._step_view(input_string, node[0], node[1], stacks.to_list(node[2])), state_of=lambda node: node[0])
+        accepted = accept_at is not None
+        if accepted:
+            pda._record_accepted(chain[accept_at], input_string, stacks, recorder)
+        else:
+            recorder.extend(chain)
+        return {
+            'input': input_string,
+            'accepted': accepted,
+            'sequence': recorder.result(),
+            'error': None if accepted else 'Input rejected: no valid path reached an accepting state.'
+        }
+
+    def footprint(self) -> int:
+        """Estimated bytes held by the run."""
+        size = len(self.input) + (200 * len(self._chain) + 100 * len(self._stacks.symbols) if self._chain is not None else 0)
+        return size + (self._gss.footprint() if self._gss is not None else 0)
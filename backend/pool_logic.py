@@ -0,0 +1,266 @@
+"""Process pool for the PDA and CFG searches, with per-call deadlines.
+
+A search can take exponential time on a bad grammar or input, and in a thread
+it holds the GIL until it ends. `SearchPool` runs each search in one of a
+bounded number of worker processes instead. A call that passes its deadline, or
+whose caller gives up (see `client_disconnected`), has its worker killed and
+replaced, so the search really stops and its CPU is freed. Callers wait for a
+free worker up to their own deadline.
+
+Workers keep the machines they were sent, by machine id, so a machine is
+pickled only on its first call to each worker. They also keep the incremental
+runs of edit sessions (see `checkpoint_logic`); a call for a session goes to
+the idle worker that last ran it, when there is one.
+"""
+import multiprocessing
+import os
+import select
+import socket
+import threading
+import time
+
+from checkpoint_logic import CheckpointStore
+from metrics_logic import SearchStats
+
+# Machines a worker keeps; the parent mirrors the same rule to know what each worker holds.
+WORKER_MACHINE_CACHE = 64
+# Incremental runs of edit sessions a worker keeps, and their memory budget.
+WORKER_SESSIONS = 256
+WORKER_SESSION_BYTES = 64 * 1024 * 1024
+
+
+class SearchTimeout(Exception):
+    """The search did not finish before its deadline, or the caller cancelled it."""
+
+    def __init__(self, message: str, cancelled: bool = False):
+        super().__init__(message)
+        self.cancelled = cancelled
+
+
+def _simulate(machine, input_string: str, trace) -> tuple[dict, SearchStats]:
+    stats = SearchStats()
+    return machine.simulate(input_string, trace=trace, stats=stats), stats
+
+
+def _worker_main(connection):
+    """
+    Worker loop: receives `(machine id, machine or None, input, trace, session or None)`
+    and sends back `('ok', (result, stats))` or `('error', exception)`.
+    """
+    machines = {}
+    sessions = CheckpointStore(max_entries=WORKER_SESSIONS, max_bytes=WORKER_SESSION_BYTES)
+    while True:
+        try:
+            machine_id, machine, input_string, trace, session = connection.recv()
+        except EOFError:
+            return
+        if machine is not None:
+            if len(machines) >= WORKER_MACHINE_CACHE:
+                machines.clear()
+            machines[machine_id] = machine
+        try:
+            if session is None:
+                reply = ('ok', _simulate(machines[machine_id], input_string, trace))
+            else:
+                stats = SearchStats()
+                reply = ('ok', (sessions.simulate(session, machine_id, machines[machine_id], input_string, trace, stats), stats))
+        except Exception as e:
+            reply = ('error', e)
+        connection.send(reply)
+
+
+class _Worker:
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.known = set()
+        self.sessions = set()
+
+    def send(self, machine_id: str, machine, input_string: str, trace, session: str | None):
+        if machine_id in self.known:
+            machine = None
+        else:
+            if len(self.known) >= WORKER_MACHINE_CACHE:
+                self.known.clear()
+            self.known.add(machine_id)
+        if session is not None:
+            # Only a hint for `SearchPool._acquire`: the worker may have evicted the run since.
+            if len(self.sessions) >= WORKER_SESSIONS:
+                self.sessions.clear()
+            self.sessions.add((session, machine_id))
+        self.connection.send((machine_id, machine, input_string, trace, session))
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class SearchPool:
+    """
+    A bounded set of worker processes that run `simulate` calls with deadlines.
+    Thread-safe; workers are started on first use (or by `start`).
+    """
+
+    def __init__(self, workers: int | None = None, start_method: str = 'spawn', poll_interval: float = 0.05):
+        """Creates the pool without starting any process.
+
+        Args:
+            workers: The most searches run at once (default: CPU count).
+            start_method: The `multiprocessing` start method of the workers.
+                'spawn' does not copy the threads and locks of the server.
+            poll_interval: Seconds between checks of the caller's `cancelled`
+                callback while a search runs.
+        """
+        self.size = workers or os.cpu_count() or 1
+        self.poll_interval = poll_interval
+        self._context = multiprocessing.get_context(start_method)
+        self._idle = []
+        self._started = 0
+        self._condition = threading.Condition()
+        self._pid = os.getpid()
+        self.timeouts = 0
+        self.cancellations = 0
+
+    def start(self):
+        """Starts every worker now, so no call pays for a process start. Call it in the serving process, after any fork."""
+        while True:
+            with self._condition:
+                self._check_fork()
+                if self._started >= self.size:
+                    return
+                self._started += 1
+            try:
+                worker = _Worker(self._context)
+            except BaseException:
+                self._release(None)
+                raise
+            self._release(worker)
+
+    def _check_fork(self):
+        # A forked copy of the pool must not share the parent's pipes: it starts its own workers.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle = []
+            self._started = 0
+
+    def _acquire(self, deadline: float, session=None):
+        with self._condition:
+            self._check_fork()
+            while True:
+                if self._idle:
+                    for index, worker in enumerate(self._idle):
+                        if session in worker.sessions:
+                            return self._idle.pop(index)
+                    return self._idle.pop()
+                if self._started < self.size:
+                    self._started += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._condition.wait(remaining):
+                    return None
+        try:
+            return _Worker(self._context)
+        except BaseException:
+            self._release(None)
+            raise
+
+    def _release(self, worker):
+        with self._condition:
+            if worker is None:
+                self._started -= 1
+            else:
+                self._idle.append(worker)
+            self._condition.notify()
+
+    def simulate(self, machine_id: str, machine, input_string: str, trace=None, timeout: float = 10.0,
+                 cancelled=None, session: str | None = None) -> tuple[dict, SearchStats]:
+        """
+        Runs `machine.simulate(input_string, trace=trace)` in a worker.
+
+        Args:
+            machine_id: Identifies `machine` in the workers' caches; a different
+                machine must never reuse an id.
+            machine: A picklable DFA, PDA or CFG.
+            input_string: The simulated input.
+            trace: The trace option (see `trace_logic`).
+            timeout: Seconds before the call is abandoned, waiting for a free
+                worker included.
+            cancelled: Optional callback; the search is abandoned as soon as it
+                returns True.
+            session: Optional edit session: the worker resumes the session's
+                incremental run of the machine instead of simulating from scratch.
+
+        Returns:
+            The result and the search-effort counters of the run.
+
+        Raises:
+            SearchTimeout: The deadline passed or the call was cancelled; the
+                worker that ran it was killed and will be replaced.
+            Exception: Whatever `simulate` raised in the worker.
+        """
+        deadline = time.monotonic() + timeout
+        worker = self._acquire(deadline, None if session is None else (session, machine_id))
+        if worker is None:
+            self.timeouts += 1
+            raise SearchTimeout(f'No search worker became free within {timeout:g} s.')
+        try:
+            worker.send(machine_id, machine, input_string, trace, session)
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise SearchTimeout(f'Simulation did not finish within {timeout:g} s.')
+                if worker.connection.poll(min(remaining, self.poll_interval)):
+                    try:
+                        status, value = worker.connection.recv()
+                    except (EOFError, OSError):
+                        worker.process.join(1)
+                        raise RuntimeError(f'The search worker exited unexpectedly (exit code {worker.process.exitcode}).') from None
+                    break
+                if cancelled is not None and cancelled():
+                    self.cancellations += 1
+                    raise SearchTimeout('Simulation cancelled: the client went away.', cancelled=True)
+        except BaseException:
+            worker.kill()
+            self._release(None)
+            raise
+        self._release(worker)
+        if status == 'error':
+            raise value
+        return value
+
+    def close(self):
+        """Stops the idle workers; calls still running keep theirs until they end."""
+        with self._condition:
+            workers, self._idle = self._idle, []
+            self._started -= len(workers)
+        for worker in workers:
+            worker.kill()
+
+    def stats(self) -> dict:
+        with self._condition:
+            return {'workers': self.size, 'started': self._started, 'idle': len(self._idle),
+                    'timeouts': self.timeouts, 'cancellations': self.cancellations}
+
+
+def client_disconnected(environ: dict) -> bool:
+    """
+    Best-effort check that the client of a WSGI request closed its connection.
+    Works with servers that expose the socket (werkzeug's 'werkzeug.socket',
+    gunicorn's 'gunicorn.socket'); always False otherwise.
+    """
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if sock is None:
+        return False
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        # Readable with nothing to read is an orderly shutdown; pipelined data means it is still there.
+        return bool(readable) and sock.recv(1, socket.MSG_PEEK) == b''
+    except OSError:
+        return True
+    except ValueError:  # e.g. TLS sockets, which cannot peek
+        return False
@@ -0,0 +1,351 @@
+"""Regular expressions, compiled to a `DFA` or run by a lazily built one.
+
+The syntax is the one of the regexes the CLI menu of `dfa_logic` prints, e.g.
+`(aa + bb + aba + ba) (aba + bab + bbb) (a + b)*`:
+
+- a symbol is any single character other than `(`, `)`, `+`, `*` and spaces;
+- `ε` matches the empty string;
+- `r + s` is union, `rs` (or `r s`) concatenation and `r*` the Kleene star,
+  binding loosest to tightest in that order; parentheses group.
+
+A pattern is turned into its position (Glushkov) automaton: one NFA state per
+symbol occurrence, no ε-moves. Sets of positions are bitmasks, so a subset
+step is a few integer ORs and ANDs.
+
+`compile_regex` determinizes the whole automaton up front, which can take a
+number of states exponential in the pattern size. `LazyDFA` only builds the
+states an input visits, in a cache of fixed size that is flushed when it
+fills up (as RE2 does), so big patterns run in bounded memory.
+"""
+import threading
+
+from dfa_logic import DFA, REJECT_MARKERS, STATUS_INVALID_SYMBOL, STATUS_OK, STATUS_TRAP_STATE
+
+EPSILON = 'ε'
+
+
+def parse_regex(pattern: str):
+    """
+    Parses a pattern into a tree of tuples: `('symbol', c)`, `('empty',)`,
+    `('concat', [items])`, `('union', [items])` and `('star', item)`.
+
+    Raises:
+        ValueError: The pattern is not well formed.
+    """
+    tokens = [char for char in pattern if not char.isspace()]
+    position = 0
+
+    def union():
+        nonlocal position
+        items = [concat()]
+        while position < len(tokens) and tokens[position] == '+':
+            position += 1
+            items.append(concat())
+        return items[0] if len(items) == 1 else ('union', items)
+
+    def concat():
+        nonlocal position
+        items = []
+        while position < len(tokens) and tokens[position] not in ')+':
+            token = tokens[position]
+            position += 1
+            if token == '*':
+                raise ValueError(f'Invalid regex "{pattern}": "*" must follow a symbol or a group.')
+            if token == '(':
+                item = union()
+                if position >= len(tokens) or tokens[position] != ')':
+                    raise ValueError(f'Invalid regex "{pattern}": unbalanced "(".')
+                position += 1
+            else:
+                item = ('empty',) if token == EPSILON else ('symbol', token)
+            while position < len(tokens) and tokens[position] == '*':
+                position += 1
+                item = ('star', item)
+            items.append(item)
+        if not items:
+            raise ValueError(f'Invalid regex "{pattern}": empty operand at position {position}.')
+        return items[0] if len(items) == 1 else ('concat', items)
+
+    try:
+        tree = union()
+    except RecursionError:
+        raise ValueError('Invalid regex: groups nested too deeply.') from None
+    if position < len(tokens):
+        raise ValueError(f'Invalid regex "{pattern}": unbalanced ")".')
+    return tree
+
+
+class PositionAutomaton:
+    """
+    The Glushkov automaton of a pattern. Position 0 is the start; positions
+    1..n are the symbol occurrences, and a set of positions is a bitmask.
+
+    Attributes:
+        symbols: The symbols of the alphabet, in column order.
+        columns: Symbol -> column.
+        start: The mask of the start set.
+        accepting: The mask of the positions a match may end on.
+        follow: `follow[p]` is the mask of the positions that may come right after position p.
+        occurrences: `occurrences[column]` is the mask of the positions of that symbol.
+    """
+
+    def __init__(self, pattern: str, alphabet=None):
+        """
+        Args:
+            pattern: The regex.
+            alphabet: The input alphabet; defaults to the symbols of the pattern.
+
+        Raises:
+            ValueError: The pattern is not well formed or uses a symbol outside `alphabet`.
+        """
+        tree = parse_regex(pattern)
+        labels = [None]
+        follow = [0]
+
+        def walk(node):
+            # Returns (nullable, first mask, last mask) and fills in `follow`.
+            kind = node[0]
+            if kind == 'symbol':
+                labels.append(node[1])
+                follow.append(0)
+                bit = 1 << (len(labels) - 1)
+                return False, bit, bit
+            if kind == 'empty':
+                return True, 0, 0
+            if kind == 'star':
+                _, first, last = walk(node[1])
+                link(last, first)
+                return True, first, last
+            if kind == 'union':
+                nullable, first, last = False, 0, 0
+                for item in node[1]:
+                    item_nullable, item_first, item_last = walk(item)
+                    nullable, first, last = nullable or item_nullable, first | item_first, last | item_last
+                return nullable, first, last
+            nullable, first, last = True, 0, 0
+            for item in node[1]:
+                item_nullable, item_first, item_last = walk(item)
+                link(last, item_first)
+                if nullable:
+                    first |= item_first
+                last = last | item_last if item_nullable else item_last
+                nullable = nullable and item_nullable
+            return nullable, first, last
+
+        def link(sources, targets):
+            while sources:
+                low = sources & -sources
+                follow[low.bit_length() - 1] |= targets
+                sources ^= low
+
+        try:
+            nullable, first, last = walk(tree)
+        except RecursionError:
+            raise ValueError('Invalid regex: groups nested too deeply.') from None
+        follow[0] = first
+
+        used = set(labels[1:])
+        if alphabet is None:
+            alphabet = used
+        elif not used.issubset(alphabet):
+            raise ValueError(f'The regex uses symbols outside the alphabet: {sorted(used - set(alphabet))}.')
+        self.pattern = pattern
+        self.symbols = sorted(alphabet)
+        self.columns = {symbol: column for column, symbol in enumerate(self.symbols)}
+        self.width = len(self.symbols)
+        self.start = 1
+        self.accepting = last | (1 if nullable else 0)
+        self.follow = follow
+        self.occurrences = [0] * self.width
+        for position, label in enumerate(labels[1:], start=1):
+            self.occurrences[self.columns[label]] |= 1 << position
+
+    def reach(self, mask: int) -> int:
+        """The positions that may follow any position of `mask`."""
+        follow = self.follow
+        reached = 0
+        while mask:
+            low = mask & -mask
+            reached |= follow[low.bit_length() - 1]
+            mask ^= low
+        return reached
+
+    def __len__(self):
+        """The number of positions, start included."""
+        return len(self.follow)
+
+
+def compile_regex(pattern: str, alphabet=None, max_states: int = 4096) -> DFA:
+    """
+    Compiles a regex into a `DFA` by subset construction over its position
+    automaton. States are numbered in breadth-first order from the start
+    state 0; the empty set, if it is reached, becomes the only trap state.
+
+    Args:
+        pattern: The regex, see the module docstring.
+        alphabet: The input alphabet; defaults to the symbols of the pattern.
+        max_states: The most DFA states built before giving up.
+
+    Raises:
+        ValueError: The pattern is not well formed, or its DFA has more than
+            `max_states` states (run it with `LazyDFA` instead).
+    """
+    automaton = PositionAutomaton(pattern, alphabet)
+    numbering = {automaton.start: 0}
+    order = [automaton.start]
+    transitions = {}
+    for mask in order:
+        reached = automaton.reach(mask)
+        paths = transitions[numbering[mask]] = {}
+        for symbol, occurrences in zip(automaton.symbols, automaton.occurrences):
+            target = reached & occurrences
+            if target not in numbering:
+                if len(order) >= max_states:
+                    raise ValueError(f'The regex needs more than {max_states} DFA states; run it lazily instead.')
+                numbering[target] = len(order)
+                order.append(target)
+            paths[symbol] = numbering[target]
+    return DFA(
+        states=set(range(len(order))),
+        alphabet=set(automaton.symbols),
+        transitions=transitions,
+        start_state=0,
+        final_states={numbering[mask] for mask in order if mask & automaton.accepting},
+        trap_states={numbering[0]} if 0 in numbering else set()
+    )
+
+
+def regex_definition(pattern: str, alphabet=None, max_states: int = 4096) -> dict:
+    """The compiled DFA of a regex in the JSON shape of the frontend presets (see `registry_logic`)."""
+    dfa = compile_regex(pattern, alphabet, max_states)
+    return {
+        'states': [{'id': state} for state in sorted(dfa.states)],
+        'alphabet': sorted(dfa.alphabet),
+        'transitions': {str(state): paths for state, paths in dfa.transitions.items()},
+        'startState': dfa.start_state,
+        'acceptingStates': sorted(dfa.final_states),
+        'trapStates': sorted(dfa.trap_states)
+    }
+
+
+class LazyDFA:
+    """
+    Runs a regex on a DFA that is determinized only as inputs need it.
+
+    DFA states (sets of positions) and their transitions are built on the
+    first step that reaches them and kept in a cache of at most `cache_size`
+    states. When it is full, the whole cache is dropped and the run goes on
+    from its current state, so memory stays bounded however large the full
+    DFA would be; `flushes` counts how often that happened.
+
+    Thread-safe: matches on one instance take turns.
+    """
+
+    def __init__(self, pattern: str, alphabet=None, cache_size: int = 1024):
+        """
+        Args:
+            pattern: The regex, see the module docstring.
+            alphabet: The input alphabet; defaults to the symbols of the pattern.
+            cache_size: The most DFA states kept at once (at least 2).
+
+        Raises:
+            ValueError: The pattern is not well formed, or `cache_size` is below 2.
+        """
+        if cache_size < 2:
+            raise ValueError('A lazy DFA needs room for at least two states.')
+        self.automaton = PositionAutomaton(pattern, alphabet)
+        self.cache_size = cache_size
+        self.flushes = 0
+        self._lock = threading.Lock()
+        self._stride = max(self.automaton.width, 1)
+        self._clear()
+
+    def _clear(self):
+        self._ids = {}  # mask -> pre-multiplied state offset
+        self._masks = []
+        self._accept = []
+        # `_next[offset + column]` is the offset of the next state, -1 until built; -2 for the empty set.
+        self._next = []
+
+    def _state(self, mask: int) -> int:
+        """The offset of the cached state of `mask`, added (after a flush if the cache is full) if needed."""
+        offset = self._ids.get(mask)
+        if offset is None:
+            if len(self._masks) >= self.cache_size:
+                self._clear()
+                self.flushes += 1
+            offset = self._ids[mask] = len(self._masks) * self._stride
+            self._masks.append(mask)
+            self._accept.append(bool(mask & self.automaton.accepting))
+            self._next.extend([-1] * self._stride)
+        return offset
+
+    def _expand(self, offset: int, column: int) -> int:
+        automaton = self.automaton
+        target = automaton.reach(self._masks[offset // self._stride]) & automaton.occurrences[column]
+        if not target:
+            self._next[offset + column] = -2
+            return -2
+        flushes = self.flushes
+        following = self._state(target)
+        # After a flush `offset` names another state (or none): the step is not recorded.
+        if flushes == self.flushes:
+            self._next[offset + column] = following
+        return following
+
+    def match(self, input_string: str) -> dict:
+        """
+        Runs the regex on the input.
+
+        Args:
+            input_string: User input string to process.
+
+        Returns:
+            A dict with the 'input', whether it was 'accepted', the symbols
+            read as 'length' (the position of the rejecting symbol, if any),
+            the reject marker of `DFA.simulate` as 'rejection' (an invalid
+            symbol, or a prefix no match can start with as the trap state)
+            and its message as 'error'.
+        """
+        with self._lock:
+            columns = self.automaton.columns
+            current = self._state(self.automaton.start)
+            status = STATUS_OK
+            position = 0
+            for position, symbol in enumerate(input_string):
+                column = columns.get(symbol)
+                if column is None:
+                    status = STATUS_INVALID_SYMBOL
+                    break
+                following = self._next[current + column]
+                if following == -1:
+                    following = self._expand(current, column)
+                if following == -2:
+                    status = STATUS_TRAP_STATE
+                    break
+                current = following
+            else:
+                position = len(input_string)
+            accepted = status == STATUS_OK and self._accept[current // self._stride]
+        error = None
+        if status == STATUS_INVALID_SYMBOL:
+            error = f'Simulation Error: Symbol "{input_string[position]}" not in alphabet {set(self.automaton.symbols)}.'
+        elif status == STATUS_TRAP_STATE:
+            error = f'Simulation Error: No match of the regex starts with "{input_string[:position + 1]}".'
+        return {
+            'input': input_string,
+            'accepted': accepted,
+            'length': position,
+            'rejection': REJECT_MARKERS[status],
+            'error': error
+        }
+
+    def accepts(self, input_string: str) -> bool:
+        """Whether the regex matches the whole input."""
+        return self.match(input_string)['accepted']
+
+    def stats(self) -> dict:
+        """The number of cached states, the cache size and the number of flushes."""
+        with self._lock:
+            return {'states': len(self._masks), 'cache_size': self.cache_size, 'flushes': self.flushes,
+                    'positions': len(self.automaton)}
@@ -0,0 +1,315 @@
+"""Registry of client-defined machines, addressed by the hash of their definition.
+
+Definitions use the JSON shapes of the frontend presets (see
+`dfa-tscompiler/src/lib/automata/types.ts`):
+
+- dfa: `{states: [{id}], alphabet, transitions: {state: {symbol: state}},
+  startState, acceptingStates, trapStates?}` with integer state ids, or
+  `{regex, alphabet?}` for the DFA `regex_logic.compile_regex` builds
+- cfg: `{variables, terminals, rules: [{from, to}], startSymbol}`
+- pda: `{states: [{id}], inputAlphabet, stackAlphabet,
+  transitions: [{from, input, stackTop, to, push}], startState,
+  initialStackSymbol, acceptingStates}`
+
+A definition is validated once, when it is registered. Its id is the SHA-256
+of the kind and the canonical JSON of the fields that define the machine, so
+names, layouts and key order do not matter and registering the same machine
+twice returns the same id. The built machines are kept in an LRU bounded by an
+estimate of their memory footprint; the canonical definitions are kept apart,
+so an evicted machine is rebuilt on its next use without being re-sent.
+
+A registry lives in one process. A server with several processes (gunicorn
+workers, serverless instances) has one registry per process, and an id is
+only known to the processes that registered it.
+
+`LazyMachine` defers building a machine (e.g. a built-in one of the app) to its
+first use.
+"""
+import hashlib
+import json
+import threading
+
+from cache_logic import ResultCache
+from cfg_logic import CFG
+from dfa_logic import DFA
+from pda_logic import PDA
+from regex_logic import regex_definition
+
+MACHINE_KINDS = ('dfa', 'cfg', 'pda')
+
+# Rough bytes of Python objects per byte of canonical JSON, for the footprint estimate of a built machine.
+FOOTPRINT_FACTOR = 16
+
+
+def numeric_key(value):
+    """JSON object keys are strings; a state id written as an integer is turned back into one."""
+    if isinstance(value, str) and value.lstrip('-').isdigit():
+        return int(value)
+    return value
+
+
+def _set(values) -> list:
+    """A JSON list used as a set, in a canonical order."""
+    return sorted(set(values), key=lambda value: (type(value).__name__, value))
+
+
+def canonical_definition(kind: str, definition: dict) -> dict:
+    """
+    Keeps only the fields of `definition` that define the machine, with sets
+    sorted. Rule and transition lists keep their order, which decides the
+    order the simulators try them in. A dfa given by a regex is compiled
+    first, so it gets the id of its DFA.
+
+    Raises:
+        ValueError: Unknown kind, a missing or malformed field, or a dfa state id that is not an integer.
+    """
+    if kind not in MACHINE_KINDS:
+        raise ValueError(f'Unknown machine kind "{kind}": must be one of {", ".join(MACHINE_KINDS)}.')
+    if not isinstance(definition, dict):
+        raise ValueError(f'A {kind} definition must be a JSON object.')
+    try:
+        if kind == 'dfa' and 'regex' in definition:
+            if not isinstance(definition['regex'], str):
+                raise ValueError('The regex of a dfa definition must be a string.')
+            definition = regex_definition(definition['regex'], definition.get('alphabet'))
+        if kind == 'dfa':
+            for state in definition['states']:
+                # The compiled tables of a DFA are indexed by state id.
+                if not isinstance(state['id'], int) or isinstance(state['id'], bool):
+                    raise ValueError(f'The state ids of a dfa definition must be integers, got {state["id"]!r}.')
+            return {
+                'states': [{'id': state} for state in _set(state['id'] for state in definition['states'])],
+                'alphabet': _set(definition['alphabet']),
+                'transitions': {str(source): dict(sorted(paths.items())) for source, paths in sorted(definition['transitions'].items(), key=lambda item: str(item[0]))},
+                'startState': definition['startState'],
+                'acceptingStates': _set(definition['acceptingStates']),
+                'trapStates': _set(definition.get('trapStates') or [])
+            }
+        if kind == 'cfg':
+            return {
+                'variables': _set(definition['variables']),
+                'terminals': _set(definition['terminals']),
+                'rules': [{'from': rule['from'], 'to': list(rule['to'])} for rule in definition['rules']],
+                'startSymbol': definition['startSymbol']
+            }
+        return {
+            'states': [{'id': state} for state in _set(state['id'] for state in definition['states'])],
+            'inputAlphabet': _set(definition['inputAlphabet']),
+            'stackAlphabet': _set(definition['stackAlphabet']),
+            'transitions': [{'from': transition['from'], 'input': transition['input'], 'stackTop': transition['stackTop'],
+                             'to': transition['to'], 'push': list(transition['push'])} for transition in definition['transitions']],
+            'startState': definition['startState'],
+            'initialStackSymbol': definition['initialStackSymbol'],
+            'acceptingStates': _set(definition['acceptingStates'])
+        }
+    except KeyError as e:
+        raise ValueError(f'The {kind} definition is missing the field {e}.') from None
+    except (TypeError, AttributeError) as e:
+        raise ValueError(f'Malformed {kind} definition: {e}.') from None
+
+
+def machine_hash(kind: str, canonical: dict) -> str:
+    """The id of a canonical definition: hex SHA-256 of its kind and compact, key-sorted JSON."""
+    encoded = json.dumps([kind, canonical], sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def make_dfa(definition: dict) -> DFA:
+    """Builds (and validates) a DFA from its JSON definition."""
+    transitions = {}
+    for source, paths in definition['transitions'].items():
+        transitions[numeric_key(source)] = {symbol: target for symbol, target in paths.items()}
+    return DFA(
+        states=set(state['id'] for state in definition['states']),
+        alphabet=set(definition['alphabet']),
+        transitions=transitions,
+        start_state=definition['startState'],
+        final_states=set(definition['acceptingStates']),
+        trap_states=set(definition.get('trapStates') or [])
+    )
+
+
+def make_cfg(definition: dict, early_exit: bool = False) -> CFG:
+    """Builds a CFG from its JSON definition, checking that every rule uses declared symbols."""
+    variables = set(definition['variables'])
+    terminals = set(definition['terminals'])
+    if definition['startSymbol'] not in variables:
+        raise ValueError(f'Start symbol "{definition["startSymbol"]}" is not one of the variables.')
+    for rule in definition['rules']:
+        if rule['from'] not in variables:
+            raise ValueError(f'Rule for an unknown variable: "{rule["from"]}".')
+        for symbol in rule['to']:
+            if symbol != 'ε' and symbol not in variables and symbol not in terminals:
+                raise ValueError(f'Rule for "{rule["from"]}" uses an unknown symbol: "{symbol}".')
+    return CFG(
+        variables=variables,
+        terminals=terminals,
+        rules=[{'from': rule['from'], 'to': list(rule['to'])} for rule in definition['rules']],
+        start_symbol=definition['startSymbol'],
+        early_exit=early_exit
+    )
+
+
+def make_pda(definition: dict, early_exit: bool = False) -> PDA:
+    """Builds a PDA from its JSON definition, checking that every transition uses declared states and symbols."""
+    states = set(state['id'] for state in definition['states'])
+    input_alphabet = set(definition['inputAlphabet'])
+    stack_alphabet = set(definition['stackAlphabet'])
+    if definition['startState'] not in states:
+        raise ValueError(f'Start state "{definition["startState"]}" is not in the set of states.')
+    if not set(definition['acceptingStates']).issubset(states):
+        raise ValueError('Final states must be a subset of the defined states.')
+    if definition['initialStackSymbol'] not in stack_alphabet:
+        raise ValueError(f'Initial stack symbol "{definition["initialStackSymbol"]}" is not in the stack alphabet.')
+    transitions = {}
+    for transition in definition['transitions']:
+        if transition['from'] not in states or transition['to'] not in states:
+            raise ValueError(f'Transition between unknown states: {transition["from"]} -> {transition["to"]}.')
+        if transition['input'] != 'ε' and transition['input'] not in input_alphabet:
+            raise ValueError(f'Transition from {transition["from"]} reads an unknown symbol: "{transition["input"]}".')
+        for symbol in [transition['stackTop'], *transition['push']]:
+            if symbol != 'ε' and symbol not in stack_alphabet:
+                raise ValueError(f'Transition from {transition["from"]} uses an unknown stack symbol: "{symbol}".')
+        transitions.setdefault(transition['from'], {})
+        transitions[transition['from']].setdefault(transition['input'], {})
+        transitions[transition['from']][transition['input']].setdefault(transition['stackTop'], [])
+        transitions[transition['from']][transition['input']][transition['stackTop']].append((transition['to'], list(transition['push'])))
+    return PDA(
+        states=states,
+        input_alphabet=input_alphabet,
+        stack_alphabet=stack_alphabet,
+        transitions=transitions,
+        start_state=definition['startState'],
+        initial_stack=definition['initialStackSymbol'],
+        final_states=set(definition['acceptingStates']),
+        early_exit=early_exit
+    )
+
+
+class MachineRegistry:
+    """
+    Maps machine ids to built machines. Thread-safe: both stores are
+    `ResultCache`s; two threads that rebuild the same evicted machine at once
+    both build it and the last one is kept.
+    """
+
+    def __init__(self, max_machines: int = 256, max_bytes: int = 256 * 1024 * 1024,
+                 max_definitions: int = 65536, max_definition_bytes: int = 256 * 1024 * 1024,
+                 early_exit: bool = False):
+        """Creates an empty registry.
+
+        Args:
+            max_machines: The most built machines kept at once.
+            max_bytes: The memory budget of the built machines, by the estimate of `footprint`.
+            max_definitions: The most definitions kept. Once it is reached the
+                least recently used ones are forgotten and their ids become unknown.
+            max_definition_bytes: The most canonical JSON bytes kept.
+            early_exit: Passed to the CFGs and PDAs that are built.
+        """
+        self.early_exit = early_exit
+        self._definitions = ResultCache(max_entries=max_definitions, max_bytes=max_definition_bytes,
+                                        sizeof=lambda entry: len(entry[1]))
+        self._machines = ResultCache(max_entries=max_machines, max_bytes=max_bytes, sizeof=lambda entry: entry[1])
+
+    def register(self, kind: str, definition: dict) -> tuple[str, bool]:
+        """
+        Validates and builds a machine, and stores it under its content hash.
+
+        Returns:
+            A `(machine id, new)` tuple; `new` is False if the machine was already registered.
+
+        Raises:
+            ValueError: Unknown kind, malformed definition, or a machine that fails validation.
+        """
+        canonical = canonical_definition(kind, definition)
+        machine_id = machine_hash(kind, canonical)
+        if self._definitions.get(machine_id) is not None:
+            return machine_id, False
+        encoded = json.dumps(canonical, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        machine = self._build(kind, canonical)
+        if not self._definitions.put(machine_id, (kind, encoded)):
+            raise ValueError(f'The {kind} definition is too large to register ({len(encoded)} bytes).')
+        self._machines.put(machine_id, ((kind, machine), self.footprint(machine, encoded)))
+        return machine_id, True
+
+    def get(self, machine_id: str) -> tuple[str, object]:
+        """
+        The kind and built machine registered under `machine_id`, rebuilt from
+        its stored definition if it was evicted.
+
+        Raises:
+            KeyError: No machine is registered under `machine_id`.
+        """
+        entry = self._machines.get(machine_id)
+        if entry is not None:
+            return entry[0]
+        stored = self._definitions.get(machine_id)
+        if stored is None:
+            raise KeyError(machine_id)
+        kind, encoded = stored
+        machine = self._build(kind, json.loads(encoded))
+        self._machines.put(machine_id, ((kind, machine), self.footprint(machine, encoded)))
+        return kind, machine
+
+    def __contains__(self, machine_id: str) -> bool:
+        return self._definitions.get(machine_id) is not None
+
+    def _build(self, kind: str, canonical: dict):
+        try:
+            if kind == 'dfa':
+                machine = make_dfa(canonical)
+                machine.compile()
+                return machine
+            if kind == 'cfg':
+                return make_cfg(canonical, early_exit=self.early_exit)
+            return make_pda(canonical, early_exit=self.early_exit)
+        except (KeyError, TypeError) as e:
+            raise ValueError(f'Invalid {kind} definition: {e}.') from None
+
+    @staticmethod
+    def footprint(machine, encoded: bytes) -> int:
+        """
+        Estimated bytes held by a built machine: a multiple of its canonical
+        JSON size, plus the transition tables of a compiled DFA.
+        """
+        size = FOOTPRINT_FACTOR * len(encoded)
+        if isinstance(machine, DFA):
+            compiled = machine.compile()
+            size += len(compiled.table) * compiled.table.itemsize + 3 * len(compiled.state_ids)
+        return size
+
+    def stats(self) -> dict:
+        """The statistics of the machine LRU, with the number of known definitions."""
+        stats = self._machines.stats()
+        stats['definitions'] = len(self._definitions)
+        return stats
+
+
+class LazyMachine:
+    """
+    A machine built on first use. Building is done once: threads that ask
+    while it is being built wait for it instead of building their own.
+    """
+
+    def __init__(self, build):
+        """
+        Args:
+            build: Called without arguments, once, to build the machine.
+        """
+        self._build = build
+        self._machine = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The machine, built now if this is the first use."""
+        machine = self._machine
+        if machine is None:
+            with self._lock:
+                if self._machine is None:
+                    self._machine = self._build()
+                machine = self._machine
+        return machine
+
+    @property
+    def built(self) -> bool:
+        return self._machine is not None
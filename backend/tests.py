@@ -1,4 +1,6 @@
-from app import bets_dfa, stars_dfa 
+from app import app, bets_dfa, stars_dfa, bets_cfg, bets_pda, stars_pda 
+from dfa_logic import minimized_classes
+from itertools import product
 import unittest
 
 
@@ -27,10 +29,10 @@ class TestDFAs(unittest.TestCase):
                 ("1111111", False),        
             ]
 
-    for input_string, expected in test_cases_stars:
-        with self.subTest(input_string=input_string, expected=expected):
-            result = stars_dfa.simulate(input_string)
-            self.assertEqual(result['accepted'], expected, f"Input: {input_string}, Output: {result}, Expected: {expected}")
+            for input_string, expected in test_cases_stars:
+                with self.subTest(input_string=input_string, expected=expected):
+                    result = stars_dfa.simulate(input_string)
+                    self.assertEqual(result['accepted'], expected, f"Input: {input_string}, Output: {result}, Expected: {expected}")
 
     def test_bets_dfa(self):
         # (aa + bb + aba + ba) (aba + bab + bbb) (a + b)* (a + b + aa + abab) (aa + bb)*
@@ -63,5 +65,1183 @@ class TestDFAs(unittest.TestCase):
                 result = bets_dfa.simulate(input_string)
                 self.assertEqual(result['accepted'], expected, f"Input: {input_string}, Output: {result}, Expected: {expected}")
 
+
+class TestCompiledDFA(unittest.TestCase):
+
+    def test_accepts_matches_simulate(self):
+        for dfa in (bets_dfa, stars_dfa):
+            symbols = sorted(dfa.alphabet) + ['x']
+            for length in range(8):
+                for letters in product(symbols, repeat=length):
+                    word = ''.join(letters)
+                    with self.subTest(word=word):
+                        self.assertEqual(dfa.accepts(word), dfa.simulate(word)['accepted'])
+
+    def test_simulate_rejection_traces(self):
+        result = bets_dfa.simulate('aab')
+        self.assertEqual(result['state_sequence'], [0, 2, 3, 6])
+        result = bets_dfa.simulate('abb')
+        self.assertEqual(result['state_sequence'], [0, 2, 4, 7, 'REJECT_STATE_TRAP_STATE'])
+        self.assertEqual(result['final_state'], 7)
+        result = stars_dfa.simulate('10x1')
+        self.assertEqual(result['state_sequence'], [0, 2, 5, 'REJECT_STATE_INVALID_SYMBOL'])
+        self.assertEqual(result['final_state'], 5)
+
+    def test_compiled_table(self):
+        compiled = bets_dfa.compile()
+        self.assertIs(compiled, bets_dfa.compile())
+        self.assertEqual(len(compiled.table), len(bets_dfa.states) * len(bets_dfa.alphabet))
+        for state, paths in bets_dfa.transitions.items():
+            for symbol, target in paths.items():
+                row = compiled.state_index[state]
+                self.assertEqual(compiled.state_ids[compiled.table[row * compiled.width + compiled.columns[symbol]]], target)
+
+
+class TestBatchDFA(unittest.TestCase):
+
+    def test_simulate_many_matches_simulate(self):
+        words = ['', 'aaababaabb', 'abb', 'aab', 'aaxbab', 'bbababb', 'babbbaabbaa'] + [''.join(letters) for letters in product('ab', repeat=6)]
+        batch = bets_dfa.simulate_many(words)
+        self.assertEqual(batch['input'], words)
+        for index, word in enumerate(words):
+            with self.subTest(word=word):
+                result = bets_dfa.simulate(word)
+                self.assertEqual(batch['accepted'][index], result['accepted'])
+                self.assertEqual(batch['final_state'][index], result['final_state'])
+                self.assertEqual(batch['error'][index], result['state_sequence'][-1] if result['error'] else None)
+
+    def test_batch_endpoint(self):
+        client = app.test_client()
+        response = client.post('/simulate-dfa/batch', json={'dfa_type': 'stars_dfa', 'dfa_inputs': ['111111101', '111', '1111a11101']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['accepted'], [True, False, False])
+        self.assertEqual(response.get_json()['error'], [None, None, 'REJECT_STATE_INVALID_SYMBOL'])
+        response = client.post('/simulate-dfa/batch', json={'dfa_type': 'stars_dfa', 'dfa_input': '111'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TestStreamingDFA(unittest.TestCase):
+
+    def test_runner_matches_simulate(self):
+        for word in ('aaababaabb', 'bbababb', 'abb', 'aaxbab', 'aa', ''):
+            for cut in range(len(word) + 1):
+                with self.subTest(word=word, cut=cut):
+                    result = bets_dfa.simulate(word)
+                    summary = bets_dfa.runner().feed(word[:cut]).feed(word[cut:].encode()).finish()
+                    self.assertEqual(summary['accepted'], result['accepted'])
+                    self.assertEqual(summary['final_state'], result['final_state'])
+                    self.assertEqual(summary['error'], result['error'])
+
+    def test_simulate_file(self):
+        import os
+        import tempfile
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'input.txt')
+            with open(path, 'w') as stream:
+                stream.write('111' + '0' * 100000 + '01')
+            summary = stars_dfa.simulate_file(path, chunk_size=4096)
+            self.assertTrue(summary['accepted'])
+            self.assertEqual(summary['length'], 100005)
+
+    def test_stream_endpoint(self):
+        client = app.test_client()
+        response = client.post('/simulate-dfa/stream?dfa_type=bets_dfa', data=b'aaababaabb')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['accepted'])
+        response = client.post('/simulate-dfa/stream?dfa_type=bets_dfa', data=b'abbaaaa')
+        self.assertEqual(response.get_json()['rejection'], 'REJECT_STATE_TRAP_STATE')
+        self.assertEqual(response.get_json()['length'], 2)
+
+
+class TestTraceModes(unittest.TestCase):
+
+    def test_dfa_trace_modes(self):
+        full = bets_dfa.simulate('abbaa')['state_sequence']
+        self.assertEqual(full, [0, 2, 4, 7, 'REJECT_STATE_TRAP_STATE'])
+        self.assertIsNone(bets_dfa.simulate('abbaa', trace='none')['state_sequence'])
+        self.assertEqual(bets_dfa.simulate('abbaa', trace='summary')['state_sequence'], {'length': 5})
+        self.assertEqual(bets_dfa.simulate('abbaa', trace='last:2')['state_sequence'], {'length': 5, 'last': [7, 'REJECT_STATE_TRAP_STATE']})
+        self.assertEqual(bets_dfa.simulate('aaabaaaaa', trace='rle')['state_sequence'], {'length': 10, 'runs': [[0, 1], [2, 1], [3, 1], [5, 1], [9, 1], [11, 1], [12, 4]]})
+        self.assertEqual(stars_dfa.simulate('0111111', trace='rle')['state_sequence']['runs'][-2:], [[4, 1], ['REJECT_STATE_TRAP_STATE', 1]])
+        with self.assertRaises(ValueError):
+            bets_dfa.simulate('ab', trace='last:0')
+
+    def test_pda_and_cfg_trace_modes(self):
+        full = bets_pda.simulate('aaabaa')
+        last = bets_pda.simulate('aaabaa', trace='last:1')
+        self.assertEqual(last['sequence'], {'length': len(full['sequence']), 'last': full['sequence'][-1:]})
+        self.assertEqual(bets_pda.simulate('aaabaa', trace='rle')['sequence']['runs'], [[step['state'], 1] for step in full['sequence']])
+        full = bets_cfg.simulate('aaabaa')
+        self.assertEqual(bets_cfg.simulate('aaabaa', trace='summary')['sequence'], {'length': len(full['sequence'])})
+        self.assertEqual(bets_cfg.simulate('aaabaa', trace='rle')['sequence']['runs'][-1], ['aaabaa', 1])
+
+    def test_trace_endpoints(self):
+        client = app.test_client()
+        for route in ('/simulate-dfa', '/simulate-cfg', '/simulate-pda'):
+            with self.subTest(route=route):
+                response = client.post(route, json={'dfa_type': 'bets_dfa', 'dfa_input': 'aaabaa', 'trace': 'summary'})
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.get_json()['accepted'])
+                self.assertIn('length', response.get_json().get('state_sequence') or response.get_json().get('sequence'))
+                response = client.post(route, json={'dfa_type': 'bets_dfa', 'dfa_input': 'aaabaa', 'trace': 'everything'})
+                self.assertEqual(response.status_code, 400)
+
+
+class TestMinimizeDFA(unittest.TestCase):
+
+    def test_minimized_language_matches(self):
+        for dfa in (bets_dfa, stars_dfa):
+            minimized, state_map = dfa.minimize()
+            self.assertLessEqual(len(minimized.states), len(dfa.states))
+            for length in range(10):
+                for letters in product(sorted(dfa.alphabet), repeat=length):
+                    word = ''.join(letters)
+                    self.assertEqual(minimized.accepts(word), dfa.accepts(word), word)
+
+    def test_bets_trap_states_merge(self):
+        minimized, state_map = bets_dfa.minimize()
+        self.assertEqual(len(minimized.states), 12)
+        self.assertEqual(state_map[7], state_map[8])
+        self.assertEqual(minimized.trap_states, {state_map[7]})
+        self.assertEqual(minimized_classes(state_map)[state_map[7]], [7, 8])
+        original = bets_dfa.simulate('aaabaa')['state_sequence']
+        self.assertEqual(minimized.simulate('aaabaa')['state_sequence'], [state_map[state] for state in original])
+
+
+class TestLiveness(unittest.TestCase):
+
+    def test_dfa_dead_and_sink_states(self):
+        self.assertEqual(bets_dfa.dead_states(), {7, 8})
+        self.assertEqual(bets_dfa.accepting_sink_states(), {12})
+        self.assertEqual(stars_dfa.dead_states(), {4})
+        self.assertTrue(bets_dfa.accepts('aaabaa' + 'ab' * 5000))
+        self.assertFalse(bets_dfa.accepts('aaabaa' + 'ab' * 5000 + 'c'))
+        self.assertFalse(bets_dfa.accepts('abb' + 'a' * 10000))
+
+    def test_pda_early_exit(self):
+        self.assertEqual(bets_pda.dead_states, {7, 8})
+        self.assertEqual(stars_pda.accepting_sinks, set())
+        from unittest import mock
+        result = bets_pda.simulate('aaababaabbab')
+        self.assertTrue(result['accepted'])
+        # The trace is completed to the end of the input, as without the early exit.
+        self.assertEqual(result['sequence'][6]['remaining'], 'aabbab')
+        self.assertEqual(result['sequence'][-1]['remaining'], '')
+        self.assertEqual(result['sequence'][-1]['stack'], ['Z0'] + list('aaababaabbab'))
+        self.assertEqual(bets_pda.simulate('aaababaabbab', engine='bfs'), result)
+        with mock.patch.object(bets_pda, 'early_exit', False):
+            self.assertEqual(bets_pda.simulate('aaababaabbab', engine='bfs'), result)
+        with mock.patch.object(bets_pda, 'deterministic', False):
+            self.assertEqual(bets_pda.simulate('aaababaabbab'), result)
+            self.assertEqual(bets_pda.simulate('aaababaabbab', trace='rle')['sequence']['length'], 13)
+        result = bets_pda.simulate('abb' + 'a' * 50)
+        self.assertFalse(result['accepted'])
+        self.assertEqual([step['state'] for step in result['sequence']], [0, 2, 4, 7])
+
+    def test_pda_bfs_early_exit_long_input(self):
+        from unittest import mock
+        word = 'aaabaa' + 'a' * 20000
+        with mock.patch.object(bets_pda, 'deterministic', False):
+            result = bets_pda.simulate(word + '#', engine='bfs', max_steps=30000, trace='none')
+            self.assertFalse(result['accepted'])
+            self.assertTrue(bets_pda.simulate(word, engine='bfs', max_steps=30000, trace='none')['accepted'])
+
+    def test_pda_linear_early_exit_long_input(self):
+        word = 'aaabaa' + 'a' * 20000
+        result = bets_pda.simulate(word + '#', trace='none')
+        self.assertFalse(result['accepted'])
+        self.assertTrue(bets_pda.simulate(word, trace='none')['accepted'])
+        self.assertEqual(bets_pda.simulate(word + '#', engine='bfs', max_steps=30000, trace='none'), result)
+
+    def test_cfg_early_exit(self):
+        result = bets_cfg.simulate('aaabaa' + 'b' * 40)
+        self.assertTrue(result['accepted'])
+        self.assertEqual(result['sequence'][-1], list('aaabaa' + 'b' * 40) + ['ε'])
+        self.assertFalse(bets_cfg.simulate('abb' + 'a' * 200)['accepted'])
+
+    def test_cfg_search_early_exit_invalid_tail(self):
+        for engine, n in (('bfs', 1000), ('iddfs', 100)):
+            with self.subTest(engine=engine):
+                word = 'aaabaa' + 'a' * n
+                self.assertFalse(bets_cfg.simulate(word + '#', engine=engine, max_depth=n + 20, trace='none')['accepted'])
+                result = bets_cfg.simulate(word, engine=engine, max_depth=n + 20)
+                self.assertTrue(result['accepted'])
+                self.assertEqual(result['sequence'][-1], list(word) + ['ε'])
+
+
+class TestParallelDFA(unittest.TestCase):
+
+    def test_parallel_matches_serial(self):
+        long_inputs = [
+            (stars_dfa, '111' + '01' * 50000 + '000' + '10'),
+            (bets_dfa, 'aaab' + 'ab' * 50000),
+            (bets_dfa, 'abb' + 'a' * 100000),
+            (stars_dfa, '111' + '01' * 50000 + '2' + '01' * 10),
+        ]
+        for dfa, word in long_inputs:
+            with self.subTest(word=word[:10]):
+                self.assertEqual(dfa.simulate_parallel(word, workers=3), dfa.runner().feed(word).finish())
+
+
+class TestPDAStacks(unittest.TestCase):
+
+    def test_stack_pool_shares_cells(self):
+        from pda_logic import StackPool
+        stacks = StackPool()
+        bottom = stacks.push(0, 'Z0')
+        left = stacks.push(stacks.push(bottom, 'a'), 'b')
+        right = stacks.push(stacks.push(bottom, 'a'), 'b')
+        self.assertEqual(left, right)
+        self.assertEqual(stacks.to_list(left), ['Z0', 'a', 'b'])
+        self.assertEqual(stacks.top(stacks.pop(left)), 'a')
+        self.assertEqual(stacks.top(0), 'ε')
+
+    def test_deterministic_fast_path(self):
+        from pda_logic import PDA
+        self.assertTrue(bets_pda.deterministic)
+        self.assertTrue(stars_pda.deterministic)
+        self.assertEqual(bets_pda.moves(0, 'a', 'Z0'), ((False, 2, ('a',), True),))
+        anbn = PDA({0, 1, 2}, {'a', 'b'}, {'a', 'Z'}, {
+            0: {'a': {'Z': [(0, ['a', 'Z'])], 'a': [(0, ['a', 'a'])]}, 'b': {'a': [(1, ['ε'])]}},
+            1: {'b': {'a': [(1, ['ε'])]}, 'ε': {'Z': [(2, ['Z'])]}},
+        }, 0, 'Z', {2})
+        self.assertTrue(anbn.deterministic)
+        for word in ('aabb', 'aab', 'abb', 'ba', '', 'aaabbb'):
+            with self.subTest(word=word):
+                linear = anbn.simulate(word, engine='bfs')
+                anbn.deterministic = False
+                self.assertEqual(linear, anbn.simulate(word, engine='bfs'))
+                anbn.deterministic = True
+
+    def test_long_input(self):
+        word = '111' + '01' * 1500 + '000' + '10'
+        result = stars_pda.simulate(word, trace='last:1')
+        self.assertTrue(result['accepted'])
+        self.assertEqual(result['sequence']['length'], len(word) + 1)
+        self.assertEqual(len(result['sequence']['last'][0]['stack']), len(word) + 1)
+
+
+class TestGraphStackPDA(unittest.TestCase):
+
+    def setUp(self):
+        from pda_logic import PDA
+        # Even palindromes: guess the middle with an ε-move, then match the second half against the stack.
+        self.palindromes = PDA({0, 1, 2}, {'a', 'b'}, {'a', 'b', 'Z'}, {
+            0: {'a': {'ε': [(0, ['a'])]}, 'b': {'ε': [(0, ['b'])]}, 'ε': {'ε': [(1, ['ε'])]}},
+            1: {'a': {'a': [(1, ['ε'])]}, 'b': {'b': [(1, ['ε'])]}, 'ε': {'Z': [(2, ['Z'])]}},
+        }, 0, 'Z', {2})
+
+    def assertLegalPath(self, pda, word, sequence):
+        for before, after in zip(sequence, sequence[1:]):
+            index = len(before['consumed'])
+            symbol = word[index] if index < len(word) else None
+            top = before['stack'][-1] if before['stack'] else 'ε'
+            successors = []
+            for pops, next_st, pushed, consumes in pda.moves(before['state'], symbol, top):
+                stack = before['stack'][:-1] if pops else before['stack']
+                successors.append((next_st, index + 1 if consumes else index, stack + list(pushed)))
+            self.assertIn((after['state'], len(after['consumed']), after['stack']), successors)
+
+    def test_matches_bfs(self):
+        for word in ('', 'aa', 'abba', 'abab', 'aabbaa', 'ab', 'abx'):
+            with self.subTest(word=word):
+                gss = self.palindromes.simulate(word)
+                bfs = self.palindromes.simulate(word, engine='bfs')
+                self.assertEqual(gss['accepted'], bfs['accepted'])
+                self.assertEqual(gss['sequence'][0], {'state': 0, 'stack': ['Z'], 'consumed': '', 'remaining': word})
+                self.assertLegalPath(self.palindromes, word, gss['sequence'])
+                if gss['accepted']:
+                    self.assertEqual(gss['sequence'], bfs['sequence'])
+
+    def test_no_step_cap(self):
+        half = 'ab' * 300 + 'b'
+        word = half + half[::-1]
+        self.assertFalse(self.palindromes.simulate(word, engine='bfs')['accepted'])
+        result = self.palindromes.simulate(word)
+        self.assertTrue(result['accepted'])
+        self.assertEqual(result['sequence'][-1], {'state': 2, 'stack': ['Z'], 'consumed': word, 'remaining': ''})
+        self.assertLegalPath(self.palindromes, word, result['sequence'])
+        self.assertFalse(self.palindromes.simulate(word + 'a', trace='none')['accepted'])
+
+    def test_epsilon_push_loop(self):
+        from pda_logic import PDA
+        # ε-moves can push without bound; the shared vertices keep the closure finite.
+        pda = PDA({0, 1}, {'b'}, {'X', 'Z'}, {
+            0: {'ε': {'ε': [(0, ['X'])]}, 'b': {'X': [(1, ['ε'])]}},
+            1: {'b': {'X': [(1, ['ε'])]}, 'ε': {'Z': [(1, ['ε'])]}},
+        }, 0, 'Z', {1})
+        for word, accepted in (('bbb', True), ('b', True), ('', False), ('bab', False)):
+            with self.subTest(word=word):
+                result = pda.simulate(word)
+                self.assertEqual(result['accepted'], accepted)
+                self.assertLegalPath(pda, word, result['sequence'])
+        self.assertEqual(pda.simulate('bbb')['sequence'][-1]['stack'], ['Z'])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            self.palindromes.simulate('aa', engine='dfs')
+
+
+class TestEarleyCFG(unittest.TestCase):
+
+    def assertLeftmostDerivation(self, cfg, word, sequence):
+        self.assertEqual(sequence[0], [cfg.start_symbol])
+        for before, after in zip(sequence, sequence[1:]):
+            index = next(i for i, symbol in enumerate(before) if symbol in cfg.variables)
+            self.assertIn(after, [before[:index] + rule['to'] + before[index + 1:] for rule in cfg.rules if rule['from'] == before[index]])
+        self.assertEqual(''.join(symbol for symbol in sequence[-1] if symbol != 'ε'), word)
+
+    def test_matches_bfs(self):
+        for word in ('aaabaa', 'aaab', 'ab', '', 'aaabaaba', 'aaabc'):
+            with self.subTest(word=word):
+                earley, bfs = bets_cfg.simulate(word), bets_cfg.simulate(word, engine='bfs')
+                self.assertEqual((earley['accepted'], earley['sequence']), (bfs['accepted'], bfs['sequence']))
+
+    def test_no_depth_limit(self):
+        from app import stars_cfg
+        word = '111' + '01' * 5000 + '000' + '10'
+        self.assertFalse(stars_cfg.simulate(word, engine='bfs')['accepted'])
+        result = stars_cfg.simulate(word, trace='last:1')
+        self.assertTrue(result['accepted'])
+        self.assertEqual(result['sequence']['length'], len(word) + 2)
+        self.assertEqual(result['sequence']['last'], [list(word) + ['ε']])
+        self.assertFalse(stars_cfg.simulate(word + '1', trace='none')['accepted'])
+
+    def test_nullable_and_ambiguous_grammars(self):
+        from cfg_logic import CFG
+        grammar = CFG({'S', 'A', 'B'}, {'a', 'b'}, [
+            {'from': 'S', 'to': ['A', 'S', 'B']},
+            {'from': 'S', 'to': ['ε']},
+            {'from': 'A', 'to': ['a']},
+            {'from': 'A', 'to': ['ε']},
+            {'from': 'B', 'to': ['b']},
+            {'from': 'B', 'to': ['A', 'b']},
+        ], 'S')
+        for word, accepted in (('', True), ('ab', True), ('aabb', True), ('abab', True), ('b', True), ('aab', True), ('ba', False), ('abba', False)):
+            with self.subTest(word=word):
+                result = grammar.simulate(word)
+                self.assertEqual(result['accepted'], accepted)
+                self.assertEqual(result['accepted'], grammar.simulate(word, engine='bfs')['accepted'])
+                if accepted:
+                    self.assertLeftmostDerivation(grammar, word, result['sequence'])
+                else:
+                    self.assertEqual(result['sequence'], [])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            bets_cfg.simulate('ab', engine='cyk')
+
+    def test_grammar_compile(self):
+        from cfg_logic import CFG
+        grammar = CFG({'S', 'A', 'B', 'U', 'N'}, {'a', 'b'}, [
+            {'from': 'S', 'to': ['A', 'A', 'B']},
+            {'from': 'S', 'to': ['N', 'a']},
+            {'from': 'A', 'to': ['a', 'A']},
+            {'from': 'A', 'to': ['ε']},
+            {'from': 'B', 'to': ['b', 'b']},
+            {'from': 'U', 'to': ['a']},
+            {'from': 'N', 'to': ['N', 'b']},
+        ], 'S')
+        self.assertEqual(grammar.reachable, {'S', 'A', 'B'})
+        self.assertEqual(set(grammar._null_rule), {'A'})
+        self.assertEqual(grammar._min_yield, {'S': 2, 'A': 0, 'B': 2, 'U': 1})
+        self.assertEqual(grammar._by_lhs['S'], (0,))
+        for word, accepted in (('abb', True), ('bb', True), ('aab', False), ('b', False)):
+            with self.subTest(word=word):
+                self.assertEqual(grammar.simulate(word, engine='bfs')['accepted'], accepted)
+        # Every form of `S` yields at least two characters, so the search ends at once.
+        self.assertFalse(bets_cfg.simulate('a', engine='bfs', max_depth=10 ** 6)['accepted'])
+
+
+class TestIterativeDeepeningCFG(unittest.TestCase):
+
+    def setUp(self):
+        from cfg_logic import CFG
+        self.ambiguous = CFG({'S', 'A'}, {'a', 'b'}, [
+            {'from': 'S', 'to': ['A', 'S']},
+            {'from': 'S', 'to': ['ε']},
+            {'from': 'A', 'to': ['a']},
+            {'from': 'A', 'to': ['a', 'a']},
+            {'from': 'A', 'to': ['S', 'b']},
+        ], 'S')
+
+    def test_matches_bfs(self):
+        from app import stars_cfg
+        for cfg, words in ((bets_cfg, ('aaabaa', 'aaab', 'aaabaabbab', '', 'abc')), (stars_cfg, ('111', '1110', '0101', '11101000'))):
+            for word in words:
+                with self.subTest(word=word):
+                    bfs = cfg.simulate(word, engine='bfs', trace='rle')
+                    iddfs = cfg.simulate(word, engine='iddfs', trace='rle')
+                    self.assertFalse(iddfs['exhausted'])
+                    self.assertEqual((iddfs['accepted'], iddfs['sequence']), (bfs['accepted'], bfs['sequence']))
+        for word in ('aab', 'aaba', 'abab', 'ba'):
+            with self.subTest(word=word):
+                self.assertEqual(self.ambiguous.simulate(word, engine='iddfs')['sequence'], self.ambiguous.simulate(word, engine='bfs')['sequence'])
+
+    def test_budget_exhausted(self):
+        word = 'a' * 14 + 'c'
+        result = self.ambiguous.simulate(word, engine='iddfs', max_depth=40, max_nodes=1000)
+        self.assertFalse(result['accepted'])
+        self.assertTrue(result['exhausted'])
+        self.assertIn('budget exhausted', result['error'])
+        self.assertTrue(self.ambiguous.simulate(word, engine='iddfs', max_depth=40, time_limit=0.05)['exhausted'])
+        result = self.ambiguous.simulate('a' * 6 + 'c', engine='iddfs', max_depth=12)
+        self.assertFalse(result['accepted'])
+        self.assertFalse(result['exhausted'])
+
+
+class TestResultCache(unittest.TestCase):
+
+    def test_lru_bounds(self):
+        from cache_logic import ResultCache
+        cache = ResultCache(max_entries=2, max_bytes=10)
+        self.assertTrue(cache.put('a', b'1234'))
+        self.assertTrue(cache.put('b', b'1234'))
+        self.assertEqual(cache.get('a'), b'1234')
+        cache.put('c', b'1')  # over max_entries: drops 'b', the least recently used
+        self.assertIsNone(cache.get('b'))
+        cache.put('d', b'1234567890')  # over max_bytes: drops 'a' and 'c'
+        self.assertEqual(len(cache), 1)
+        self.assertFalse(cache.put('e', b'12345678901'))
+        self.assertEqual(cache.stats()['evictions'], 3)
+        self.assertEqual(cache.stats()['bytes'], 10)
+        self.assertEqual((cache.stats()['hits'], cache.stats()['misses']), (1, 1))
+
+    def test_ttl(self):
+        from cache_logic import ResultCache
+        now = [0.0]
+        cache = ResultCache(ttl=5, clock=lambda: now[0])
+        cache.put('a', b'x')
+        now[0] = 4.9
+        self.assertEqual(cache.get('a'), b'x')
+        now[0] = 5.0
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['expirations'], 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_threads(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from cache_logic import ResultCache
+        cache = ResultCache(max_entries=50)
+
+        def work(offset):
+            for i in range(2000):
+                key = (offset + i) % 80
+                if cache.get(key) is None:
+                    cache.put(key, bytes(key % 7))
+        with ThreadPoolExecutor(8) as pool:
+            list(pool.map(work, range(8)))
+        stats = cache.stats()
+        self.assertEqual(stats['hits'] + stats['misses'], 16000)
+        self.assertLessEqual(stats['entries'], 50)
+        self.assertEqual(stats['bytes'], sum(key % 7 for key in range(80) if cache.get(key) is not None))
+
+    def test_endpoints_hit(self):
+        from app import result_cache
+        client = app.test_client()
+        for route in ('/simulate-dfa', '/simulate-cfg', '/simulate-pda'):
+            with self.subTest(route=route):
+                request = {'dfa_type': 'stars_dfa', 'dfa_input': '11101000', 'trace': 'rle'}
+                first = client.post(route, json=request)
+                hits = result_cache.stats()['hits']
+                second = client.post(route, json=request)
+                self.assertEqual(result_cache.stats()['hits'], hits + 1)
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(second.get_json(), first.get_json())
+                self.assertEqual(second.mimetype, 'application/json')
+        self.assertIn('hits', client.get('/cache/stats').get_json())
+
+
+class TestMachineRegistry(unittest.TestCase):
+
+    def setUp(self):
+        # Binary strings ending in '1', in the JSON shapes of the frontend presets.
+        self.dfa = {'name': 'ends in 1', 'states': [{'id': 0}, {'id': 1}], 'alphabet': ['0', '1'],
+                    'transitions': {'0': {'0': 0, '1': 1}, '1': {'0': 0, '1': 1}}, 'startState': 0, 'acceptingStates': [1]}
+        self.cfg = {'variables': ['S'], 'terminals': ['a', 'b'], 'startSymbol': 'S',
+                    'rules': [{'from': 'S', 'to': ['a', 'S', 'b']}, {'from': 'S', 'to': ['ε']}]}
+        self.pda = {'states': [{'id': 0}, {'id': 1}], 'inputAlphabet': ['a', 'b'], 'stackAlphabet': ['a', 'Z'],
+                    'transitions': [{'from': 0, 'input': 'a', 'stackTop': 'ε', 'to': 0, 'push': ['a']},
+                                    {'from': 0, 'input': 'b', 'stackTop': 'a', 'to': 1, 'push': []},
+                                    {'from': 1, 'input': 'b', 'stackTop': 'a', 'to': 1, 'push': []}],
+                    'startState': 0, 'initialStackSymbol': 'Z', 'acceptingStates': [1]}
+
+    def test_content_hash(self):
+        from registry_logic import MachineRegistry
+        registry = MachineRegistry()
+        machine_id, new = registry.register('dfa', self.dfa)
+        self.assertTrue(new)
+        # Names, key order and set order do not change the id.
+        reordered = dict(reversed(list(self.dfa.items())), name='other', alphabet=['1', '0'])
+        self.assertEqual(registry.register('dfa', reordered), (machine_id, False))
+        self.assertNotEqual(registry.register('dfa', dict(self.dfa, acceptingStates=[0]))[0], machine_id)
+        kind, dfa = registry.get(machine_id)
+        self.assertEqual(kind, 'dfa')
+        self.assertTrue(dfa.simulate('0101')['accepted'])
+        with self.assertRaises(KeyError):
+            registry.get('0' * 64)
+
+    def test_invalid_definitions(self):
+        from registry_logic import MachineRegistry
+        registry = MachineRegistry()
+        for kind, definition in (('nfa', self.dfa), ('dfa', dict(self.dfa, startState=5)), ('dfa', {'states': []}),
+                                 ('cfg', dict(self.cfg, startSymbol='T')), ('pda', dict(self.pda, acceptingStates=[2])),
+                                 ('dfa', dict(self.dfa, transitions={'0': {'0': 0, '1': 2}})),
+                                 ('dfa', dict(self.dfa, states=[{'id': 0}, {'id': 'q1'}]))):
+            with self.subTest(kind=kind, definition=definition):
+                with self.assertRaises(ValueError):
+                    registry.register(kind, definition)
+        self.assertEqual(registry.stats()['definitions'], 0)
+        with self.assertRaisesRegex(ValueError, 'state ids of a dfa definition must be integers'):
+            registry.register('dfa', dict(self.dfa, states=[{'id': 'q0'}, {'id': 'q1'}], startState='q0'))
+        # PDAs take any JSON state ids.
+        named = dict(self.pda, states=[{'id': 'q0'}, {'id': 1}], startState='q0',
+                     transitions=[dict(transition, **{'from': 'q0'}) if transition['from'] == 0 else transition
+                                  for transition in self.pda['transitions']])
+        named['transitions'][0]['to'] = 'q0'
+        self.assertTrue(registry.get(registry.register('pda', named)[0])[1].simulate('aabb')['accepted'])
+
+    def test_eviction_rebuilds(self):
+        from registry_logic import MachineRegistry
+        registry = MachineRegistry(max_machines=1)
+        cfg_id, _ = registry.register('cfg', self.cfg)
+        pda_id, _ = registry.register('pda', self.pda)
+        self.assertEqual(registry.stats()['entries'], 1)
+        kind, cfg = registry.get(cfg_id)  # evicted by the PDA, rebuilt from its stored definition
+        self.assertEqual(kind, 'cfg')
+        self.assertTrue(cfg.simulate('aabb')['accepted'])
+        self.assertFalse(registry.get(pda_id)[1].simulate('abab')['accepted'])
+        self.assertTrue(registry.get(pda_id)[1].simulate('aabb')['accepted'])
+        self.assertEqual(registry.stats()['evictions'], 3)
+
+    def test_endpoints(self):
+        client = app.test_client()
+        response = client.post('/machines', json={'kind': 'dfa', 'definition': self.dfa})
+        self.assertEqual(response.status_code, 201)
+        machine_id = response.get_json()['machine_id']
+        self.assertEqual(client.post('/machines', json={'kind': 'dfa', 'definition': self.dfa}).status_code, 200)
+        self.assertEqual(client.post('/machines', json={'kind': 'dfa', 'definition': {}}).status_code, 400)
+
+        response = client.post('/simulate-dfa', json={'machine_id': machine_id, 'dfa_input': '0011'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.get_json()['accepted'])
+        response = client.post('/simulate-dfa/batch', json={'machine_id': machine_id, 'dfa_inputs': ['1', '10']})
+        self.assertEqual(response.get_json()['accepted'], [True, False])
+        response = client.post(f'/simulate-dfa/stream?machine_id={machine_id}', data=b'0101')
+        self.assertTrue(response.get_json()['accepted'])
+
+        cfg_id = client.post('/machines', json={'kind': 'cfg', 'definition': self.cfg}).get_json()['machine_id']
+        self.assertTrue(client.post('/simulate-cfg', json={'machine_id': cfg_id, 'dfa_input': 'ab'}).get_json()['accepted'])
+        self.assertEqual(client.post('/simulate-pda', json={'machine_id': cfg_id, 'dfa_input': 'ab'}).status_code, 400)
+        self.assertEqual(client.post('/simulate-cfg', json={'machine_id': 'f' * 64, 'dfa_input': 'ab'}).status_code, 404)
+
+
+class TestBinaryImages(unittest.TestCase):
+
+    def test_round_trip(self):
+        import os
+        import tempfile
+        import binary_logic
+        from app import stars_dfa, stars_cfg, stars_pda
+        with tempfile.TemporaryDirectory() as directory:
+            for machine in (stars_dfa, stars_cfg, stars_pda):
+                with self.subTest(machine=type(machine).__name__):
+                    path = os.path.join(directory, 'machine.bin')
+                    binary_logic.dump(machine, path)
+                    loaded = binary_logic.load(path)
+                    self.assertIsInstance(loaded, type(machine))
+                    for input_string in ('', '11101000', '0001011', '10x'):
+                        self.assertEqual(loaded.simulate(input_string), machine.simulate(input_string))
+                    del loaded  # releases the mapping before the directory is removed
+
+    def test_mapped_dfa(self):
+        import binary_logic
+        from app import bets_dfa
+        loaded = binary_logic.loads(binary_logic.dumps(bets_dfa))
+        self.assertIsInstance(loaded.compile().table, memoryview)
+        self.assertEqual(loaded.transitions, bets_dfa.transitions)
+        self.assertEqual((loaded.states, loaded.final_states, loaded.trap_states), (bets_dfa.states, bets_dfa.final_states, bets_dfa.trap_states))
+        self.assertEqual(loaded.simulate_many(['abab', 'aab', 'bbbaa']), bets_dfa.simulate_many(['abab', 'aab', 'bbbaa']))
+        self.assertEqual(loaded.minimize()[1], bets_dfa.minimize()[1])
+
+    def test_bad_images(self):
+        import binary_logic
+        from app import bets_pda
+        image = binary_logic.dumps(bets_pda)
+        self.assertTrue(binary_logic.loads(image).early_exit)
+        for data in (b'', b'NOTANIMAGE' + image[10:], image[:8] + b'\x02' + image[9:], image[:-4]):
+            with self.assertRaises(ValueError):
+                binary_logic.loads(data)
+
+
+class TestLazyMachines(unittest.TestCase):
+
+    # Seconds `import app` may take on top of Flask itself.
+    IMPORT_BUDGET = 0.5
+
+    def test_import_budget(self):
+        import os
+        import subprocess
+        import sys
+        script = (
+            'import sys, time\n'
+            'import flask, flask_cors\n'
+            'start = time.perf_counter()\n'
+            'import app\n'
+            'elapsed = time.perf_counter() - start\n'
+            'built = [name for name, machines in app.BUILTIN_MACHINES.items() for machine in machines.values() if machine.built]\n'
+            'print(elapsed, len(built), "numpy" in sys.modules)\n'
+        )
+        environment = {key: value for key, value in os.environ.items() if key != 'PRELOAD_MACHINES'}
+        output = subprocess.run([sys.executable, '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)), env=environment,
+                                capture_output=True, text=True, check=True).stdout.split()
+        self.assertLess(float(output[0]), self.IMPORT_BUDGET)
+        self.assertEqual(output[1:], ['0', 'False'])  # nothing built and NumPy not loaded until a request needs them
+
+    def test_built_once(self):
+        from concurrent.futures import ThreadPoolExecutor
+        import time
+        from registry_logic import LazyMachine
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.05)
+            return object()
+        machine = LazyMachine(build)
+        self.assertFalse(machine.built)
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(lambda _: machine.get(), range(8)))
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_preload(self):
+        import app as module
+        module.preload()
+        self.assertTrue(all(machine.built for machines in module.BUILTIN_MACHINES.values() for machine in machines.values()))
+        self.assertIs(module.bets_cfg, module.BUILTIN_MACHINES['bets_dfa']['cfg'].get())
+        with self.assertRaises(AttributeError):
+            module.bets_nfa
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_inputs(self):
+        import random
+        from benchmarks import make_input
+        from app import stars_dfa
+        for case in ('accepting', 'rejecting', 'adversarial'):
+            for size in (10, 1001):
+                with self.subTest(case=case, size=size):
+                    word = make_input(stars_dfa, case, size, random.Random(0))
+                    self.assertEqual(len(word), size)
+                    self.assertEqual(word, make_input(stars_dfa, case, size, random.Random(0)))
+                    result = stars_dfa.simulate(word, trace='none')
+                    self.assertEqual(result['accepted'], case == 'accepting')
+                    if case == 'adversarial':
+                        self.assertEqual(result['error'], f'Simulation Error: Symbol "{word[-1]}" not in alphabet {stars_dfa.alphabet}.')
+
+    def test_suite_and_compare(self):
+        from benchmarks import run_suite, compare
+        report = run_suite(machines=('stars',), sizes=(10, 50), repeat=2, warmup=0)
+        self.assertEqual(len(report['results']), 3 * 3 * 2)
+        for entry in report['results']:
+            self.assertLessEqual(entry['min_s'], entry['p50_s'])
+            self.assertLessEqual(entry['p50_s'], entry['p99_s'])
+            self.assertEqual(entry['accepted'], entry['case'] == 'accepting')
+        slower = {'results': [dict(entry, p50_s=entry['p50_s'] * 2) for entry in report['results']]}
+        rows = compare(report, slower)
+        self.assertEqual(len(rows), len(report['results']))
+        self.assertTrue(all(row['regression'] for row in rows))
+        self.assertFalse(any(row['regression'] for row in compare(report, report)))
+
+
+class TestSearchMetrics(unittest.TestCase):
+
+    def test_search_stats(self):
+        from cfg_logic import CFG
+        from metrics_logic import SearchStats
+        from app import stars_dfa, stars_pda
+        stats = SearchStats()
+        stars_dfa.simulate('11101000', trace='none', stats=stats)
+        self.assertEqual((stats.engine, stats.steps, stats.trace_length), ('dfa', 8, None))
+
+        stats = SearchStats()
+        result = stars_pda.simulate('11101000', stats=stats)
+        self.assertEqual(stats.engine, 'linear')
+        self.assertEqual(stats.trace_length, len(result['sequence']))
+        stats = SearchStats()
+        stars_pda.simulate('11101000', engine='bfs', max_steps=3, stats=stats)
+        self.assertTrue(stats.hit_limit)
+        self.assertEqual(stats.steps, 3)
+
+        ambiguous = CFG({'S', 'A'}, {'a', 'b'}, [{'from': 'S', 'to': ['A', 'S']}, {'from': 'S', 'to': ['ε']},
+                                                 {'from': 'A', 'to': ['a']}, {'from': 'A', 'to': ['a', 'a']}], 'S')
+        counts = {}
+        for engine in ('earley', 'bfs', 'iddfs'):
+            with self.subTest(engine=engine):
+                stats = SearchStats()
+                ambiguous.simulate('aaaa', engine=engine, trace='summary', stats=stats)
+                self.assertEqual(stats.engine, engine)
+                self.assertGreater(stats.steps, 0)
+                self.assertGreaterEqual(stats.configurations, stats.peak_frontier)
+                self.assertFalse(stats.hit_limit)
+                counts[engine] = stats
+        self.assertGreater(counts['bfs'].pruned, 0)
+        stats = SearchStats()
+        ambiguous.simulate('aaaab', engine='bfs', max_depth=3, stats=stats)
+        self.assertTrue(stats.hit_limit)
+
+    def test_histogram_format(self):
+        from metrics_logic import Histogram
+        histogram = Histogram('latency_seconds', 'Latency.', ('endpoint',), buckets=(0.1, 1))
+        histogram.observe('/a"b', value=0.5)
+        histogram.observe('/a"b', value=2)
+        self.assertEqual(histogram.samples(), [
+            'latency_seconds_bucket{endpoint="/a\\"b",le="0.1"} 0',
+            'latency_seconds_bucket{endpoint="/a\\"b",le="1"} 1',
+            'latency_seconds_bucket{endpoint="/a\\"b",le="+Inf"} 2',
+            'latency_seconds_sum{endpoint="/a\\"b"} 2.5',
+            'latency_seconds_count{endpoint="/a\\"b"} 2',
+        ])
+
+    def test_metrics_endpoint(self):
+        from app import metrics, result_cache
+        result_cache.clear()
+        client = app.test_client()
+        searches = metrics.searches.value('pda', 'linear')
+        client.post('/simulate-pda', json={'dfa_type': 'bets_dfa', 'dfa_input': 'abababa'})
+        client.post('/simulate-pda', json={'dfa_type': 'bets_dfa', 'dfa_input': 'abababa'})  # cache hit: no search
+        client.post('/simulate-pda', json={'dfa_type': 'nope', 'dfa_input': 'a'})
+        self.assertEqual(metrics.searches.value('pda', 'linear'), searches + 1)
+        response = client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        body = response.get_data(as_text=True)
+        self.assertIn('# TYPE automata_request_duration_seconds histogram', body)
+        self.assertIn('automata_request_errors_total{endpoint="/simulate-pda"}', body)
+        self.assertIn('automata_search_steps_count{kind="pda",engine="linear"}', body)
+        self.assertGreaterEqual(metrics.requests.value('/simulate-pda', 200), 2)
+
+
+class TestSearchPool(unittest.TestCase):
+    AMBIGUOUS = {'variables': ['S'], 'terminals': ['a'], 'rules': [{'from': 'S', 'to': ['S', 'S']}, {'from': 'S', 'to': ['a']}],
+                 'startSymbol': 'S'}
+
+    def test_pool_results(self):
+        from pool_logic import SearchPool
+        pool = SearchPool(workers=1)
+        try:
+            for word in ('abababa', 'ab', ''):
+                result, stats = pool.simulate('bets_cfg', bets_cfg, word, 'summary')
+                self.assertEqual(result, bets_cfg.simulate(word, trace='summary'))
+                self.assertEqual(stats.engine, 'earley')
+            with self.assertRaises(ValueError):
+                pool.simulate('bets_cfg', bets_cfg, 'ab', 'bogus')
+            self.assertEqual(pool.stats()['started'], 1)
+        finally:
+            pool.close()
+
+    def test_deadline_and_cancellation(self):
+        import threading
+        import time
+        from pool_logic import SearchPool, SearchTimeout
+        from registry_logic import make_cfg
+        slow = make_cfg(self.AMBIGUOUS)
+        pool = SearchPool(workers=1)
+        try:
+            pool.start()
+            errors = []
+
+            def run_slow():
+                try:
+                    pool.simulate('slow', slow, 'a' * 1000, timeout=1.0)
+                except SearchTimeout as e:
+                    errors.append(e)
+
+            start = time.monotonic()
+            thread = threading.Thread(target=run_slow)
+            thread.start()
+            time.sleep(0.2)
+            # The only worker is busy: a second call waits for it until its own deadline.
+            with self.assertRaisesRegex(SearchTimeout, 'No search worker'):
+                pool.simulate('bets_cfg', bets_cfg, 'ab', timeout=0.2)
+            thread.join()
+            self.assertLess(time.monotonic() - start, 5)
+            self.assertEqual(len(errors), 1)
+            self.assertFalse(errors[0].cancelled)
+
+            with self.assertRaises(SearchTimeout) as caught:
+                pool.simulate('slow', slow, 'a' * 1000, cancelled=lambda: True)
+            self.assertTrue(caught.exception.cancelled)
+            self.assertEqual((pool.timeouts, pool.cancellations), (2, 1))
+            # The killed workers were replaced.
+            self.assertTrue(pool.simulate('slow', slow, 'aaaa')[0]['accepted'])
+        finally:
+            pool.close()
+
+    def test_route_timeout(self):
+        import app as app_module
+        from unittest import mock
+        from app import metrics, result_cache
+        from pool_logic import SearchPool
+        # The pool is off by default (SEARCH_WORKERS=0); deadlines need it.
+        pool = SearchPool(workers=1)
+        self.addCleanup(pool.close)
+        patcher = mock.patch.object(app_module, 'search_pool', pool)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        result_cache.clear()
+        client = app.test_client()
+        machine_id = client.post('/machines', json={'kind': 'cfg', 'definition': self.AMBIGUOUS}).get_json()['machine_id']
+        request = {'machine_id': machine_id, 'dfa_input': 'a' * 1000, 'timeout': 1}
+        response = client.post('/simulate-cfg', json=request)
+        self.assertEqual(response.status_code, 504)
+        self.assertTrue(response.get_json()['timeout'])
+        self.assertEqual(metrics.timeouts.value('cfg', 'deadline'), 1)
+        response = client.post('/simulate-cfg', json={'machine_id': machine_id, 'dfa_input': 'aaa', 'timeout': 5})
+        self.assertTrue(response.get_json()['accepted'])
+        for timeout in (0, -1, 'soon', True):
+            with self.subTest(timeout=timeout):
+                response = client.post('/simulate-pda', json={'dfa_type': 'bets_dfa', 'dfa_input': 'ab', 'timeout': timeout})
+                self.assertEqual(response.status_code, 400)
+        # DFA requests never go through the pool.
+        response = client.post('/simulate-dfa', json={'dfa_type': 'bets_dfa', 'dfa_input': 'ab', 'timeout': 0})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestIncrementalSimulation(unittest.TestCase):
+    EDITS = ['', 'a', 'ab', 'aba', 'abab', 'ababa', 'abab', 'aba', 'abb', 'abba', 'abbab', 'ab', 'babab', 'bab?b', 'bab', 'babababab']
+
+    def check_edits(self, machine, edits):
+        run = machine.incremental()
+        for trace in ('full', 'none', 'rle'):
+            for text in edits:
+                with self.subTest(trace=trace, text=text):
+                    self.assertEqual(run.simulate(text, trace=trace), machine.simulate(text, trace=trace))
+
+    def test_shared_prefix(self):
+        from checkpoint_logic import shared_prefix
+        for old, new, expected in [('', 'ab', 0), ('ab', 'abc', 2), ('abc', 'ab', 2), ('abcd', 'abxd', 2), ('abc', 'xbc', 0), ('abc', 'abc', 3)]:
+            self.assertEqual(shared_prefix(old, new), expected)
+
+    def test_builtin_machines(self):
+        from app import stars_cfg
+        for machine in (bets_dfa, bets_cfg, bets_pda):
+            self.check_edits(machine, self.EDITS)
+        stars = ['1', '11', '111', '1110', '11101', '111010', '1110100', '11101000', '1110100', '111010001', '1110', '11111111', '1111011101']
+        for machine in (stars_dfa, stars_cfg, stars_pda):
+            self.check_edits(machine, stars)
+
+    def test_nondeterministic_machines(self):
+        from registry_logic import make_cfg, make_pda
+        # Even-length palindromes: the PDA guesses the middle, so it runs on the graph-structured stack.
+        palindromes = make_pda({
+            'states': [{'id': 0}, {'id': 1}, {'id': 2}], 'inputAlphabet': ['a', 'b'], 'stackAlphabet': ['a', 'b', 'Z'],
+            'transitions': [{'from': 0, 'input': symbol, 'stackTop': 'ε', 'to': 0, 'push': [symbol]} for symbol in 'ab'] +
+                           [{'from': 0, 'input': 'ε', 'stackTop': 'ε', 'to': 1, 'push': []}] +
+                           [{'from': 1, 'input': symbol, 'stackTop': symbol, 'to': 1, 'push': []} for symbol in 'ab'] +
+                           [{'from': 1, 'input': 'ε', 'stackTop': 'Z', 'to': 2, 'push': ['Z']}],
+            'startState': 0, 'initialStackSymbol': 'Z', 'acceptingStates': [2]
+        })
+        edits = ['a', 'ab', 'abb', 'abba', 'abbaa', 'abba', 'abbb', 'abbba', 'ab', 'aa', 'baab', 'baaab']
+        self.check_edits(palindromes, edits)
+        self.assertTrue(palindromes.incremental().simulate('abba')['accepted'])
+        ambiguous = make_cfg({'variables': ['S'], 'terminals': ['a', 'ab'], 'startSymbol': 'S',
+                              'rules': [{'from': 'S', 'to': ['S', 'S']}, {'from': 'S', 'to': ['a']}, {'from': 'S', 'to': ['ab']}]})
+        self.check_edits(ambiguous, ['a', 'aa', 'aab', 'aaba', 'aab', 'aa', 'aaab', 'b', 'abab', 'ababa'])
+
+    def test_work_is_proportional_to_the_edit(self):
+        from metrics_logic import SearchStats
+        from app import stars_pda
+        text = '111' + '0' * 500 + '1'
+        for machine in (stars_dfa, stars_pda):
+            run = machine.incremental()
+            run.simulate(text, trace='none')
+            stats = SearchStats()
+            run.simulate(text + '0', trace='none', stats=stats)
+            self.assertLessEqual(stats.steps, 3)
+        run = bets_cfg.incremental()
+        run.simulate('ab' * 200, trace='none')
+        full, step = SearchStats(), SearchStats()
+        bets_cfg.simulate('ab' * 200 + 'a', trace='none', stats=full)
+        run.simulate('ab' * 200 + 'a', trace='none', stats=step)
+        self.assertEqual(run.resumed, 400)
+        self.assertLess(step.steps * 50, full.steps)
+
+    def test_session_route(self):
+        from app import checkpoints, result_cache
+        result_cache.clear()
+        client = app.test_client()
+        for route in ('/simulate-dfa', '/simulate-cfg', '/simulate-pda'):
+            for text in ('a', 'ab', 'aba', 'abab', 'aba', 'abb'):
+                with self.subTest(route=route, text=text):
+                    request = {'dfa_type': 'bets_dfa', 'dfa_input': text, 'trace': 'rle'}
+                    response = client.post(route, json=dict(request, session='editor-1'))
+                    self.assertEqual(response.status_code, 200)
+                    result_cache.clear()
+                    self.assertEqual(response.get_json(), client.post(route, json=request).get_json())
+                    result_cache.clear()
+            response = client.post(route, json={'dfa_type': 'bets_dfa', 'dfa_input': 'a', 'session': ''})
+            self.assertEqual(response.status_code, 400)
+        self.assertGreaterEqual(len(checkpoints), 1)
+
+
+
+class TestMultiDFA(unittest.TestCase):
+    def setUp(self):
+        from registry_logic import make_dfa
+        # Accepts words over {a, c} that end after exactly one 'a' since the last 'c'; 'aa' is a trap.
+        self.extra = make_dfa({'states': [{'id': 0}, {'id': 1}, {'id': 2}], 'alphabet': ['a', 'c'],
+                               'transitions': {'0': {'a': 1, 'c': 0}, '1': {'a': 2, 'c': 0}, '2': {'a': 2, 'c': 2}},
+                               'startState': 0, 'acceptingStates': [1], 'trapStates': [2]})
+
+    def test_matches_separate_runs(self):
+        import random
+        from dfa_logic import MultiDFA
+        machines = [bets_dfa, stars_dfa, self.extra]
+        rng = random.Random(7)
+        inputs = ['', 'a', 'aa', 'ab', 'abababab', '0110', 'ca', 'x'] + [''.join(rng.choice('ab01cx') for _ in range(rng.randrange(12))) for _ in range(300)]
+        # A cap of one product state forces the stacked tables from the first symbol on.
+        for max_states in (4096, 1):
+            multi = MultiDFA(machines, max_states=max_states)
+            for text in inputs:
+                with self.subTest(max_states=max_states, text=text):
+                    self.assertEqual(multi.simulate(text), [machine.runner().feed(text).finish() for machine in machines])
+
+    def test_rejection_positions(self):
+        from dfa_logic import MultiDFA
+        bets, stars, extra = MultiDFA([bets_dfa, stars_dfa, self.extra]).simulate('abababa')
+        self.assertEqual((bets['length'], bets['rejection']), (7, None))
+        self.assertEqual((stars['length'], stars['rejection']), (0, 'REJECT_STATE_INVALID_SYMBOL'))
+        self.assertEqual((extra['length'], extra['rejection']), (1, 'REJECT_STATE_INVALID_SYMBOL'))
+        with self.assertRaises(ValueError):
+            MultiDFA([])
+
+    def test_multi_route(self):
+        client = app.test_client()
+        machine_id = client.post('/machines', json={'kind': 'dfa', 'definition': {
+            'states': [{'id': 0}, {'id': 1}], 'alphabet': ['a', 'b'], 'transitions': {'0': {'a': 1, 'b': 0}, '1': {'a': 0, 'b': 1}},
+            'startState': 0, 'acceptingStates': [1]}}).get_json()['machine_id']
+        response = client.post('/simulate-dfa/multi', json={'machines': ['bets_dfa', 'stars_dfa', machine_id], 'dfa_input': 'aabbb'})
+        self.assertEqual(response.status_code, 200)
+        results = response.get_json()['results']
+        self.assertEqual(results['bets_dfa'], bets_dfa.runner().feed('aabbb').finish())
+        self.assertEqual(results['stars_dfa']['rejection'], 'REJECT_STATE_INVALID_SYMBOL')
+        self.assertFalse(results[machine_id]['accepted'])
+        for request, status in [({'machines': [], 'dfa_input': 'a'}, 400), ({'machines': ['bets_dfa']}, 400),
+                                ({'machines': ['nope'], 'dfa_input': 'a'}, 404), ({'machines': ['bets_dfa'] * 2, 'dfa_input': 'a'}, 200)]:
+            with self.subTest(request=request):
+                self.assertEqual(client.post('/simulate-dfa/multi', json=request).status_code, status)
+
+
+
+class TestRegexCompiler(unittest.TestCase):
+    STARS = '(111 + 101 + 001 + 010) (1 + 0 + 11)(1 + 0 + 11)* (111 + 000) (111 + 000)* (01 + 10 + 00)'
+    BETS = '(aa + bb + aba + ba) (aba + bab + bbb) (a + b)* (a + b + aa + abab) (aa + bb)*'
+
+    def test_builtin_regexes(self):
+        from regex_logic import compile_regex
+        # The hand-built machines are the DFAs of the regexes of the CLI menu.
+        for pattern, builtin in ((self.STARS, stars_dfa), (self.BETS, bets_dfa)):
+            compiled, _ = compile_regex(pattern).minimize()
+            minimal, _ = builtin.minimize()
+            self.assertEqual(compiled.transitions, minimal.transitions)
+            self.assertEqual(compiled.final_states, minimal.final_states)
+
+    def test_matches_python_re(self):
+        import itertools
+        import random
+        import re
+        from regex_logic import LazyDFA, compile_regex
+        rng = random.Random(5)
+
+        def pattern(depth):
+            choice = rng.random()
+            if depth == 0 or choice < 0.3:
+                return rng.choice('abcε')
+            if choice < 0.55:
+                return pattern(depth - 1) + pattern(depth - 1)
+            if choice < 0.8:
+                return '(' + pattern(depth - 1) + ' + ' + pattern(depth - 1) + ')'
+            return '(' + pattern(depth - 1) + ')*'
+
+        words = [''.join(word) for length in range(5) for word in itertools.product('abc', repeat=length)]
+        for _ in range(100):
+            regex = pattern(4)
+            expected = re.compile(regex.replace(' ', '').replace('+', '|').replace('ε', ''))
+            dfa = compile_regex(regex, alphabet='abc')
+            lazy = LazyDFA(regex, alphabet='abc', cache_size=2)
+            for word in words:
+                with self.subTest(regex=regex, word=word):
+                    self.assertEqual(dfa.accepts(word), bool(expected.fullmatch(word)))
+                    self.assertEqual(lazy.accepts(word), bool(expected.fullmatch(word)))
+
+    def test_lazy_cache_is_bounded(self):
+        import random
+        from regex_logic import LazyDFA, compile_regex
+        # The n-th symbol from the end is an a: the full DFA has 2^(n+1) states.
+        regex = '(a + b)*a' + '(a + b)' * 16
+        with self.assertRaises(ValueError):
+            compile_regex(regex, max_states=1000)
+        lazy = LazyDFA(regex, cache_size=64)
+        rng = random.Random(11)
+        word = ''.join(rng.choice('ab') for _ in range(2000))
+        self.assertEqual(lazy.accepts(word), word[-17] == 'a')
+        self.assertLessEqual(lazy.stats()['states'], 64)
+        self.assertGreater(lazy.flushes, 0)
+        result = lazy.match('abx')
+        self.assertEqual((result['length'], result['rejection']), (2, 'REJECT_STATE_INVALID_SYMBOL'))
+        self.assertEqual(LazyDFA('ab*').match('abba')['rejection'], 'REJECT_STATE_TRAP_STATE')
+
+    def test_syntax_errors(self):
+        from regex_logic import parse_regex
+        for pattern in ('(a', 'a)', '*a', 'a + + b', '', '()'):
+            with self.subTest(pattern=pattern), self.assertRaises(ValueError):
+                parse_regex(pattern)
+
+    def test_register_regex(self):
+        client = app.test_client()
+        response = client.post('/machines', json={'kind': 'dfa', 'definition': {'regex': self.BETS}})
+        self.assertIn(response.status_code, (200, 201))
+        machine_id = response.get_json()['machine_id']
+        for word in ('aaababa', 'aaabab', 'bababbbab'):
+            with self.subTest(word=word):
+                result = client.post('/simulate-dfa', json={'machine_id': machine_id, 'dfa_input': word, 'trace': 'none'}).get_json()
+                self.assertEqual(result['accepted'], bets_dfa.accepts(word))
+        response = client.post('/machines', json={'kind': 'dfa', 'definition': {'regex': '(a + b'}})
+        self.assertEqual(response.status_code, 400)
+
+
+
+class TestCorpusGeneration(unittest.TestCase):
+    def brute_force(self, dfa, alphabet, length):
+        import itertools
+        words = [''.join(word) for word in itertools.product(alphabet, repeat=length)]
+        return [word for word in words if dfa.accepts(word)], [word for word in words if not dfa.accepts(word)]
+
+    def test_counts(self):
+        from unittest import mock
+        import corpus_logic
+        from corpus_logic import DFALanguage
+        for dfa, alphabet in ((bets_dfa, 'ab'), (stars_dfa, '01')):
+            accepted, rejected = DFALanguage(dfa), DFALanguage(dfa, accepted=False)
+            for length in range(11):
+                with self.subTest(alphabet=alphabet, length=length):
+                    expected_accepted, expected_rejected = self.brute_force(dfa, alphabet, length)
+                    self.assertEqual(DFALanguage(dfa).count(length), len(expected_accepted))
+                    self.assertEqual(rejected.count(length), len(expected_rejected))
+            # The matrix power, the dynamic programming and the completion table agree on long lengths.
+            expected = accepted.count(400)
+            accepted.sample(400, 1, seed=0)
+            self.assertEqual(accepted.count(400), expected)
+            with mock.patch.object(corpus_logic, '_numpy', lambda: None):
+                self.assertEqual(DFALanguage(dfa).count(400), expected)
+            self.assertEqual(accepted.count(400) + rejected.count(400), 2 ** 400)
+
+    def test_sampling(self):
+        import collections
+        from unittest import mock
+        import corpus_logic
+        from corpus_logic import DFALanguage
+        for dfa in (bets_dfa, stars_dfa):
+            for accepted in (True, False):
+                language = DFALanguage(dfa, accepted=accepted)
+                for length in (0, 7, 30, 90):
+                    if not language.count(length):
+                        with self.assertRaises(ValueError):
+                            language.sample(length, 1)
+                        continue
+                    with self.subTest(accepted=accepted, length=length):
+                        words = language.sample(length, 300, seed=1)
+                        self.assertEqual(len(words), 300)
+                        self.assertTrue(all(len(word) == length and dfa.accepts(word) == accepted for word in words))
+                        self.assertEqual(words, language.sample(length, 300, seed=1))
+        # Every accepted string of length 9 of bets_dfa shows up about as often as the others.
+        language = DFALanguage(bets_dfa)
+        total = language.count(9)
+        for numpy in (True, False):
+            with self.subTest(numpy=numpy), mock.patch.object(corpus_logic, '_numpy', corpus_logic._numpy if numpy else lambda: None):
+                frequencies = collections.Counter(language.sample(9, 100 * total, seed=2))
+                self.assertEqual(len(frequencies), total)
+                self.assertLess(max(frequencies.values()), 200)
+                self.assertGreater(min(frequencies.values()), 40)
+
+    def test_shortlex_enumeration(self):
+        from corpus_logic import DFALanguage
+        for dfa, alphabet in ((bets_dfa, 'ab'), (stars_dfa, '01')):
+            for accepted in (True, False):
+                expected = [word for length in range(2, 10) for word in self.brute_force(dfa, alphabet, length)[0 if accepted else 1]]
+                self.assertEqual(list(DFALanguage(dfa, accepted=accepted).strings(9, min_length=2)), expected)
+
+    def test_cli(self):
+        import os
+        import tempfile
+        from corpus_logic import main
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'corpus.tsv')
+            self.assertEqual(main(['sample', '--machine', 'stars', '--lengths', '12', '20', '--count', '50', '--out', path]), 0)
+            with open(path) as stream:
+                lines = [line.rstrip('\n').split('\t') for line in stream]
+            self.assertEqual(len(lines), 200)
+            self.assertTrue(all(stars_dfa.accepts(word) == (flag == '1') for word, flag in lines))
+            self.assertEqual(main(['enumerate', '--regex', '(a + b)*abb', '--max-length', '4', '--label', 'accepted', '--out', path]), 0)
+            with open(path) as stream:
+                self.assertEqual(stream.read().split(), ['abb', '1', 'aabb', '1', 'babb', '1'])
+
+
+
+class TestOracle(unittest.TestCase):
+    DFA = {'states': [{'id': 0}, {'id': 1}], 'alphabet': ['a', 'b'], 'transitions': {'0': {'a': 1, 'b': 0}, '1': {'a': 0, 'b': 1}},
+           'startState': 0, 'acceptingStates': [1]}
+    CFG = {'variables': ['S'], 'terminals': ['a', 'b'], 'startSymbol': 'S',
+           'rules': [{'from': 'S', 'to': ['a', 'S', 'b']}, {'from': 'S', 'to': ['ε']}]}
+
+    def serve(self, lines):
+        import io
+        import json
+        from oracle import Oracle
+        oracle = Oracle()
+        stdout = io.StringIO()
+        oracle.serve(io.StringIO(''.join(line if isinstance(line, str) else json.dumps(line) + '\n' for line in lines)), stdout)
+        return oracle, [json.loads(line) for line in stdout.getvalue().splitlines()]
+
+    def test_requests(self):
+        from unittest import mock
+        from registry_logic import make_cfg, make_dfa
+        inputs = ['', 'a', 'ab', 'aab', 'abx']
+        oracle, responses = self.serve([
+            {'id': 1, 'kind': 'dfa', 'definition': self.DFA, 'inputs': inputs},
+            {'id': 2, 'kind': 'dfa', 'definition': dict(self.DFA, name='same machine'), 'inputs': ['a'], 'trace': 'none'},
+            {'id': 3, 'kind': 'cfg', 'definition': self.CFG, 'engine': 'bfs', 'inputs': inputs},
+            {'id': 4, 'kind': 'pda', 'machine': 'bets_pda', 'inputs': ['aaababaabbab', 'abba']},
+        ])
+        self.assertEqual([response['id'] for response in responses], [1, 2, 3, 4])
+        self.assertEqual(responses[0]['results'], [make_dfa(self.DFA).simulate(value) for value in inputs])
+        # The same definition is built once.
+        self.assertEqual(responses[1]['machine_id'], responses[0]['machine_id'])
+        self.assertEqual(oracle.registry.stats()['definitions'], 3)
+        self.assertEqual(responses[1]['results'][0]['state_sequence'], None)
+        self.assertEqual(responses[2]['engine'], 'bfs')
+        self.assertEqual(responses[2]['results'], [make_cfg(self.CFG).simulate(value, engine='bfs') for value in inputs])
+        # Built-in machines are built without the early exit of the app's, like every definition.
+        with mock.patch.object(bets_pda, 'early_exit', False):
+            self.assertEqual(responses[3]['results'], [bets_pda.simulate('aaababaabbab'), bets_pda.simulate('abba')])
+        self.assertEqual(len(responses[3]['results'][1]['sequence']), 5)
+
+    def test_errors_do_not_stop_the_oracle(self):
+        _, responses = self.serve([
+            'not json\n',
+            {'id': 1, 'kind': 'tm', 'definition': self.DFA, 'inputs': []},
+            {'id': 2, 'kind': 'dfa', 'definition': self.DFA, 'engine': 'earley', 'inputs': []},
+            {'id': 3, 'kind': 'cfg', 'machine': 'unknown', 'inputs': []},
+            {'id': 4, 'kind': 'dfa', 'definition': self.DFA, 'inputs': 'ab'},
+            {'id': 5, 'kind': 'dfa', 'definition': self.DFA, 'inputs': ['ab']},
+        ])
+        self.assertEqual([response['id'] for response in responses], [None, 1, 2, 3, 4, 5])
+        self.assertTrue(all('error' in response for response in responses[:5]))
+        self.assertEqual(responses[5]['results'][0]['accepted'], True)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,114 @@
+"""Trace recording modes shared by the DFA, PDA and CFG simulators.
+
+Every `simulate` takes a `trace` argument that picks how much of the run is
+returned:
+
+- 'full' (default): the complete trace, exactly as before.
+- 'none': no trace at all (`None`).
+- 'summary': only the number of trace entries.
+- 'last' or 'last:K': the number of entries and the last K of them.
+- 'rle': the number of entries and the run-length-encoded state sequence.
+"""
+from collections import deque
+
+TRACE_MODES = ('none', 'summary', 'last', 'rle', 'full')
+DEFAULT_TRACE = 'full'
+DEFAULT_LAST_K = 16
+
+
+def parse_trace(trace: str | None) -> tuple[str, int]:
+    """Parses a trace option such as 'full', 'rle' or 'last:32'.
+
+    Args:
+        trace: The option as given by the caller. None means the default.
+
+    Returns:
+        A `(mode, k)` tuple. `k` only matters for 'last'.
+
+    Raises:
+        ValueError: The option names an unknown mode or a bad K.
+    """
+    if trace is None:
+        return DEFAULT_TRACE, DEFAULT_LAST_K
+    mode, _, k = str(trace).partition(':')
+    if mode not in TRACE_MODES:
+        raise ValueError(f'Unknown trace mode "{trace}": must be one of {", ".join(TRACE_MODES)} (or last:K).')
+    if not k:
+        return mode, DEFAULT_LAST_K
+    if mode != 'last' or not k.isdigit() or int(k) < 1:
+        raise ValueError(f'Invalid trace mode "{trace}": only last:K takes a positive K.')
+    return mode, int(k)
+
+
+class TraceRecorder:
+    """Collects trace entries according to a trace mode.
+
+    Entries are appended raw; `render` turns a kept entry into its output form
+    and `state_of` picks the value that 'rle' encodes. Only the entries a mode
+    keeps are ever rendered, so expensive views (stack copies, input slices)
+    are built for at most K entries in 'last' mode and never in 'none',
+    'summary' or 'rle' mode.
+    """
+
+    def __init__(self, trace: str | None = None, render=None, state_of=None):
+        """Creates an empty recorder.
+
+        Args:
+            trace: A trace option, see `parse_trace`.
+            render: Maps a raw entry to its output form. Defaults to identity.
+            state_of: Maps a raw entry to its state for 'rle'. Defaults to identity.
+        """
+        self.mode, self.k = parse_trace(trace)
+        self.render = render
+        self.state_of = state_of
+        self.length = 0
+        if self.mode == 'full':
+            self.items = []
+        elif self.mode == 'last':
+            self.items = deque(maxlen=self.k)
+        else:
+            self.items = None
+        self.runs = []
+
+    def append(self, entry):
+        """Records one trace entry."""
+        self.length += 1
+        if self.items is not None:
+            self.items.append(entry)
+        elif self.mode == 'rle':
+            state = self.state_of(entry) if self.state_of else entry
+            if self.runs and self.runs[-1][0] == state:
+                self.runs[-1][1] += 1
+            else:
+                self.runs.append([state, 1])
+
+    def __len__(self):
+        return self.length
+
+    def extend(self, entries):
+        """Records several trace entries in order."""
+        if self.mode != 'rle' and isinstance(entries, (list, tuple)):
+            self.length += len(entries)
+            if self.items is not None:
+                self.items.extend(entries)
+            return
+        for entry in entries:
+            self.append(entry)
+
+    def result(self):
+        """Builds the trace value for the response.
+
+        Returns:
+            A list for 'full', None for 'none', otherwise a dict with the
+            entry count under 'length' plus 'last' or 'runs'.
+        """
+        render = self.render or (lambda entry: entry)
+        if self.mode == 'full':
+            return [render(entry) for entry in self.items]
+        if self.mode == 'none':
+            return None
+        if self.mode == 'summary':
+            return {'length': self.length}
+        if self.mode == 'last':
+            return {'length': self.length, 'last': [render(entry) for entry in self.items]}
+        return {'length': self.length, 'runs': self.runs}